@@ -7,6 +7,7 @@ from app.blueprints.api import api_bp
 from app.blueprints.auth import auth_bp
 from app.config import Config
 from app.socketio import register_socketio_events
+from app.monitoring import init_app_metrics, init_app_tracing, init_logging
 
 def create_app():
     """创建Flask应用实例"""
@@ -21,6 +22,9 @@ def create_app():
         app.debug = True
         app.config.from_pyfile('testing.py')
 
+    # 配置日志
+    init_logging(app.config.get('LOGGING_CONFIG', {}))
+
     # 初始化其他扩展
     init_extensions(app)
 
@@ -36,4 +40,8 @@ def create_app():
     # 配置SocketIO事件处理
     register_socketio_events(app)
 
+    # 注册监控指标与请求追踪
+    init_app_metrics(app)
+    init_app_tracing(app)
+
     return app
@@ -1,10 +1,9 @@
-from flask import Blueprint, request, jsonify, g
-from app.services.deepseek_service import DeepSeekService
-from app.services.search_service import SearchService
-from app.services.crawler_service import CrawlerService
-from app.services.ai_agent_service import AIAgentService
-from app.models.user import User, ChatSession
+from flask import Blueprint, request, jsonify, g, current_app
+from app.services.registry import get_deepseek_service, get_search_service, get_crawler_service, get_ai_agent_service
+from app.socketio.storage import SocketIOStorage
+from app.models.user import ChatSession, ChatMessageBucket
 from app.decorators.auth import wallet_auth_required, optional_wallet_auth
+from app.services.token_usage import get_token_usage
 from datetime import datetime
 import json
 
@@ -23,7 +22,7 @@ def analyze_question():
                 'error': '问题不能为空'
             }), 400
         
-        deepseek_service = DeepSeekService()
+        deepseek_service = get_deepseek_service()
         result = deepseek_service.analyze_question(question)
         
         return jsonify({
@@ -50,7 +49,7 @@ def search():
                 'error': '搜索关键词不能为空'
             }), 400
         
-        search_service = SearchService()
+        search_service = get_search_service()
         results = search_service.search(keywords)
         
         return jsonify({
@@ -81,7 +80,7 @@ def crawl():
                 'error': 'URL列表不能为空'
             }), 400
         
-        crawler_service = CrawlerService()
+        crawler_service = get_crawler_service()
         results = crawler_service.crawl_multiple_urls(urls)
         
         return jsonify({
@@ -112,7 +111,7 @@ def process_question():
                 'error': '问题不能为空'
             }), 400
         
-        ai_agent = AIAgentService()
+        ai_agent = get_ai_agent_service()
         result = ai_agent.process_question(question)
         
         return jsonify({
@@ -126,6 +125,61 @@ def process_question():
             'error': f'处理问题时发生错误: {str(e)}'
         }), 500
 
+@api_bp.route('/tasks/<task_id>/sources', methods=['GET'])
+@optional_wallet_auth
+def get_task_sources(task_id):
+    """按需获取任务的完整来源内容（需提供任务所属的会话ID，已登录用户的会话只有会话所有者可以获取）"""
+    try:
+        session_id = request.args.get('session_id', '').strip()
+        record = SocketIOStorage().get_task_sources(task_id)
+        # 会话ID不匹配时与不存在的任务返回相同结果，不暴露任务是否存在
+        if record is None or not session_id or record.get('session_id') != session_id:
+            return jsonify({
+                'success': False,
+                'error': '来源内容不存在或已过期'
+            }), 404
+        
+        # 持久化的会话属于已登录用户，校验当前用户是会话所有者
+        if ChatSession.objects(session_id=session_id).only('id').first():
+            if not g.current_user or not ChatSession.objects(session_id=session_id, user=g.current_user).only('id').first():
+                return jsonify({
+                    'success': False,
+                    'error': '无权访问该任务的来源内容'
+                }), 403
+        
+        sources = record.get('sources', [])
+        
+        # 支持按索引获取单个来源
+        index = request.args.get('index')
+        if index is not None:
+            index = int(index)
+            if index < 0 or index >= len(sources):
+                return jsonify({
+                    'success': False,
+                    'error': '来源索引超出范围'
+                }), 404
+            sources = [sources[index]]
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'task_id': task_id,
+                'sources': sources,
+                'count': len(sources)
+            }
+        })
+        
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': '无效的来源索引'
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'获取来源内容时发生错误: {str(e)}'
+        }), 500
+
 @api_bp.route('/health', methods=['GET'])
 def health_check():
     """健康检查接口"""
@@ -147,18 +201,41 @@ def get_sessions():
         include_archived = request.args.get('include_archived', 'false').lower() == 'true'
         limit = int(request.args.get('limit', 50))
         offset = int(request.args.get('offset', 0))
+        cursor = request.args.get('cursor')
+        # 摘要模式：不返回消息列表，基于游标分页
+        summary = request.args.get('summary', 'false').lower() == 'true' or bool(cursor)
         
         # 限制查询数量
         limit = min(limit, 100)
         
         if g.current_user:
             # 已登录用户，获取其会话
-            user = User.get_by_wallet_address(g.current_user['wallet_address'])
-            if not user:
+            # 复用认证装饰器已验证的用户对象
+            user = g.current_user
+            
+            if summary:
+                try:
+                    sessions, next_cursor = ChatSession.get_user_session_summaries(
+                        user=user,
+                        include_archived=include_archived,
+                        limit=limit,
+                        cursor=cursor
+                    )
+                except ValueError as e:
+                    return jsonify({
+                        'success': False,
+                        'error': str(e)
+                    }), 400
+                
                 return jsonify({
-                    'success': False,
-                    'error': '用户不存在'
-                }), 404
+                    'success': True,
+                    'data': {
+                        'sessions': [session.to_summary_dict() for session in sessions],
+                        'limit': limit,
+                        'next_cursor': next_cursor,
+                        'has_more': next_cursor is not None
+                    }
+                })
             
             sessions = ChatSession.get_user_sessions(
                 user=user,
@@ -178,6 +255,17 @@ def get_sessions():
             })
         else:
             # 未登录用户，返回空列表
+            if summary:
+                return jsonify({
+                    'success': True,
+                    'data': {
+                        'sessions': [],
+                        'limit': limit,
+                        'next_cursor': None,
+                        'has_more': False
+                    }
+                })
+            
             return jsonify({
                 'success': True,
                 'data': {
@@ -205,12 +293,8 @@ def create_session():
         
         if g.current_user:
             # 已登录用户，创建会话
-            user = User.get_by_wallet_address(g.current_user['wallet_address'])
-            if not user:
-                return jsonify({
-                    'success': False,
-                    'error': '用户不存在'
-                }), 404
+            # 复用认证装饰器已验证的用户对象
+            user = g.current_user
             
             session = ChatSession.create_session(
                 user=user,
@@ -257,12 +341,22 @@ def get_session(session_id):
     try:
         if g.current_user:
             # 已登录用户，获取其会话
-            user = User.get_by_wallet_address(g.current_user['wallet_address'])
-            if not user:
+            # 复用认证装饰器已验证的用户对象
+            user = g.current_user
+            
+            # 摘要模式不加载消息，消息通过 /sessions/<id>/messages 分页获取
+            if request.args.get('summary', 'false').lower() == 'true':
+                session = ChatSession.objects(session_id=session_id, user=user).exclude('messages').first()
+                if not session:
+                    return jsonify({
+                        'success': False,
+                        'error': '会话不存在'
+                    }), 404
+                
                 return jsonify({
-                    'success': False,
-                    'error': '用户不存在'
-                }), 404
+                    'success': True,
+                    'data': session.to_summary_dict()
+                })
             
             session = ChatSession.get_by_session_id(session_id, user=user)
             if not session:
@@ -309,12 +403,8 @@ def update_session(session_id):
         data = request.get_json()
         title = data.get('title', '').strip() if data else ''
         
-        user = User.get_by_wallet_address(g.current_user['wallet_address'])
-        if not user:
-            return jsonify({
-                'success': False,
-                'error': '用户不存在'
-            }), 404
+        # 复用认证装饰器已验证的用户对象
+        user = g.current_user
         
         session = ChatSession.get_by_session_id(session_id, user=user)
         if not session:
@@ -346,12 +436,8 @@ def update_session(session_id):
 def delete_session(session_id):
     """删除会话（仅限已登录用户）"""
     try:
-        user = User.get_by_wallet_address(g.current_user['wallet_address'])
-        if not user:
-            return jsonify({
-                'success': False,
-                'error': '用户不存在'
-            }), 404
+        # 复用认证装饰器已验证的用户对象
+        user = g.current_user
         
         session = ChatSession.get_by_session_id(session_id, user=user)
         if not session:
@@ -380,12 +466,8 @@ def delete_session(session_id):
 def archive_session(session_id):
     """归档会话（仅限已登录用户）"""
     try:
-        user = User.get_by_wallet_address(g.current_user['wallet_address'])
-        if not user:
-            return jsonify({
-                'success': False,
-                'error': '用户不存在'
-            }), 404
+        # 复用认证装饰器已验证的用户对象
+        user = g.current_user
         
         session = ChatSession.get_by_session_id(session_id, user=user)
         if not session:
@@ -413,12 +495,8 @@ def archive_session(session_id):
 def restore_session(session_id):
     """恢复会话（仅限已登录用户）"""
     try:
-        user = User.get_by_wallet_address(g.current_user['wallet_address'])
-        if not user:
-            return jsonify({
-                'success': False,
-                'error': '用户不存在'
-            }), 404
+        # 复用认证装饰器已验证的用户对象
+        user = g.current_user
         
         session = ChatSession.get_by_session_id(session_id, user=user)
         if not session:
@@ -441,6 +519,72 @@ def restore_session(session_id):
         }), 500
 
 
+@api_bp.route('/sessions/<session_id>/messages', methods=['GET'])
+@optional_wallet_auth
+def get_session_messages(session_id):
+    """分页获取会话消息（从最新一页开始，before为上一页返回的游标）"""
+    try:
+        limit = min(int(request.args.get('limit', 50)), 200)
+        before = request.args.get('before')
+        before = int(before) if before is not None else None
+        
+        if limit <= 0 or (before is not None and before < 0):
+            return jsonify({
+                'success': False,
+                'error': '无效的分页参数'
+            }), 400
+        
+        if not g.current_user:
+            # 未登录用户的临时会话没有持久化消息
+            return jsonify({
+                'success': True,
+                'data': {
+                    'session_id': session_id,
+                    'messages': [],
+                    'next_before': None,
+                    'has_more': False
+                }
+            })
+        
+        # 复用认证装饰器已验证的用户对象
+        user = g.current_user
+        
+        # 只读取消息计数，不加载消息
+        session = ChatSession.objects(session_id=session_id, user=user).only('message_count').first()
+        if not session:
+            return jsonify({
+                'success': False,
+                'error': '会话不存在'
+            }), 404
+        
+        if before is None or before > session.message_count:
+            before = session.message_count
+        
+        messages, next_before = ChatMessageBucket.get_messages_before(session_id, before, limit)
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'session_id': session_id,
+                'messages': [message.to_dict() for message in messages],
+                'message_count': session.message_count,
+                'next_before': next_before,
+                'has_more': next_before is not None
+            }
+        })
+        
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': '无效的分页参数'
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'获取会话消息时发生错误: {str(e)}'
+        }), 500
+
+
 @api_bp.route('/sessions/<session_id>/messages', methods=['POST'])
 @optional_wallet_auth
 def add_message(session_id):
@@ -465,12 +609,8 @@ def add_message(session_id):
         
         if g.current_user:
             # 已登录用户，保存到数据库
-            user = User.get_by_wallet_address(g.current_user['wallet_address'])
-            if not user:
-                return jsonify({
-                    'success': False,
-                    'error': '用户不存在'
-                }), 404
+            # 复用认证装饰器已验证的用户对象
+            user = g.current_user
             
             session = ChatSession.get_by_session_id(session_id, user=user)
             if not session:
@@ -518,3 +658,58 @@ def add_message(session_id):
         }), 500
 
 
+# ==================== 用量API ====================
+
+@api_bp.route('/usage', methods=['GET'])
+@wallet_auth_required
+def get_usage():
+    """获取当前用户（或其某个会话）最近几天的token用量和当日配额"""
+    try:
+        recorder = get_token_usage()
+        max_days = current_app.config['TOKEN_USAGE_CONFIG'].get('max_report_days', 31)
+        days = min(max(int(request.args.get('days', 7)), 1), max_days)
+        session_id = request.args.get('session_id')
+        wallet_address = g.current_user.wallet_address
+        
+        if session_id:
+            # 只能查看自己的会话
+            if not ChatSession.get_by_session_id(session_id, user=g.current_user):
+                return jsonify({
+                    'success': False,
+                    'error': '会话不存在'
+                }), 404
+            daily = recorder.report('session', session_id, days)
+        else:
+            daily = recorder.report('user', wallet_address, days)
+        
+        used_today = recorder.report('user', wallet_address, 1)[0]['total_tokens']
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'session_id': session_id,
+                'daily': daily,
+                'total': {
+                    'prompt_tokens': sum(day['prompt_tokens'] for day in daily),
+                    'completion_tokens': sum(day['completion_tokens'] for day in daily),
+                    'total_tokens': sum(day['total_tokens'] for day in daily),
+                    'calls': sum(day['calls'] for day in daily)
+                },
+                'quota': {
+                    'daily_quota': recorder.daily_quota,
+                    'used_today': used_today,
+                    'status': recorder.check_quota(wallet_address)
+                }
+            }
+        })
+        
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': '无效的天数'
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'获取用量时发生错误: {str(e)}'
+        }), 500
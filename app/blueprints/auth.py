@@ -1,6 +1,6 @@
 from datetime import datetime
 from flask import Blueprint, request, jsonify, g
-from app.services.wallet_auth_service import WalletAuthService
+from app.services.registry import get_wallet_auth_service
 from app.decorators.auth import wallet_auth_required
 
 auth_bp = Blueprint('auth', __name__)
@@ -25,7 +25,7 @@ def generate_nonce():
                 'error': '无效的钱包地址格式'
             }), 400
         
-        auth_service = WalletAuthService()
+        auth_service = get_wallet_auth_service()
         result = auth_service.generate_nonce(wallet_address)
         
         return jsonify({
@@ -64,7 +64,7 @@ def verify_signature():
                 'error': '无效的钱包地址格式'
             }), 400
         
-        auth_service = WalletAuthService()
+        auth_service = get_wallet_auth_service()
         
         # 验证签名
         is_valid, message = auth_service.verify_signature(wallet_address, signature, nonce)
@@ -149,7 +149,7 @@ def refresh_token():
     """刷新token"""
     try:
         user = g.current_user
-        auth_service = WalletAuthService()
+        auth_service = get_wallet_auth_service()
         new_token = auth_service.refresh_token(user)
         
         return jsonify({
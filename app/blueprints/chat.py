@@ -1,8 +1,11 @@
 from flask import Blueprint, render_template, request, jsonify, g
-from app.services.ai_agent_service import AIAgentService
-from app.models.user import User, ChatSession
+from app.services.registry import get_ai_agent_service
+from app.models.user import ChatSession
 from app.decorators.auth import optional_wallet_auth
 from app.schedules.chat_tasks import process_question_async
+from app.monitoring.tracing import span
+from app.services.token_usage import get_token_usage, REJECT, DOWNGRADE
+from app.services.cancellation import get_cancellation, SUPERSEDED
 import json
 
 chat_bp = Blueprint('chat', __name__)
@@ -33,20 +36,32 @@ def chat():
                 'error': '会话ID不能为空'
             }), 400
         
-        # 如果用户已登录，先保存用户消息到会话
+        # 已登录用户检查当日token配额：超过配额拒绝，接近配额时降级回答模型
+        wallet_address = g.current_user.wallet_address if g.current_user else None
+        quota = get_token_usage().check_quota(wallet_address)
+        if quota == REJECT:
+            return jsonify({
+                'success': False,
+                'error': '今日token用量已达上限，请明天再试'
+            }), 429
+        
+        # 如果用户已登录，先保存用户消息到会话（原子追加，不加载会话文档）
         if g.current_user:
-            user = User.get_by_wallet_address(g.current_user['wallet_address'])
-            if user:
-                session = ChatSession.get_by_session_id(session_id, user=user)
-                if session:
-                    # 添加用户消息到会话
-                    session.add_message(
-                        message_type='user',
-                        content=question
-                    )
+            with span('storage.append_message', message_type='user'):
+                ChatSession.append_message(
+                    session_id,
+                    message_type='user',
+                    content=question,
+                    user=g.current_user
+                )
+        
+        # 同一会话重新提问时取消仍在处理的旧问题，释放Worker
+        cancellation = get_cancellation()
+        cancellation.cancel_session(session_id, SUPERSEDED)
         
         # 启动异步任务处理问题
-        task = process_question_async.delay(question, session_id)
+        task = process_question_async.delay(question, session_id, wallet_address, quota == DOWNGRADE)
+        cancellation.register(session_id, task.id)
         
         return jsonify({
             'success': True,
@@ -77,7 +92,7 @@ def get_suggestions():
             }), 400
         
         # 获取搜索建议
-        ai_agent = AIAgentService()
+        ai_agent = get_ai_agent_service()
         suggestions = ai_agent.get_search_suggestions(question)
         
         return jsonify({
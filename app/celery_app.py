@@ -52,3 +52,32 @@ def make_celery(app=None):
         celery.Task = ContextTask
     
     return celery
+
+def worker_arguments(profile='all', loglevel='info', pool=None, name=None, concurrency=None):
+    """
+    按Worker配置档生成celery worker的命令行参数
+    
+    Args:
+        profile: CELERY_WORKER_PROFILES中的配置档名称
+        loglevel: 日志级别
+        pool: 进程池类型（如solo、threads），None时使用celeryconfig中的配置
+        name: Worker名称（同一主机上启动多个Worker时需各不相同），默认为配置档名称
+        concurrency: 并发数，默认使用配置档中的并发数
+        
+    Returns:
+        list: 传给celery.worker_main的参数
+    """
+    from app.config import Config
+    
+    profiles = Config.CELERY_WORKER_PROFILES
+    if profile not in profiles:
+        raise ValueError(f"未知的Worker配置档: {profile}（可选: {', '.join(profiles)}）")
+    
+    config = profiles[profile]
+    argv = ['worker', f'--loglevel={loglevel}', '-Q', ','.join(config['queues']), '-n', f'{name or profile}@%h']
+    if pool:
+        argv.append(f'--pool={pool}')
+    concurrency = concurrency or config.get('concurrency')
+    if concurrency and pool != 'solo':
+        argv.append(f"--concurrency={concurrency}")
+    return argv
@@ -9,6 +9,7 @@ CELERY_IMPORTS = (
     'app.schedules.chat_tasks',
     'app.schedules.project.nftfair_task',
     'app.schedules.user_task',  # 用户相关任务
+    'app.schedules.usage_task',  # token用量汇总
     # 'app.schedules.project.other_project_task',  # 其他项目任务（待添加）
 )
 
@@ -33,6 +34,12 @@ CELERYBEAT_SCHEDULE = {
         'args': ('系统每日健康检查', 'info'),
     },
     
+    # token用量汇总写入MongoDB - 每5分钟执行一次（TOKEN_USAGE_CONFIG['flush_interval']）
+    'flush-token-usage': {
+        'task': 'app.schedules.usage_task.flush_token_usage',
+        'schedule': 300.0,
+    },
+    
     # 可以添加更多定时任务
     # 'weekly-report': {
     #     'task': 'app.schedules.reports.generate_weekly_report',
@@ -40,12 +47,17 @@ CELERYBEAT_SCHEDULE = {
     # },
 }
 
-# 任务路由配置
+# 任务路由配置（精确任务名优先于通配符规则）
+# priority: Redis broker中0为最高优先级，同一队列内按优先级取出
 CELERY_ROUTES = {
     # 告警任务使用高优先级队列
     'app.schedules.alert.*': {'queue': 'alerts'},
     
-    # 聊天任务使用默认队列
+    # 聊天任务按交互性拆分队列，避免搜索建议和会话保存的突发流量拖慢回答
+    'app.schedules.chat_tasks.process_question_async': {'queue': 'interactive', 'priority': 0},
+    'app.schedules.chat_tasks.get_suggestions_async': {'queue': 'suggestions', 'priority': 3},
+    'app.schedules.chat_tasks.save_ai_response_to_session': {'queue': 'persistence', 'priority': 6},
+    'app.schedules.usage_task.*': {'queue': 'persistence', 'priority': 9},
     'app.schedules.chat_tasks.*': {'queue': 'default'},
     
     # NFT相关任务使用专用队列
@@ -57,6 +69,18 @@ CELERY_ROUTES = {
 
 # 队列配置
 CELERY_QUEUES = {
+    'interactive': {
+        'exchange': 'interactive',
+        'routing_key': 'interactive',
+    },
+    'suggestions': {
+        'exchange': 'suggestions',
+        'routing_key': 'suggestions',
+    },
+    'persistence': {
+        'exchange': 'persistence',
+        'routing_key': 'persistence',
+    },
     'default': {
         'exchange': 'default',
         'routing_key': 'default',
@@ -76,6 +100,15 @@ CELERY_QUEUES = {
     # },
 }
 
+# Redis broker优先级支持：
+# - queue_order_strategy为priority时，监听多个队列的Worker按-Q参数的顺序取任务（interactive在前则优先处理回答）
+# - 每个队列按priority_steps拆分为多个list（队列名:优先级），同一队列内高优先级消息先取出
+BROKER_TRANSPORT_OPTIONS = {
+    'queue_order_strategy': 'priority',
+    'priority_steps': [0, 3, 6, 9],
+    'sep': ':',
+}
+
 # 任务执行配置
 CELERY_TASK_DEFAULT_QUEUE = 'default'
 CELERY_TASK_DEFAULT_EXCHANGE = 'default'
@@ -1,4 +1,5 @@
 import os
+import json
 
 class Config:
     """应用配置类"""
@@ -24,15 +25,97 @@ class Config:
     CELERY_TIMEZONE = 'Asia/Shanghai'
     CELERY_ENABLE_UTC = True
     
+    # Celery Worker配置档：按队列分配专用容量（celery_worker.py --profile、start_distributed.py --worker-profiles）
+    # queues的顺序即优先顺序；concurrency为None时使用celeryconfig中的默认并发数
+    CELERY_WORKER_PROFILES = {
+        'all': {'queues': ['interactive', 'suggestions', 'persistence', 'default', 'alerts', 'nft'], 'concurrency': None},
+        'interactive': {'queues': ['interactive'], 'concurrency': 8},
+        'background': {'queues': ['suggestions', 'persistence', 'default', 'alerts', 'nft'], 'concurrency': 4},
+        'persistence': {'queues': ['persistence'], 'concurrency': 2}
+    }
+    
     # SocketIO配置
     SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE') or 'redis://localhost:6379/1'
     SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL') or 'ai_agent_socketio'
     
     # DeepSeek API配置
     DEEPSEEK_API_KEY = os.environ.get('DEEPSEEK_API_KEY') or 'your-deepseek-api-key'
-    DEEPSEEK_BASE_URL = 'https://api.deepseek.com'
+    DEEPSEEK_BASE_URL = os.environ.get('DEEPSEEK_BASE_URL') or 'https://api.deepseek.com'
     DEEPSEEK_MODEL = 'deepseek-chat'
     
+    # 按调用类型选择模型和生成参数：分类和搜索建议用小而快的模型、较小的max_tokens，回答用主模型
+    # 熔断器按调用类型统计自适应超时，timeout为该调用类型的超时上限（秒），min_timeout为超时下限
+    DEEPSEEK_MODEL_PROFILES = {
+        'classify': {
+            'model': os.environ.get('DEEPSEEK_FAST_MODEL') or DEEPSEEK_MODEL,
+            'max_tokens': 200,
+            'temperature': 0,
+            'timeout': 15,
+            'json_mode': True  # response_format为json_object，保证返回可解析的JSON
+        },
+        'suggestions': {
+            'model': os.environ.get('DEEPSEEK_FAST_MODEL') or DEEPSEEK_MODEL,
+            'max_tokens': 200,
+            'temperature': 0.3,
+            'timeout': 15
+        },
+        'answer': {
+            'model': DEEPSEEK_MODEL,
+            'max_tokens': 2000,
+            'temperature': 0.7,
+            'min_timeout': 60  # 长回答的超时下限，不随自适应超时降低
+        },
+        # 用户当日用量接近配额时，回答改用快速模型和较短的max_tokens
+        'answer_downgraded': {
+            'model': os.environ.get('DEEPSEEK_FAST_MODEL') or DEEPSEEK_MODEL,
+            'max_tokens': 800,
+            'temperature': 0.7,
+            'min_timeout': 60
+        }
+    }
+    
+    # token用量统计与用户配额（Redis实时汇总，定时写入MongoDB）
+    TOKEN_USAGE_CONFIG = {
+        'enabled': True,
+        'redis_prefix': 'usage:',
+        'retention_days': 8,  # Redis中保留的天数，更早的用量从MongoDB读取
+        'flush_interval': 300,  # 写入MongoDB的间隔（秒）
+        'daily_quota': int(os.environ.get('USER_DAILY_TOKEN_QUOTA') or 200000),  # 每个用户每天的token数，0为不限制
+        'downgrade_ratio': 0.8,  # 当日用量超过配额的该比例后降级回答模型，超过配额后拒绝
+        'max_report_days': 31
+    }
+    
+    # 问题任务的协作式取消：客户端断开、重新提问或发送cancel_task时中止在途任务
+    TASK_CANCELLATION_CONFIG = {
+        'enabled': True,
+        'redis_prefix': 'cancel:',
+        'ttl': 900,  # 取消标记和在途任务记录的保留时间（秒），应大于任务的最长执行时间
+        'poll_interval': 0.5  # 等待HTTP请求期间检查取消标记的间隔（秒）
+    }
+    
+    # LLM后端池（多个账号的API Key或OpenAI兼容的本地推理服务），按最少在途请求数路由
+    # 环境变量DEEPSEEK_BACKENDS为JSON列表，如 [{"name": "acct1", "base_url": "...", "api_key": "...", "model": "可选"}]
+    DEEPSEEK_BACKENDS = json.loads(os.environ.get('DEEPSEEK_BACKENDS') or 'null') or [
+        {'name': 'default', 'base_url': DEEPSEEK_BASE_URL, 'api_key': DEEPSEEK_API_KEY}
+    ]
+    LLM_POOL_CONFIG = {
+        'redis_prefix': 'llm:cooldown:',
+        'rate_limit_cooldown': 10,  # 返回429且没有Retry-After时移出轮换的时间（秒）
+        'failure_threshold': 3,  # 连续失败（5xx、连接错误）次数达到该值后移出轮换
+        'failure_cooldown': 30  # 连续失败后移出轮换的时间（秒）
+    }
+    
+    # DeepSeek重试与对冲请求配置
+    DEEPSEEK_RETRY_CONFIG = {
+        'max_attempts': 3,  # 含首次请求，429、5xx和连接错误会重试
+        'base_delay': 0.5,  # 指数退避基数（秒），实际等待为[0, base_delay * 2^n]内的随机值
+        'max_delay': 8,  # 退避上限（秒）
+        'max_retry_after': 30,  # Retry-After超过该值（秒）时不再重试
+        'hedge_call_types': ['classify'],  # 对延迟敏感的调用类型启用对冲请求
+        'hedge_percentile': 90,  # 超过该百分位耗时仍未返回时发送对冲请求
+        'hedge_min_samples': 20  # 样本不足时不对冲
+    }
+    
     # 搜索引擎配置
     SEARCH_ENGINES = {
         'duckduckgo': {
@@ -51,13 +134,97 @@ class Config:
     CRAWLER_CONFIG = {
         'timeout': 10,
         'max_content_length': 50000,  # 提取的文本内容最大长度（字符数）
-        'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+        'request_delay': (0.5, 2.0),  # 每次请求前的随机延迟（秒），避免被封
+        'batch_delay': (1.0, 3.0)  # 批量爬取时相邻请求之间的随机延迟（秒）
+    }
+    
+    # DeepSeek客户端限流配置（Redis令牌桶，所有Worker共享）
+    DEEPSEEK_RATE_LIMIT_CONFIG = {
+        'enabled': True,
+        'redis_key': 'ratelimit:deepseek',
+        'requests_per_minute': int(os.environ.get('DEEPSEEK_RPM') or 60),
+        'tokens_per_minute': int(os.environ.get('DEEPSEEK_TPM') or 100000),
+        'request_burst': 10,  # 请求桶容量
+        'token_burst': 20000,  # token桶容量
+        'completion_estimate': 500,  # 预扣的回答token数，请求完成后按实际用量修正
+        'lanes': {
+            'interactive': {'reserve': 0, 'max_wait': 30},  # 可用尽全部容量
+            'background': {'reserve': 0.3, 'max_wait': 10}  # 桶内剩余不足30%时让给交互请求
+        },
+        'call_type_lanes': {
+            'classify': 'interactive',
+            'answer': 'interactive',
+            'suggestions': 'background'
+        }
+    }
+    
+    # 外部依赖熔断与自适应超时配置（状态保存在Redis中，所有Worker共享）
+    CIRCUIT_BREAKER_CONFIG = {
+        'redis_prefix': 'circuit:',
+        'failure_threshold': 5,  # 连续失败次数达到该值后熔断
+        'recovery_timeout': 30,  # 熔断后多久允许探测请求（秒）
+        'latency_window': 100,  # 自适应超时统计最近多少次成功请求
+        'min_samples': 20,  # 样本不足时使用max_timeout
+        'timeout_multiplier': 2.0,  # 超时 = p95耗时 × 倍数
+        'timeout_refresh': 10,  # 进程内缓存超时计算结果的时间（秒）
+        'dependencies': {
+            'deepseek': {'min_timeout': 15, 'max_timeout': 120},
+            'duckduckgo': {'min_timeout': 3, 'max_timeout': 15, 'failure_threshold': 3, 'recovery_timeout': 60},
+            'google': {'min_timeout': 3, 'max_timeout': 15, 'failure_threshold': 3, 'recovery_timeout': 120}
+        }
+    }
+    
+    # 监控指标配置
+    METRICS_CONFIG = {
+        'enabled': True,
+        'worker_port': int(os.environ.get('METRICS_WORKER_PORT') or 9101),  # Celery Worker指标导出端口，0为不启动
+        'queues': ['interactive', 'suggestions', 'persistence', 'default', 'alerts', 'nft']  # 统计积压的Celery队列
+    }
+    
+    # 日志配置（应用日志位于'app'日志器下）
+    LOGGING_CONFIG = {
+        'level': os.environ.get('LOG_LEVEL') or 'INFO',
+        'format': os.environ.get('LOG_FORMAT') or 'text',  # text或json（每行一条JSON）
+        'levels': {},  # 按模块覆盖级别，如 {'app.socketio.storage': 'DEBUG'}
+        'max_length': 500,  # 消息和结构化字段的最大长度（字符数），0为不截断
+        'queue_size': 10000  # 待写出日志上限，超出时丢弃
+    }
+    
+    # 分布式追踪配置
+    TRACING_CONFIG = {
+        'enabled': True,
+        'exporter': os.environ.get('TRACING_EXPORTER') or 'none',  # none、file或otlp
+        'file_path': os.environ.get('TRACING_FILE') or 'logs/traces.jsonl',
+        'otlp_endpoint': os.environ.get('TRACING_OTLP_ENDPOINT') or 'http://localhost:4318/v1/traces',
+        'service_name': os.environ.get('TRACING_SERVICE_NAME') or 'ai-agent',
+        'sample_rate': float(os.environ.get('TRACING_SAMPLE_RATE') or 1.0),
+        'batch_size': 100,  # 每批导出的span数
+        'flush_interval': 1.0,  # 导出间隔（秒）
+        'max_queue_size': 10000  # 待导出span上限，超出时丢弃
+    }
+    
+    # 系统健康检查配置
+    HEALTH_CHECK_CONFIG = {
+        'history_key': 'health:history',  # 检查结果时间序列（Redis有序集合，score为时间戳）
+        'history_retention': 3600 * 24 * 7,  # 保留7天
+        'probe_deepseek': True,  # 每次检查发送一次max_tokens=1的补全请求
+        'probe_search': True,  # 每次检查执行一次搜索
+        'slow_query_seconds': 1,  # 运行超过该时间的MongoDB操作计为慢查询
+        'thresholds': {
+            'redis_latency_ms': 50,
+            'mongodb_latency_ms': 100,
+            'deepseek_latency_ms': 10000,
+            'search_latency_ms': 10000,
+            'queue_backlog': 100,
+            'mongodb_slow_queries': 5,
+            'worker_rss_mb': 1024
+        }
     }
     
     # AI分析配置
     AI_ANALYSIS_CONFIG = {
-        'max_context_length': 8000,
-        'temperature': 0.7
+        'max_context_length': 8000
     }
     
     # MongoDB配置
@@ -68,5 +235,9 @@ class Config:
         'jwt_secret': os.environ.get('JWT_SECRET') or 'wallet-auth-secret-key',
         'jwt_expiration': 86400,  # 24小时
         'supported_chains': [1, 56, 137, 250],  # Ethereum, BSC, Polygon, Fantom
-        'nonce_expiration': 300  # 5分钟
+        'nonce_expiration': 300,  # 5分钟
+        'nonce_redis_prefix': 'auth:nonce:',  # Redis随机数键前缀（Redis不可用时回退到MongoDB）
+        'user_cache_ttl': 30,  # 进程内已验证用户缓存时间（秒）
+        'user_cache_max_size': 1000,  # 进程内缓存最大用户数
+        'user_cache_redis_ttl': 300  # Redis共享用户缓存时间（秒）
     }
\ No newline at end of file
@@ -1,6 +1,6 @@
 from functools import wraps
 from flask import request, jsonify, g
-from app.services.wallet_auth_service import WalletAuthService
+from app.services.registry import get_wallet_auth_service
 
 def wallet_auth_required(f):
     """钱包认证装饰器"""
@@ -24,7 +24,7 @@ def wallet_auth_required(f):
             }), 401
         
         # 验证token
-        auth_service = WalletAuthService()
+        auth_service = get_wallet_auth_service()
         is_valid, result = auth_service.verify_jwt_token(token)
         
         if not is_valid:
@@ -50,7 +50,7 @@ def optional_wallet_auth(f):
         if auth_header:
             try:
                 token = auth_header.split(' ')[1]  # Bearer <token>
-                auth_service = WalletAuthService()
+                auth_service = get_wallet_auth_service()
                 is_valid, result = auth_service.verify_jwt_token(token)
                 
                 if is_valid:
@@ -4,6 +4,8 @@ from flask_socketio import SocketIO
 from mongoengine import connect, disconnect
 from celery import Celery
 from dotenv import load_dotenv
+from app.services.registry import ServiceRegistry
+from app.monitoring import init_celery_metrics, init_celery_tracing
 
 # 加载环境变量
 load_dotenv('.env')
@@ -45,6 +47,10 @@ def init_extensions(app):
 
     celery.Task = ContextTask
 
+    # Celery任务指标与Worker导出端口、追踪上下文传播
+    init_celery_metrics(app.config.get('METRICS_CONFIG', {}))
+    init_celery_tracing(app.config.get('TRACING_CONFIG', {}))
+
     # 初始化SocketIO
     # 自动选择最佳的async_mode
     async_mode = 'threading'  # 默认使用threading模式
@@ -70,7 +76,11 @@ def init_extensions(app):
         channel=app.config['SOCKETIO_CHANNEL']
     )
 
+    # 初始化服务注册表（每个进程只构建一次服务实例）
+    app.extensions['services'] = ServiceRegistry()
+
     # 将扩展实例添加到app对象中
     app.redis = redis_store
     app.celery = celery
     app.socketio = socketio
+    app.services = app.extensions['services']
@@ -1,5 +1,8 @@
+import base64
+import json
 from datetime import datetime
-from mongoengine import Document, StringField, DateTimeField, ListField, IntField, BooleanField, ReferenceField, EmbeddedDocument, EmbeddedDocumentField
+from bson import ObjectId
+from mongoengine import Q, Document, StringField, DateTimeField, ListField, IntField, BooleanField, ReferenceField, EmbeddedDocument, EmbeddedDocumentField, DictField
 
 class User(Document):
     """用户模型"""
@@ -26,6 +29,7 @@ class User(Document):
     # 元数据
     meta = {
         'collection': 'users',
+        'index_background': True,
         'indexes': [
             'wallet_address',
             'username',
@@ -57,6 +61,12 @@ class User(Document):
         self.updated_at = datetime.utcnow()
         self.save()
     
+    def deactivate(self):
+        """禁用用户"""
+        self.is_active = False
+        self.updated_at = datetime.utcnow()
+        self.save()
+    
     @classmethod
     def get_by_wallet_address(cls, wallet_address):
         """根据钱包地址获取用户"""
@@ -88,10 +98,12 @@ class WalletNonce(Document):
     # 元数据
     meta = {
         'collection': 'wallet_nonces',
+        'index_background': True,
         'indexes': [
-            'wallet_address',
-            'nonce',
-            'expires_at'
+            # 与consume_nonce的过滤条件一致：等值字段在前，范围字段在后
+            ('wallet_address', 'nonce', 'used', 'expires_at'),
+            # TTL索引：过期的随机数由MongoDB自动删除，集合不会无限增长
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0}
         ]
     }
     
@@ -117,6 +129,17 @@ class WalletNonce(Document):
             used=False
         ).first()
     
+    @classmethod
+    def consume_nonce(cls, wallet_address, nonce):
+        """原子地消费有效随机数（used: False -> True），返回消费的随机数，无效时返回None"""
+        now = datetime.utcnow()
+        return cls.objects(
+            wallet_address=wallet_address.lower(),
+            nonce=nonce,
+            expires_at__gt=now,
+            used=False
+        ).modify(set__used=True, new=True)
+    
     def mark_as_used(self):
         """标记为已使用"""
         self.used = True
@@ -126,6 +149,9 @@ class WalletNonce(Document):
 class ChatMessage(EmbeddedDocument):
     """聊天消息嵌入文档"""
     
+    # 消息在会话中的序号（从0开始）
+    seq = IntField()
+    
     # 消息类型：user 或 ai
     message_type = StringField(required=True, choices=['user', 'ai'])
     
@@ -141,6 +167,7 @@ class ChatMessage(EmbeddedDocument):
     def to_dict(self):
         """转换为字典格式"""
         return {
+            'seq': self.seq,
             'message_type': self.message_type,
             'content': self.content,
             'metadata': self.metadata,
@@ -160,13 +187,17 @@ class ChatSession(Document):
     is_active = BooleanField(default=True)
     is_archived = BooleanField(default=False)
     
-    # 消息列表
+    # 旧版嵌入消息列表，仅用于迁移（新消息写入ChatMessageBucket）
     messages = ListField(EmbeddedDocumentField(ChatMessage), default=list)
     
     # 统计信息
     message_count = IntField(default=0)
     last_message_at = DateTimeField()
     
+    # 最后一条消息预览（会话列表摘要模式使用，无需读取消息）
+    last_message_preview = StringField(max_length=200)
+    last_message_type = StringField(choices=['user', 'ai'])
+    
     # 时间戳
     created_at = DateTimeField(default=datetime.utcnow)
     updated_at = DateTimeField(default=datetime.utcnow)
@@ -174,15 +205,19 @@ class ChatSession(Document):
     # 元数据
     meta = {
         'collection': 'chat_sessions',
+        'index_background': True,
         'indexes': [
             'session_id',
-            'user',
             'created_at',
             'last_message_at',
-            'is_active'
+            'is_active',
+            # 会话列表查询：与get_user_session_summaries的过滤和排序一致
+            {'fields': ['user', 'is_archived', '-last_message_at', '-created_at', '-id']}
         ]
     }
     
+    PREVIEW_LENGTH = 100
+    
     def to_dict(self):
         """转换为字典格式"""
         return {
@@ -192,46 +227,110 @@ class ChatSession(Document):
             'user_id': str(self.user.id) if self.user else None,
             'is_active': self.is_active,
             'is_archived': self.is_archived,
-            'messages': [msg.to_dict() for msg in self.messages],
+            'messages': self.get_messages(),
+            'message_count': self.message_count,
+            'last_message_at': self.last_message_at.isoformat() if self.last_message_at else None,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat()
+        }
+    
+    def to_summary_dict(self):
+        """转换为摘要字典（不含消息列表）"""
+        return {
+            'id': str(self.id),
+            'session_id': self.session_id,
+            'title': self.title,
+            'user_id': str(self.user.id) if self.user else None,
+            'is_active': self.is_active,
+            'is_archived': self.is_archived,
             'message_count': self.message_count,
+            'last_message_preview': self.last_message_preview,
+            'last_message_type': self.last_message_type,
             'last_message_at': self.last_message_at.isoformat() if self.last_message_at else None,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
     
     def add_message(self, message_type, content, metadata=None):
-        """添加消息到会话"""
-        message = ChatMessage(
+        """添加消息到会话（原子递增计数并写入消息分桶）"""
+        message = ChatSession.append_message(
+            self.session_id,
             message_type=message_type,
             content=content,
             metadata=metadata
         )
-        self.messages.append(message)
-        self.message_count += 1
-        self.last_message_at = datetime.utcnow()
-        self.updated_at = datetime.utcnow()
+        if message is None:
+            return None
         
-        # 自动生成标题（基于第一条用户消息）
-        if not self.title and message_type == 'user' and len(self.messages) == 1:
+        self.message_count = message.seq + 1
+        self.last_message_at = message.created_at
+        self.updated_at = message.created_at
+        if not self.title and message_type == 'user' and message.seq == 0:
             self.title = content[:50] + ('...' if len(content) > 50 else '')
         
-        self.save()
+        return message
+    
+    @classmethod
+    def append_message(cls, session_id, message_type, content, metadata=None, user=None):
+        """
+        不加载会话文档直接追加消息：一次find_one_and_update($inc/$set)取得序号，
+        一次update_one($push/$inc)写入分桶。并发写入不会丢失消息。
+        
+        Returns:
+            ChatMessage: 写入的消息，会话不存在时返回None
+        """
+        now = datetime.utcnow()
+        query = {'session_id': session_id}
+        if user:
+            query['user'] = user
+        
+        preview = content[:cls.PREVIEW_LENGTH] + ('...' if len(content) > cls.PREVIEW_LENGTH else '')
+        
+        # 原子递增消息计数，只返回序号和标题
+        updated = cls.objects(**query).only('message_count', 'title').modify(
+            inc__message_count=1,
+            set__last_message_at=now,
+            set__last_message_preview=preview,
+            set__last_message_type=message_type,
+            set__updated_at=now,
+            new=True
+        )
+        if updated is None:
+            return None
+        
+        message = ChatMessage(
+            seq=updated.message_count - 1,
+            message_type=message_type,
+            content=content,
+            metadata=metadata,
+            created_at=now
+        )
+        ChatMessageBucket.push_message(session_id, message)
+        
+        # 自动生成标题（基于第一条用户消息）
+        if not updated.title and message_type == 'user' and message.seq == 0:
+            title = content[:50] + ('...' if len(content) > 50 else '')
+            cls.objects(session_id=session_id).update_one(set__title=title)
+        
         return message
     
     def get_messages(self, limit=None, offset=0):
         """获取消息列表"""
-        messages = self.messages[offset:]
-        if limit:
-            messages = messages[:limit]
-        return [msg.to_dict() for msg in messages]
+        return [msg.to_dict() for msg in ChatMessageBucket.get_messages(self.session_id, limit=limit, offset=offset)]
     
     def clear_messages(self):
         """清空消息"""
+        ChatMessageBucket.objects(session_id=self.session_id).delete()
         self.messages = []
         self.message_count = 0
         self.updated_at = datetime.utcnow()
         self.save()
     
+    def delete(self, *args, **kwargs):
+        """删除会话及其消息分桶"""
+        ChatMessageBucket.objects(session_id=self.session_id).delete()
+        return super().delete(*args, **kwargs)
+    
     def archive(self):
         """归档会话"""
         self.is_archived = True
@@ -271,6 +370,78 @@ class ChatSession(Document):
         sessions = cls.objects(**query).order_by('-last_message_at', '-created_at')
         return sessions.skip(offset).limit(limit)
     
+    @classmethod
+    def get_user_session_summaries(cls, user, include_archived=False, limit=50, cursor=None):
+        """
+        获取用户会话摘要列表（不读取消息，基于游标分页）
+        
+        Args:
+            user: 用户
+            include_archived: 是否包含已归档会话
+            limit: 每页数量
+            cursor: 上一页返回的next_cursor
+            
+        Returns:
+            tuple: (会话列表, 下一页游标或None)
+        """
+        # is_archived始终作为等值条件，使排序可以直接走复合索引
+        query = cls.objects(
+            user=user,
+            is_archived__in=[False, True] if include_archived else [False]
+        )
+        
+        if cursor:
+            query = query.filter(cls._cursor_filter(cls._decode_cursor(cursor)))
+        
+        sessions = list(
+            query.exclude('messages')
+            .order_by('-last_message_at', '-created_at', '-id')
+            .limit(limit + 1)
+        )
+        
+        next_cursor = None
+        if len(sessions) > limit:
+            sessions = sessions[:limit]
+            next_cursor = cls._encode_cursor(sessions[-1])
+        
+        return sessions, next_cursor
+    
+    @staticmethod
+    def _encode_cursor(session):
+        """将会话的排序键编码为游标"""
+        payload = {
+            'l': session.last_message_at.isoformat() if session.last_message_at else None,
+            'c': session.created_at.isoformat(),
+            'i': str(session.id)
+        }
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+    
+    @staticmethod
+    def _decode_cursor(cursor):
+        """解码游标，返回(last_message_at, created_at, id)"""
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            last_message_at = datetime.fromisoformat(payload['l']) if payload['l'] else None
+            return last_message_at, datetime.fromisoformat(payload['c']), ObjectId(payload['i'])
+        except Exception:
+            raise ValueError('无效的分页游标')
+    
+    @staticmethod
+    def _cursor_filter(cursor_key):
+        """构造排序位置在游标之后的查询条件（降序，last_message_at为空的排在最后）"""
+        last_message_at, created_at, session_oid = cursor_key
+        
+        after_created = Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=session_oid)
+        
+        if last_message_at is None:
+            return Q(last_message_at=None) & after_created
+        
+        return (
+            Q(last_message_at__lt=last_message_at) |
+            (Q(last_message_at=last_message_at) & after_created) |
+            Q(last_message_at=None)
+        )
+    
     @classmethod
     def get_by_session_id(cls, session_id, user=None):
         """根据会话ID获取会话"""
@@ -278,3 +449,152 @@ class ChatSession(Document):
         if user:
             query['user'] = user
         return cls.objects(**query).first()
+
+
+class ChatMessageBucket(Document):
+    """聊天消息分桶模型：按时间顺序每BUCKET_SIZE条消息存为一个文档"""
+    
+    BUCKET_SIZE = 100
+    
+    # 所属会话
+    session_id = StringField(required=True, max_length=100)
+    
+    # 分桶序号：第n个桶保存序号为 [n*BUCKET_SIZE, (n+1)*BUCKET_SIZE) 的消息
+    bucket_index = IntField(required=True)
+    
+    # 消息列表
+    messages = ListField(EmbeddedDocumentField(ChatMessage), default=list)
+    count = IntField(default=0)
+    
+    # 时间戳
+    first_message_at = DateTimeField()
+    last_message_at = DateTimeField()
+    
+    # 元数据
+    meta = {
+        'collection': 'chat_message_buckets',
+        'index_background': True,
+        'indexes': [
+            {'fields': ['session_id', 'bucket_index'], 'unique': True}
+        ]
+    }
+    
+    @classmethod
+    def push_message(cls, session_id, message):
+        """以原子$push/$inc将消息写入对应分桶（分桶不存在时自动创建）"""
+        cls.objects(
+            session_id=session_id,
+            bucket_index=message.seq // cls.BUCKET_SIZE
+        ).update_one(
+            push__messages=message,
+            inc__count=1,
+            set__last_message_at=message.created_at,
+            set_on_insert__first_message_at=message.created_at,
+            upsert=True
+        )
+    
+    @classmethod
+    def get_messages(cls, session_id, limit=None, offset=0):
+        """按序号区间获取消息，只读取覆盖该区间的分桶"""
+        start = offset or 0
+        end = start + limit if limit else None
+        
+        query = {
+            'session_id': session_id,
+            'bucket_index__gte': start // cls.BUCKET_SIZE
+        }
+        if end is not None:
+            query['bucket_index__lte'] = (end - 1) // cls.BUCKET_SIZE
+        
+        messages = []
+        for bucket in cls.objects(**query).order_by('bucket_index'):
+            messages.extend(bucket.messages)
+        
+        # 并发写入同一分桶时$push顺序可能与序号不一致，按序号排序
+        messages.sort(key=lambda msg: msg.seq)
+        return [msg for msg in messages if msg.seq >= start and (end is None or msg.seq < end)]
+    
+    @classmethod
+    def get_messages_before(cls, session_id, before, limit=50):
+        """
+        获取序号小于before的最近limit条消息（按时间正序）
+        
+        Returns:
+            tuple: (消息列表, 更早一页的游标或None)
+        """
+        offset = max(0, before - limit)
+        messages = cls.get_messages(session_id, limit=before - offset, offset=offset) if before > 0 else []
+        return messages, (offset if offset > 0 else None)
+    
+    @classmethod
+    def migrate_session(cls, session):
+        """将旧版嵌入在ChatSession中的消息迁移到分桶"""
+        if not session.messages:
+            return 0
+        
+        migrated = 0
+        for seq, message in enumerate(session.messages):
+            message.seq = seq
+            cls.push_message(session.session_id, message)
+            migrated += 1
+        
+        # 迁移期间append_message可能已递增计数（新消息的序号从旧计数开始），计数只增不减
+        ChatSession.objects(id=session.id).update_one(
+            unset__messages=True,
+            max__message_count=migrated
+        )
+        return migrated
+
+
+class TokenUsage(Document):
+    """DeepSeek token用量日汇总（由Redis中的实时汇总定期写入）"""
+    
+    # 汇总维度：user（钱包地址）、session（会话ID）、global
+    scope = StringField(required=True, choices=['user', 'session', 'global'])
+    key = StringField(required=True, max_length=100)
+    day = StringField(required=True, max_length=10)  # UTC日期，YYYY-MM-DD
+    
+    # 当日累计用量
+    prompt_tokens = IntField(default=0)
+    completion_tokens = IntField(default=0)
+    calls = IntField(default=0)
+    stages = DictField()  # 按调用类型（classify、answer、suggestions）细分
+    
+    updated_at = DateTimeField(default=datetime.utcnow)
+    
+    # 元数据
+    meta = {
+        'collection': 'token_usage',
+        'index_background': True,
+        'indexes': [
+            {'fields': ['scope', 'key', 'day'], 'unique': True}
+        ]
+    }
+    
+    def to_dict(self):
+        """转换为字典格式"""
+        return {
+            'day': self.day,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'total_tokens': self.prompt_tokens + self.completion_tokens,
+            'calls': self.calls,
+            'stages': self.stages or {}
+        }
+    
+    @classmethod
+    def upsert(cls, scope, key, day, totals):
+        """写入当日累计值（Redis中是累计值，重复写入是幂等的）"""
+        cls.objects(scope=scope, key=key, day=day).update_one(
+            set__prompt_tokens=totals.get('prompt_tokens', 0),
+            set__completion_tokens=totals.get('completion_tokens', 0),
+            set__calls=totals.get('calls', 0),
+            set__stages=totals.get('stages', {}),
+            set__updated_at=datetime.utcnow(),
+            upsert=True
+        )
+    
+    @classmethod
+    def get_days(cls, scope, key, days):
+        """获取指定日期的汇总，返回 {day: TokenUsage}"""
+        return {usage.day: usage for usage in cls.objects(scope=scope, key=key, day__in=list(days))}
@@ -0,0 +1,19 @@
+"""
+监控模块
+提供Prometheus指标采集与导出、分布式追踪、结构化日志
+"""
+
+from .metrics import init_app_metrics, init_celery_metrics, observe_stage
+from .tracing import init_app_tracing, init_celery_tracing, span, current_trace_id
+from .logs import init_logging
+
+__all__ = [
+    'init_app_metrics',
+    'init_celery_metrics',
+    'observe_stage',
+    'init_app_tracing',
+    'init_celery_tracing',
+    'span',
+    'current_trace_id',
+    'init_logging'
+]
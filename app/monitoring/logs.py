@@ -0,0 +1,168 @@
+"""
+结构化日志
+应用日志统一挂在'app'日志器下（不受Celery接管根日志器影响），支持按模块设置级别。
+业务线程只做级别判断、参数合并和截断后非阻塞入队，由后台线程格式化（text或json）并写出；
+队列满时丢弃，不阻塞Worker。每条日志附带当前trace ID。
+"""
+
+import os
+import sys
+import copy
+import json
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+from app.monitoring.tracing import current_trace_id
+
+# LogRecord自带的属性，其余属性视为通过extra传入的结构化字段
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'trace_id'}
+
+
+def truncate(value, max_length):
+    """截断过长的字符串，非基础类型先转为字符串"""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if not isinstance(value, str):
+        value = str(value)
+    if max_length and len(value) > max_length:
+        return f"{value[:max_length]}...(共{len(value)}字符)"
+    return value
+
+
+def record_fields(record):
+    """通过extra传入的结构化字段"""
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS and not key.startswith('_')}
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出一行JSON"""
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process
+        }
+        if getattr(record, 'trace_id', None):
+            data['trace_id'] = record.trace_id
+        data.update(record_fields(record))
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """可读文本格式，结构化字段以key=value追加在消息后"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = record_fields(record)
+        if getattr(record, 'trace_id', None):
+            fields['trace_id'] = record.trace_id
+        if fields:
+            suffix = ' '.join(f"{key}={value}" for key, value in fields.items())
+            # 异常堆栈在最后
+            if record.exc_text:
+                head, _, tail = line.partition('\n')
+                return f"{head} {suffix}\n{tail}"
+            line = f"{line} {suffix}"
+        return line
+
+
+class AsyncQueueHandler(QueueHandler):
+    """非阻塞队列Handler，每个进程启动一个写出线程（prefork子进程不继承父进程的线程）"""
+
+    def __init__(self, target, max_length=500, queue_size=10000):
+        super().__init__(None)
+        self.target = target
+        self.max_length = max_length
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self.queue = queue.Queue(maxsize=self.queue_size)
+                self._listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+                self._listener.start()
+                self._pid = os.getpid()
+
+    def prepare(self, record):
+        # 参数在调用线程合并（对象可能随后被修改），格式化留给写出线程
+        record = copy.copy(record)
+        record.msg = truncate(record.getMessage(), self.max_length)
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        for key, value in record_fields(record).items():
+            setattr(record, key, truncate(value, self.max_length))
+        record.trace_id = current_trace_id()
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """写出队列中剩余的日志并停止写出线程"""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+        self._listener = None
+        self._pid = None
+
+
+_handler = None
+
+
+def init_logging(config):
+    """
+    根据LOGGING_CONFIG配置'app'日志器
+
+    Args:
+        config: 包含level、format、levels、max_length、queue_size的字典
+    """
+    global _handler
+
+    target = logging.StreamHandler(sys.stdout)
+    target.setFormatter(JsonFormatter() if config.get('format') == 'json' else TextFormatter())
+    handler = AsyncQueueHandler(
+        target,
+        max_length=config.get('max_length', 500),
+        queue_size=config.get('queue_size', 10000)
+    )
+
+    logger = logging.getLogger('app')
+    # 多次create_app（如测试）时替换之前的Handler
+    if _handler is not None:
+        logger.removeHandler(_handler)
+        _handler.stop()
+    else:
+        atexit.register(lambda: _handler and _handler.stop())
+    _handler = handler
+
+    logger.addHandler(handler)
+    logger.setLevel(config.get('level', 'INFO'))
+    logger.propagate = False
+
+    for name, level in config.get('levels', {}).items():
+        logging.getLogger(name).setLevel(level)
+
+    return logger
@@ -0,0 +1,352 @@
+"""
+Prometheus指标
+Web进程通过/metrics暴露，Celery Worker在主进程中启动独立的HTTP导出端口。
+设置PROMETHEUS_MULTIPROC_DIR时使用多进程模式（prefork Worker、多进程Web服务器）。
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+    generate_latest, start_http_server, CONTENT_TYPE_LATEST
+)
+from prometheus_client.core import GaugeMetricFamily
+from app.monitoring.tracing import span
+
+# 流水线各阶段耗时从几十毫秒到几十秒不等
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+HTTP_REQUEST_DURATION = Histogram(
+    'ai_agent_http_request_duration_seconds',
+    'HTTP请求耗时',
+    ['method', 'endpoint', 'status']
+)
+
+STAGE_DURATION = Histogram(
+    'ai_agent_pipeline_stage_duration_seconds',
+    'AI Agent处理流程各阶段耗时',
+    ['stage'],
+    buckets=STAGE_BUCKETS
+)
+
+DEEPSEEK_REQUESTS = Counter(
+    'ai_agent_deepseek_requests_total',
+    'DeepSeek API请求数',
+    ['status']
+)
+
+DEEPSEEK_DURATION = Histogram(
+    'ai_agent_deepseek_request_duration_seconds',
+    'DeepSeek API请求耗时',
+    buckets=STAGE_BUCKETS
+)
+
+DEEPSEEK_TOKENS = Counter(
+    'ai_agent_deepseek_tokens_total',
+    'DeepSeek API消耗的token数',
+    ['type']
+)
+
+DEEPSEEK_RETRIES = Counter(
+    'ai_agent_deepseek_retries_total',
+    'DeepSeek API重试次数',
+    ['reason']
+)
+
+DEEPSEEK_ATTEMPTS = Histogram(
+    'ai_agent_deepseek_call_attempts',
+    '每次DeepSeek调用的尝试次数（含重试）',
+    buckets=(1, 2, 3, 4, 5, 8)
+)
+
+DEEPSEEK_HEDGES = Counter(
+    'ai_agent_deepseek_hedges_total',
+    '发出对冲请求的DeepSeek调用数，按先返回的请求统计（对冲胜率 = hedge / 全部）',
+    ['winner']
+)
+
+RATE_LIMIT_WAIT = Histogram(
+    'ai_agent_rate_limit_wait_seconds',
+    '等待DeepSeek限流配额的时间',
+    ['lane'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+RATE_LIMIT_REJECTED = Counter(
+    'ai_agent_rate_limit_rejected_total',
+    '超过最长等待时间仍未获得DeepSeek限流配额的请求数',
+    ['lane']
+)
+
+LLM_BACKEND_OUTSTANDING = Gauge(
+    'ai_agent_llm_backend_outstanding',
+    '各LLM后端的在途请求数',
+    ['backend'],
+    multiprocess_mode='livesum'
+)
+
+LLM_BACKEND_COOLDOWNS = Counter(
+    'ai_agent_llm_backend_cooldowns_total',
+    'LLM后端被移出轮换的次数',
+    ['backend', 'reason']
+)
+
+SEARCH_REQUESTS = Counter(
+    'ai_agent_search_requests_total',
+    '搜索引擎请求数',
+    ['engine', 'status']
+)
+
+SEARCH_DURATION = Histogram(
+    'ai_agent_search_duration_seconds',
+    '搜索引擎请求耗时',
+    ['engine'],
+    buckets=STAGE_BUCKETS
+)
+
+CRAWL_REQUESTS = Counter(
+    'ai_agent_crawl_requests_total',
+    '网页爬取请求数',
+    ['status']
+)
+
+CRAWL_DURATION = Histogram(
+    'ai_agent_crawl_duration_seconds',
+    '网页爬取耗时（不含防封延迟）',
+    buckets=STAGE_BUCKETS
+)
+
+CIRCUIT_STATE = Gauge(
+    'ai_agent_circuit_state',
+    '外部依赖熔断器状态（0关闭，1半开，2熔断）',
+    ['dependency'],
+    multiprocess_mode='max'
+)
+
+CACHE_REQUESTS = Counter(
+    'ai_agent_cache_requests_total',
+    '缓存查询数（命中率 = hit / 全部）',
+    ['cache', 'result']
+)
+
+SOCKETIO_CONNECTIONS = Gauge(
+    'ai_agent_socketio_connections',
+    '当前实例的SocketIO连接数',
+    multiprocess_mode='livesum'
+)
+
+CELERY_TASKS = Counter(
+    'ai_agent_celery_tasks_total',
+    'Celery任务执行数',
+    ['task', 'state']
+)
+
+TASK_CANCELLATIONS = Counter(
+    'ai_agent_task_cancellations_total',
+    '被取消的问题任务数（disconnected客户端断开，superseded重新提问，requested客户端取消）',
+    ['reason']
+)
+
+CELERY_TASK_DURATION = Histogram(
+    'ai_agent_celery_task_duration_seconds',
+    'Celery任务执行耗时',
+    ['task'],
+    buckets=STAGE_BUCKETS
+)
+
+
+@contextmanager
+def observe_stage(stage):
+    """记录流程阶段耗时（同时记录为追踪span）"""
+    start = time.perf_counter()
+    try:
+        with span(f"stage.{stage}"):
+            yield
+    finally:
+        STAGE_DURATION.labels(stage=stage).observe(time.perf_counter() - start)
+
+
+def priority_queue_suffixes(priority_steps=None, sep=None):
+    """
+    Redis broker启用优先级时每个队列拆分为多个list：优先级0为队列名本身，其余为"队列名{sep}{优先级}"，
+    返回各list相对队列名的后缀，未指定时使用celeryconfig的BROKER_TRANSPORT_OPTIONS
+    """
+    if priority_steps is None or sep is None:
+        from app.celeryconfig import BROKER_TRANSPORT_OPTIONS
+        priority_steps = BROKER_TRANSPORT_OPTIONS.get('priority_steps', [0]) if priority_steps is None else priority_steps
+        sep = BROKER_TRANSPORT_OPTIONS.get('sep', ':') if sep is None else sep
+    return [''] + [f"{sep}{step}" for step in priority_steps if step]
+
+
+def celery_queue_depth(redis_client, queue, suffixes=None):
+    """Celery队列积压任务数（所有优先级的list之和）"""
+    suffixes = priority_queue_suffixes() if suffixes is None else suffixes
+    return sum(redis_client.llen(f"{queue}{suffix}") for suffix in suffixes)
+
+
+class DependencyCollector:
+    """抓取时探测Redis/MongoDB往返时间和Celery队列积压"""
+
+    # 依赖不可用时不能拖慢整个抓取（MongoDB默认服务器选择超时为30秒）
+    PROBE_TIMEOUT = 2
+
+    def __init__(self, queues, priority_steps=(0,), sep=':'):
+        self.queues = queues
+        self.priority_suffixes = priority_queue_suffixes(priority_steps, sep)
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='metrics-probe')
+
+    def _get_redis_client(self):
+        from app.ext import redis_store
+        return redis_store._redis_client
+
+    def _families(self):
+        return (
+            GaugeMetricFamily('ai_agent_dependency_rtt_seconds', '依赖服务往返时间（探测失败为-1）', labels=['dependency']),
+            GaugeMetricFamily('ai_agent_celery_queue_depth', 'Celery队列积压任务数', labels=['queue'])
+        )
+
+    def _probe(self, ping):
+        """执行一次探测，返回耗时，失败或超时返回-1"""
+        def timed():
+            start = time.perf_counter()
+            ping()
+            return time.perf_counter() - start
+
+        try:
+            return self._executor.submit(timed).result(timeout=self.PROBE_TIMEOUT)
+        except Exception:
+            return -1
+
+    def describe(self):
+        # 注册时不执行探测（未定义describe时registry会调用collect）
+        return list(self._families())
+
+    def collect(self):
+        from mongoengine.connection import get_db
+
+        rtt, queue_depth = self._families()
+        redis_client = self._get_redis_client()
+
+        redis_rtt = self._probe(redis_client.ping) if redis_client is not None else -1
+        rtt.add_metric(['redis'], redis_rtt)
+        rtt.add_metric(['mongodb'], self._probe(lambda: get_db().command('ping')))
+
+        # Redis broker中每个队列（的每个优先级）是一个list
+        if redis_rtt >= 0:
+            for queue in self.queues:
+                try:
+                    queue_depth.add_metric([queue], celery_queue_depth(redis_client, queue, self.priority_suffixes))
+                except Exception:
+                    pass
+
+        yield rtt
+        yield queue_depth
+
+
+def _is_multiprocess():
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+def _collect_registry(dependency_collector=None):
+    """多进程模式下每次抓取汇总所有进程的指标文件"""
+    if not _is_multiprocess():
+        return REGISTRY
+
+    from prometheus_client import multiprocess
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    if dependency_collector is not None:
+        registry.register(dependency_collector)
+    return registry
+
+
+def init_app_metrics(app):
+    """注册HTTP请求耗时统计和/metrics端点"""
+    from flask import Response, g, request
+
+    config = app.config.get('METRICS_CONFIG', {})
+    if not config.get('enabled', True):
+        return
+
+    from app.celeryconfig import BROKER_TRANSPORT_OPTIONS
+    dependency_collector = DependencyCollector(
+        config.get('queues', ['default']),
+        BROKER_TRANSPORT_OPTIONS.get('priority_steps', [0]),
+        BROKER_TRANSPORT_OPTIONS.get('sep', ':')
+    )
+    if not _is_multiprocess():
+        try:
+            REGISTRY.register(dependency_collector)
+        except ValueError:
+            # 同一进程内多次create_app（如测试）时已注册
+            pass
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop('_metrics_start', None)
+        if start is not None:
+            # 使用路由规则而不是原始路径，避免会话ID等导致标签爆炸
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            HTTP_REQUEST_DURATION.labels(
+                method=request.method,
+                endpoint=endpoint,
+                status=response.status_code
+            ).observe(time.perf_counter() - start)
+        return response
+
+    def metrics():
+        registry = _collect_registry(dependency_collector)
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
+
+
+_celery_metrics_initialized = False
+
+
+def init_celery_metrics(config):
+    """统计Celery任务执行情况，并在Worker主进程启动指标导出端口"""
+    global _celery_metrics_initialized
+    from celery import signals
+
+    # 信号是全局的，多次create_app时只连接一次
+    if not config.get('enabled', True) or _celery_metrics_initialized:
+        return
+    _celery_metrics_initialized = True
+
+    task_starts = {}
+
+    @signals.task_prerun.connect(weak=False)
+    def _task_prerun(task_id=None, **kwargs):
+        task_starts[task_id] = time.perf_counter()
+
+    @signals.task_postrun.connect(weak=False)
+    def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+        start = task_starts.pop(task_id, None)
+        name = task.name if task else 'unknown'
+        CELERY_TASKS.labels(task=name, state=state or 'UNKNOWN').inc()
+        if start is not None:
+            CELERY_TASK_DURATION.labels(task=name).observe(time.perf_counter() - start)
+
+    @signals.worker_init.connect(weak=False)
+    def _start_exporter(**kwargs):
+        port = config.get('worker_port')
+        if not port:
+            return
+        try:
+            start_http_server(port, registry=_collect_registry())
+            print(f"📊 Worker指标导出端口: {port}")
+        except OSError as e:
+            print(f"⚠️ Worker指标导出端口启动失败: {str(e)}")
+
+    @signals.worker_process_shutdown.connect(weak=False)
+    def _mark_process_dead(pid=None, **kwargs):
+        if _is_multiprocess():
+            from prometheus_client import multiprocess
+            multiprocess.mark_process_dead(pid or os.getpid())
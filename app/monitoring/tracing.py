@@ -0,0 +1,351 @@
+"""
+轻量级分布式追踪
+Flask路由生成trace ID，通过W3C traceparent头在HTTP请求、Celery消息之间传播，
+服务调用和存储操作记录为span，由后台线程批量导出到本地文件（JSON Lines）或OTLP/HTTP JSON收集器。
+"""
+
+import os
+import json
+import time
+import queue
+import random
+import logging
+import secrets
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# 当前span（contextvars在线程和协程间相互隔离）
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+
+class Span:
+    """一次操作的耗时记录"""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'sampled', 'attributes', 'start_time', 'end_time', 'status', 'error')
+
+    def __init__(self, name, trace_id=None, parent_id=None, sampled=True, attributes=None):
+        self.trace_id = trace_id or secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.sampled = sampled
+        self.attributes = dict(attributes or {})
+        self.start_time = time.time()
+        self.end_time = None
+        self.status = 'ok'
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_error(self, error):
+        self.status = 'error'
+        self.error = str(error)
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'duration_ms': round((self.end_time - self.start_time) * 1000, 3) if self.end_time else None,
+            'attributes': self.attributes,
+            'status': self.status,
+            'error': self.error
+        }
+
+
+def parse_traceparent(traceparent):
+    """解析traceparent头，返回(trace_id, parent_span_id, sampled)，格式错误时返回None"""
+    try:
+        version, trace_id, span_id, flags = traceparent.strip().split('-')
+        if len(trace_id) != 32 or len(span_id) != 16:
+            return None
+        int(trace_id, 16), int(span_id, 16)
+        return trace_id, span_id, bool(int(flags, 16) & 1)
+    except (AttributeError, ValueError):
+        return None
+
+
+class FileExporter:
+    """以JSON Lines追加写入本地文件"""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, spans, service_name):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for span in spans:
+                f.write(json.dumps(dict(span.to_dict(), service=service_name), ensure_ascii=False) + '\n')
+
+
+class OTLPExporter:
+    """以OTLP/HTTP JSON格式发送到收集器"""
+
+    def __init__(self, endpoint, timeout=5):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    @staticmethod
+    def _attribute(key, value):
+        if isinstance(value, bool):
+            return {'key': key, 'value': {'boolValue': value}}
+        if isinstance(value, int):
+            return {'key': key, 'value': {'intValue': str(value)}}
+        if isinstance(value, float):
+            return {'key': key, 'value': {'doubleValue': value}}
+        return {'key': key, 'value': {'stringValue': str(value)}}
+
+    def _span(self, span):
+        attributes = [self._attribute(key, value) for key, value in span.attributes.items()]
+        data = {
+            'traceId': span.trace_id,
+            'spanId': span.span_id,
+            'name': span.name,
+            'kind': 1,
+            'startTimeUnixNano': str(int(span.start_time * 1e9)),
+            'endTimeUnixNano': str(int(span.end_time * 1e9)),
+            'attributes': attributes,
+            'status': {'code': 2, 'message': span.error} if span.status == 'error' else {'code': 1}
+        }
+        if span.parent_id:
+            data['parentSpanId'] = span.parent_id
+        return data
+
+    def export(self, spans, service_name):
+        payload = {
+            'resourceSpans': [{
+                'resource': {'attributes': [self._attribute('service.name', service_name)]},
+                'scopeSpans': [{
+                    'scope': {'name': 'app.monitoring.tracing'},
+                    'spans': [self._span(span) for span in spans]
+                }]
+            }]
+        }
+        response = self.session.post(self.endpoint, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+
+
+class Tracer:
+    """创建span并通过后台线程批量导出"""
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 1.0
+        self.service_name = 'ai-agent'
+        self.batch_size = 100
+        self.flush_interval = 1.0
+        self.exporter = None
+        self._queue = None
+        self._max_queue_size = 10000
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def configure(self, config):
+        """根据TRACING_CONFIG配置追踪"""
+        exporter = config.get('exporter', 'none')
+        self.enabled = config.get('enabled', False) and exporter != 'none'
+        self.sample_rate = config.get('sample_rate', 1.0)
+        self.service_name = config.get('service_name', 'ai-agent')
+        self.batch_size = config.get('batch_size', 100)
+        self.flush_interval = config.get('flush_interval', 1.0)
+        self._max_queue_size = config.get('max_queue_size', 10000)
+
+        if exporter == 'file':
+            self.exporter = FileExporter(config['file_path'])
+        elif exporter == 'otlp':
+            self.exporter = OTLPExporter(config['otlp_endpoint'])
+        else:
+            self.exporter = None
+
+    def start_span(self, name, parent=None, traceparent=None, attributes=None):
+        """创建span：优先使用traceparent，其次parent，都没有时开始新的trace"""
+        if traceparent:
+            parsed = parse_traceparent(traceparent)
+            if parsed:
+                trace_id, parent_id, sampled = parsed
+                return Span(name, trace_id=trace_id, parent_id=parent_id, sampled=sampled, attributes=attributes)
+
+        if parent is not None:
+            return Span(name, trace_id=parent.trace_id, parent_id=parent.span_id, sampled=parent.sampled, attributes=attributes)
+
+        return Span(name, sampled=random.random() < self.sample_rate, attributes=attributes)
+
+    def end_span(self, span):
+        """结束span并放入导出队列（队列满时丢弃，不阻塞业务）"""
+        span.end_time = time.time()
+        if not self.enabled or not span.sampled or self.exporter is None:
+            return
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            pass
+
+    def _ensure_worker(self):
+        """每个进程启动一个导出线程（prefork子进程不继承父进程的线程）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self._max_queue_size)
+                threading.Thread(target=self._export_loop, args=(self._queue,), daemon=True, name='trace-exporter').start()
+                self._pid = os.getpid()
+
+    def _export_loop(self, span_queue):
+        while True:
+            batch = [span_queue.get()]
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(span_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self.exporter.export(batch, self.service_name)
+            except Exception as e:
+                # 导出线程中没有当前span，日志不会产生新的span，不会递归
+                logger.warning("⚠️ 导出追踪数据失败: %s", e)
+
+
+tracer = Tracer()
+
+
+def current_span() -> Optional[Span]:
+    """获取当前span"""
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    """获取当前trace ID"""
+    span = _current_span.get()
+    return span.trace_id if span else None
+
+
+@contextmanager
+def span(name: str, **attributes: Any):
+    """在当前trace中记录一个子span"""
+    new_span = tracer.start_span(name, parent=_current_span.get(), attributes=attributes)
+    token = _current_span.set(new_span)
+    try:
+        yield new_span
+    except Exception as e:
+        new_span.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        tracer.end_span(new_span)
+
+
+def inject_headers(headers: Dict[str, Any]) -> Dict[str, Any]:
+    """将当前trace上下文写入headers"""
+    current = _current_span.get()
+    if current is not None:
+        headers['traceparent'] = current.traceparent
+    return headers
+
+
+def init_app_tracing(app):
+    """Flask请求开始时创建根span（接受上游traceparent），响应头返回X-Trace-Id"""
+    from flask import g, request
+
+    config = app.config.get('TRACING_CONFIG', {})
+    tracer.configure(config)
+    if not config.get('enabled', False):
+        return
+
+    @app.before_request
+    def _start_request_span():
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_span = tracer.start_span(
+            f"HTTP {request.method} {endpoint}",
+            traceparent=request.headers.get('traceparent'),
+            attributes={'http.method': request.method, 'http.route': endpoint}
+        )
+        g._trace_span = request_span
+        g._trace_token = _current_span.set(request_span)
+
+    @app.after_request
+    def _add_trace_header(response):
+        request_span = g.get('_trace_span')
+        if request_span is not None:
+            request_span.set_attribute('http.status_code', response.status_code)
+            response.headers['X-Trace-Id'] = request_span.trace_id
+        return response
+
+    @app.teardown_request
+    def _end_request_span(error=None):
+        request_span = g.pop('_trace_span', None)
+        token = g.pop('_trace_token', None)
+        if request_span is None:
+            return
+        if error is not None:
+            request_span.record_error(error)
+        if token is not None:
+            _current_span.reset(token)
+        tracer.end_span(request_span)
+
+
+_celery_tracing_initialized = False
+
+
+def init_celery_tracing(config):
+    """通过Celery消息头传播trace上下文，每个任务执行记录一个span"""
+    global _celery_tracing_initialized
+    from celery import signals
+
+    tracer.configure(config)
+    if not config.get('enabled', False) or _celery_tracing_initialized:
+        return
+    _celery_tracing_initialized = True
+
+    task_spans = {}
+
+    @signals.before_task_publish.connect(weak=False)
+    def _inject(headers=None, **kwargs):
+        if headers is not None:
+            inject_headers(headers)
+
+    @signals.task_prerun.connect(weak=False)
+    def _start_task_span(task_id=None, task=None, **kwargs):
+        task_span = tracer.start_span(
+            f"celery.task {task.name}",
+            traceparent=getattr(task.request, 'traceparent', None),
+            attributes={'celery.task_id': task_id}
+        )
+        task_spans[task_id] = (task_span, _current_span.set(task_span))
+
+    @signals.task_postrun.connect(weak=False)
+    def _end_task_span(task_id=None, state=None, **kwargs):
+        entry = task_spans.pop(task_id, None)
+        if entry is None:
+            return
+        task_span, token = entry
+        task_span.set_attribute('celery.state', state or 'UNKNOWN')
+        if state == 'FAILURE':
+            task_span.status = 'error'
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # token不属于当前上下文时直接清除
+            _current_span.set(None)
+        tracer.end_span(task_span)
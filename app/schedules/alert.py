@@ -1,8 +1,16 @@
 """
 告警相关任务
 """
+import os
+import json
+import time
+import shutil
+import logging
+from flask import current_app
 from app.ext import celery
 
+logger = logging.getLogger(__name__)
+
 @celery.task(bind=True)
 def send_alert(self, message, alert_type='info'):
     """
@@ -55,33 +63,218 @@ def send_alert(self, message, alert_type='info'):
             'error': str(e)
         }
 
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def _read_rss_mb(pid):
+    """读取进程常驻内存（MB），仅支持Linux"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 2)
+    except OSError:
+        pass
+    return None
+
+
+def probe_redis(queues):
+    """探测Redis：PING延迟、内存、客户端数和各队列积压"""
+    from app.ext import redis_store
+    from app.monitoring.metrics import celery_queue_depth
+    redis_client = redis_store._redis_client
+    
+    try:
+        start = time.perf_counter()
+        redis_client.ping()
+        latency_ms = _elapsed_ms(start)
+        
+        info = redis_client.info()
+        return {
+            'status': 'healthy',
+            'latency_ms': latency_ms,
+            'used_memory_mb': round(info.get('used_memory', 0) / 1024 / 1024, 2),
+            'connected_clients': info.get('connected_clients'),
+            # 启用优先级时每个队列的积压分布在多个list中
+            'queues': {queue: celery_queue_depth(redis_client, queue) for queue in queues}
+        }
+    except Exception as e:
+        return {'status': 'unhealthy', 'error': str(e)}
+
+
+def probe_mongodb(slow_query_seconds):
+    """探测MongoDB：ping延迟和正在运行的慢查询数"""
+    from mongoengine.connection import get_db
+    
+    try:
+        db = get_db()
+        start = time.perf_counter()
+        db.command('ping')
+        latency_ms = _elapsed_ms(start)
+        
+        # currentOp需要相应权限，失败时不影响健康状态
+        try:
+            current_op = db.client.admin.command('currentOp', {
+                'active': True,
+                'secs_running': {'$gte': slow_query_seconds}
+            })
+            slow_queries = len(current_op.get('inprog', []))
+        except Exception:
+            slow_queries = None
+        
+        return {'status': 'healthy', 'latency_ms': latency_ms, 'slow_queries': slow_queries}
+    except Exception as e:
+        return {'status': 'unhealthy', 'error': str(e)}
+
+
+def probe_deepseek():
+    """探测DeepSeek：max_tokens=1的补全请求延迟"""
+    from app.services.registry import get_deepseek_service
+    
+    try:
+        latency = get_deepseek_service().ping()
+        return {'status': 'healthy', 'latency_ms': round(latency * 1000, 2)}
+    except Exception as e:
+        return {'status': 'unhealthy', 'error': str(e)}
+
+
+def probe_search():
+    """探测各搜索引擎：延迟和结果数"""
+    from app.services.registry import get_search_service
+    
+    search_service = get_search_service()
+    engines = {
+        'duckduckgo': search_service._search_duckduckgo,
+        'google': search_service._search_google
+    }
+    
+    results = {}
+    for engine, search in engines.items():
+        if not search_service.config.get(engine, {}).get('enabled'):
+            continue
+        start = time.perf_counter()
+        count = len(search('health check'))
+        results[engine] = {
+            # 搜索方法内部捕获异常，无结果视为不可用
+            'status': 'healthy' if count else 'unhealthy',
+            'latency_ms': _elapsed_ms(start),
+            'results': count
+        }
+    return results
+
+
+def probe_worker():
+    """当前Worker进程及其主进程的常驻内存"""
+    return {
+        'pid': os.getpid(),
+        'rss_mb': _read_rss_mb(os.getpid()),
+        'parent_rss_mb': _read_rss_mb(os.getppid())
+    }
+
+
+def evaluate_thresholds(probes, thresholds):
+    """根据阈值生成告警列表[(消息, 告警类型)]"""
+    alerts = []
+    
+    def check_latency(name, probe, threshold_key):
+        if not probe:
+            return
+        if probe.get('status') == 'unhealthy':
+            alerts.append((f"{name}不可用: {probe.get('error', '探测失败')}", 'error'))
+        elif probe.get('latency_ms') is not None and probe['latency_ms'] > thresholds[threshold_key]:
+            alerts.append((f"{name}延迟过高: {probe['latency_ms']}ms (阈值 {thresholds[threshold_key]}ms)", 'warning'))
+    
+    check_latency('Redis', probes.get('redis'), 'redis_latency_ms')
+    check_latency('MongoDB', probes.get('mongodb'), 'mongodb_latency_ms')
+    check_latency('DeepSeek', probes.get('deepseek'), 'deepseek_latency_ms')
+    for engine, probe in (probes.get('search') or {}).items():
+        check_latency(f"搜索引擎{engine}", probe, 'search_latency_ms')
+    
+    for queue, length in (probes.get('redis') or {}).get('queues', {}).items():
+        if length > thresholds['queue_backlog']:
+            alerts.append((f"队列{queue}积压: {length} (阈值 {thresholds['queue_backlog']})", 'warning'))
+    
+    slow_queries = (probes.get('mongodb') or {}).get('slow_queries')
+    if slow_queries is not None and slow_queries > thresholds['mongodb_slow_queries']:
+        alerts.append((f"MongoDB慢查询: {slow_queries} (阈值 {thresholds['mongodb_slow_queries']})", 'warning'))
+    
+    rss_mb = (probes.get('worker') or {}).get('rss_mb')
+    if rss_mb is not None and rss_mb > thresholds['worker_rss_mb']:
+        alerts.append((f"Worker内存过高: {rss_mb}MB (阈值 {thresholds['worker_rss_mb']}MB)", 'warning'))
+    
+    return alerts
+
+
+def store_health_history(record, config):
+    """将检查结果写入Redis时间序列并清理过期记录"""
+    from app.ext import redis_store
+    redis_client = redis_store._redis_client
+    
+    try:
+        pipe = redis_client.pipeline()
+        pipe.zadd(config['history_key'], {json.dumps(record, ensure_ascii=False): record['timestamp']})
+        pipe.zremrangebyscore(config['history_key'], 0, record['timestamp'] - config['history_retention'])
+        pipe.execute()
+        return True
+    except Exception as e:
+        logger.warning("⚠️ 保存健康检查结果失败: %s", e)
+        return False
+
+
 @celery.task(bind=True)
 def check_system_health(self):
     """
     检查系统健康状态
     """
     try:
+        config = current_app.config['HEALTH_CHECK_CONFIG']
+        queues = current_app.config['METRICS_CONFIG']['queues']
+        
         self.update_state(
             state='PROGRESS',
             meta={'status': '检查系统状态...', 'progress': 30}
         )
         
-        # 这里可以添加系统健康检查逻辑
-        # 例如：检查数据库连接、Redis连接、磁盘空间等
+        probes = {
+            'redis': probe_redis(queues),
+            'mongodb': probe_mongodb(config['slow_query_seconds']),
+            'deepseek': probe_deepseek() if config['probe_deepseek'] else None,
+            'search': probe_search() if config['probe_search'] else None,
+            'worker': probe_worker()
+        }
         
         self.update_state(
             state='PROGRESS',
             meta={'status': '分析检查结果...', 'progress': 70}
         )
         
-        # 模拟检查结果
+        alerts = evaluate_thresholds(probes, config['thresholds'])
+        for message, alert_type in alerts:
+            send_alert.delay(message, alert_type)
+        
+        search_probes = probes['search'] or {}
+        disk = shutil.disk_usage('/')
         health_status = {
-            'database': 'healthy',
-            'redis': 'healthy',
-            'disk_space': 'healthy',
-            'memory': 'healthy'
+            'database': probes['mongodb']['status'],
+            'redis': probes['redis']['status'],
+            'deepseek': probes['deepseek']['status'] if probes['deepseek'] else 'skipped',
+            'search': (
+                'skipped' if probes['search'] is None
+                else 'healthy' if any(probe['status'] == 'healthy' for probe in search_probes.values())
+                else 'unhealthy'
+            ),
+            'disk_space': 'healthy' if disk.free / disk.total > 0.1 else 'unhealthy',
+            'memory': 'unhealthy' if (probes['worker']['rss_mb'] or 0) > config['thresholds']['worker_rss_mb'] else 'healthy'
         }
         
+        store_health_history({
+            'timestamp': int(time.time()),
+            'health_status': health_status,
+            'probes': probes,
+            'alerts': [message for message, _ in alerts]
+        }, config)
+        
         self.update_state(
             state='SUCCESS',
             meta={
@@ -93,7 +286,9 @@ def check_system_health(self):
         
         return {
             'status': 'SUCCESS',
-            'health_status': health_status
+            'health_status': health_status,
+            'probes': probes,
+            'alerts': [message for message, _ in alerts]
         }
         
     except Exception as e:
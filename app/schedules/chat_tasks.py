@@ -1,80 +1,137 @@
 """
 聊天相关任务 - 优化版本，直接使用SocketIO推送结果
 """
-from app.services.ai_agent_service import AIAgentService
+from app.services.registry import get_ai_agent_service
 from flask import current_app
 from app.ext import redis_store, celery, socketio
-import traceback
+from app.monitoring.tracing import span, current_trace_id
+from app.services.token_usage import usage_context
+from app.services.cancellation import cancellation_scope, check_cancelled, get_cancellation, TaskCancelled
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 @celery.task(bind=True)
-def process_question_async(self, question, session_id):
+def process_question_async(self, question, session_id, user=None, downgraded=False):
     """
     异步处理用户问题 - 优化版本，直接通过SocketIO推送结果
     
     Args:
         question: 用户问题
         session_id: 会话ID
+        user: 钱包地址（已登录用户），token用量计入该用户
+        downgraded: 用户接近当日配额，回答使用降级的模型配置
         
     Returns:
         dict: 处理结果
     """
+    # 客户端断开、重新提问或发送cancel_task后，流程在阶段之间中止
+    with usage_context(session_id=session_id, user=user, downgraded=downgraded) as usage, cancellation_scope(self.request.id):
+        try:
+            return _process_question(self, question, session_id, usage)
+        finally:
+            get_cancellation().unregister(session_id, self.request.id)
+
+def _process_question(task, question, session_id, usage):
+    """process_question_async的处理流程，task为Celery任务实例，usage为本次任务的token用量"""
     try:
-        print(f"🚀 开始处理问题: {question[:50]}...")
+        # 排队期间已被取消的任务直接结束，不占用Worker
+        check_cancelled()
+        logger.info("🚀 开始处理问题: %s", question[:50], extra={'session_id': session_id})
         
         # 发送开始处理的消息
         send_socketio_message({
-            'task_id': self.request.id,
+            'task_id': task.request.id,
             'state': 'PROGRESS',
             'status': '开始分析问题...',
             'progress': 10
         }, session_id)
         
-        # 创建AI Agent服务实例
-        ai_agent = AIAgentService()
+        # 获取进程内共享的AI Agent服务实例
+        ai_agent = get_ai_agent_service()
         
         # 发送分析状态
         send_socketio_message({
-            'task_id': self.request.id,
+            'task_id': task.request.id,
             'state': 'PROGRESS',
             'status': '分析问题是否需要搜索...',
             'progress': 20
         }, session_id)
         
+        # 每个来源爬取完成后立即推送摘要
+        def on_source_ready(source_summary):
+            send_socketio_message({
+                'task_id': task.request.id,
+                'source': source_summary
+            }, session_id, event='source_ready')
+        
         # 处理问题
-        result = ai_agent.process_question(question)
+        result = ai_agent.process_question(question, on_source_ready=on_source_ready)
+        
+        # 完整来源内容存入Redis，推送和持久化只携带来源摘要
+        from app.socketio.storage import SocketIOStorage
+        sources = result.get('sources', [])
+        if sources:
+            with span('storage.store_task_sources', sources=len(sources)):
+                SocketIOStorage().store_task_sources(task.request.id, sources, session_id)
+        
+        summary_result = dict(result)
+        summary_result['sources'] = ai_agent.summarize_sources(sources)
+        summary_result['usage'] = {
+            'prompt_tokens': usage['prompt_tokens'],
+            'completion_tokens': usage['completion_tokens'],
+            'calls': usage['calls'],
+            'downgraded': usage['downgraded']
+        }
         
         # 保存AI回答到会话（如果用户已登录）
         try:
-            save_ai_response_to_session.delay(session_id, result)
+            save_ai_response_to_session.delay(session_id, summary_result)
         except Exception as e:
-            print(f"⚠️ 保存AI回答到会话失败: {str(e)}")
+            logger.warning("⚠️ 保存AI回答到会话失败: %s", e)
         
         # 直接通过SocketIO发送完成结果
         final_response = {
-            'task_id': self.request.id,
+            'task_id': task.request.id,
             'state': 'SUCCESS',
             'status': '处理完成',
             'progress': 100,
-            'result': result
+            'result': summary_result
         }
         
         send_socketio_message(final_response, session_id)
-        print(f"✅ 问题处理完成，结果已推送: {session_id}")
+        logger.info("✅ 问题处理完成，结果已推送: %s", session_id)
         
         return {
             'status': 'SUCCESS',
-            'result': result,
+            'result': summary_result,
+            'session_id': session_id
+        }
+        
+    except TaskCancelled as e:
+        logger.info("🛑 问题处理已取消（%s）: %s", e.reason, task.request.id, extra={'session_id': session_id})
+        
+        send_socketio_message({
+            'task_id': task.request.id,
+            'state': 'REVOKED',
+            'status': '已取消',
+            'progress': 0,
+            'reason': e.reason
+        }, session_id)
+        
+        return {
+            'status': 'REVOKED',
+            'reason': e.reason,
             'session_id': session_id
         }
         
     except Exception as e:
-        print(f"❌ 处理问题失败: {str(e)}")
-        traceback.print_exc()
+        logger.exception("❌ 处理问题失败: %s", e)
         
         # 直接通过SocketIO发送错误结果
         error_response = {
-            'task_id': self.request.id,
+            'task_id': task.request.id,
             'state': 'FAILURE',
             'status': f'处理失败: {str(e)}',
             'progress': 0,
@@ -102,7 +159,7 @@ def get_suggestions_async(self, question, session_id):
         dict: 建议结果
     """
     try:
-        print(f"🚀 开始生成搜索建议: {question[:50]}...")
+        logger.info("🚀 开始生成搜索建议: %s", question[:50], extra={'session_id': session_id})
         
         # 发送开始处理的消息
         send_socketio_message({
@@ -112,8 +169,9 @@ def get_suggestions_async(self, question, session_id):
             'progress': 50
         }, session_id)
         
-        ai_agent = AIAgentService()
-        suggestions = ai_agent.get_search_suggestions(question)
+        ai_agent = get_ai_agent_service()
+        with usage_context(session_id=session_id):
+            suggestions = ai_agent.get_search_suggestions(question)
         
         # 直接通过SocketIO发送完成结果
         final_response = {
@@ -125,7 +183,7 @@ def get_suggestions_async(self, question, session_id):
         }
         
         send_socketio_message(final_response, session_id)
-        print(f"✅ 搜索建议生成完成，结果已推送: {session_id}")
+        logger.info("✅ 搜索建议生成完成，结果已推送: %s", session_id)
         
         return {
             'status': 'SUCCESS',
@@ -134,8 +192,7 @@ def get_suggestions_async(self, question, session_id):
         }
         
     except Exception as e:
-        print(f"❌ 生成搜索建议失败: {str(e)}")
-        traceback.print_exc()
+        logger.exception("❌ 生成搜索建议失败: %s", e)
         
         # 直接通过SocketIO发送错误结果
         error_response = {
@@ -154,27 +211,34 @@ def get_suggestions_async(self, question, session_id):
             'session_id': session_id
         }
 
-def send_socketio_message(response, session_id):
+def send_socketio_message(response, session_id, event='task_update'):
     """发送SocketIO消息的辅助函数 - 直接使用SocketIO emit"""
     try:
-        print(f"🚀 准备发送SocketIO消息: 会话ID<{session_id}>; 响应内容: <{response}>")
+        logger.debug(
+            "🚀 发送SocketIO消息<%s>: 会话ID<%s>; 任务<%s>; 状态<%s>",
+            event, session_id, response.get('task_id'), response.get('state')
+        )
+        
+        # 前端可用trace_id关联服务端追踪记录
+        trace_id = current_trace_id()
+        if trace_id:
+            response = dict(response, trace_id=trace_id)
         
         # 直接导入并使用SocketIO实例
-        socketio.emit('task_update', response, room=session_id)
+        with span('socketio.emit', event=event):
+            socketio.emit(event, response, room=session_id)
     except Exception as e:
-        print(f"❌ SocketIO发送失败: {str(e)}; ⚠️ 回退到Redis发布方式")
+        logger.exception("❌ SocketIO发送失败: %s; ⚠️ 回退到Redis发布方式", e)
         try:
             message_data = {
-                'event': 'task_update',
+                'event': event,
                 'data': response,
                 'room': session_id,
                 'namespace': '/'
             }
             redis_store.publish('ai_agent_socketio', json.dumps(message_data))
         except Exception as redis_e:
-            print(f"❌ Redis发布也失败: {str(redis_e)}")
-        import traceback
-        traceback.print_exc()
+            logger.error("❌ Redis发布也失败: %s", redis_e)
 
 
 @celery.task(bind=True)
@@ -193,12 +257,6 @@ def save_ai_response_to_session(self, session_id, ai_result):
         # 直接使用MongoDB连接，应用上下文已在ContextTask中设置
         from app.models.user import ChatSession
         
-        # 查找会话
-        session = ChatSession.objects(session_id=session_id).first()
-        if not session:
-            print(f"⚠️ 会话不存在: {session_id}")
-            return {'status': 'WARNING', 'message': '会话不存在'}
-        
         # 提取AI回答内容
         answer_content = ""
         metadata = None
@@ -215,21 +273,24 @@ def save_ai_response_to_session(self, session_id, ai_result):
             answer_content = str(ai_result)
         
         if not answer_content:
-            print(f"⚠️ AI回答内容为空")
+            logger.warning("⚠️ AI回答内容为空: %s", session_id)
             return {'status': 'WARNING', 'message': 'AI回答内容为空'}
         
-        # 添加AI消息到会话
-        session.add_message(
-            message_type='ai',
-            content=answer_content,
-            metadata=json.dumps(metadata) if metadata else None
-        )
+        # 添加AI消息到会话（原子追加，不加载会话文档）
+        with span('storage.append_message', message_type='ai'):
+            message = ChatSession.append_message(
+                session_id,
+                message_type='ai',
+                content=answer_content,
+                metadata=json.dumps(metadata) if metadata else None
+            )
+        if message is None:
+            logger.warning("⚠️ 会话不存在: %s", session_id)
+            return {'status': 'WARNING', 'message': '会话不存在'}
         
-        print(f"✅ AI回答已保存到会话: {session_id}")
+        logger.debug("✅ AI回答已保存到会话: %s", session_id)
         return {'status': 'SUCCESS', 'message': 'AI回答已保存'}
         
     except Exception as e:
-        print(f"❌ 保存AI回答失败: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ 保存AI回答失败: %s", e)
         return {'status': 'ERROR', 'message': str(e)}
@@ -0,0 +1,24 @@
+"""
+token用量相关任务
+"""
+import logging
+from app.ext import celery
+from app.services.token_usage import get_token_usage
+
+logger = logging.getLogger(__name__)
+
+@celery.task(bind=True)
+def flush_token_usage(self):
+    """
+    把Redis中有变化的token用量汇总写入MongoDB
+    
+    Returns:
+        dict: 写入结果
+    """
+    try:
+        flushed = get_token_usage().flush()
+        logger.debug("✅ token用量已写入MongoDB: %s条汇总", flushed)
+        return {'status': 'SUCCESS', 'flushed': flushed}
+    except Exception as e:
+        logger.exception("❌ 写入token用量失败: %s", e)
+        return {'status': 'ERROR', 'message': str(e)}
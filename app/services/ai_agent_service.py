@@ -1,37 +1,50 @@
-from typing import Dict, List
+import logging
+from typing import Callable, Dict, List, Optional
 from app.services.deepseek_service import DeepSeekService
 from app.services.search_service import SearchService
 from app.services.crawler_service import CrawlerService
+from app.services.cancellation import check_cancelled
+from app.monitoring import observe_stage
+
+logger = logging.getLogger(__name__)
 
 class AIAgentService:
     """AI Agent核心服务类"""
     
-    def __init__(self):
-        self.deepseek_service = DeepSeekService()
-        self.search_service = SearchService()
-        self.crawler_service = CrawlerService()
+    def __init__(self, deepseek_service=None, search_service=None, crawler_service=None):
+        self.deepseek_service = deepseek_service or DeepSeekService()
+        self.search_service = search_service or SearchService()
+        self.crawler_service = crawler_service or CrawlerService()
     
-    def process_question(self, question: str) -> Dict:
+    def process_question(self, question: str, on_source_ready: Optional[Callable[[Dict], None]] = None) -> Dict:
         """
         处理用户问题的完整流程
         
         Args:
             question: 用户问题
+            on_source_ready: 每个来源爬取完成后调用的回调，参数为来源摘要
             
         Returns:
             Dict: 包含回答和元数据的响应
         """
         try:
             # 步骤1: 分析问题是否需要联网搜索
-            analysis_result = self.deepseek_service.analyze_question(question)
+            # 任务被取消时check_cancelled抛出TaskCancelled（不是Exception的子类，不会被下面的except捕获）
+            check_cancelled()
+            with observe_stage('analyze'):
+                analysis_result = self.deepseek_service.analyze_question(question)
             
             if not analysis_result.get('need_search', False):
                 # 不需要搜索，直接回答
-                return self._direct_answer(question, analysis_result)
+                check_cancelled()
+                with observe_stage('direct_answer'):
+                    return self._direct_answer(question, analysis_result)
             
             # 步骤2: 进行联网搜索
             search_keywords = analysis_result.get('search_keywords', question)
-            search_results = self.search_service.search(search_keywords)
+            check_cancelled()
+            with observe_stage('search'):
+                search_results = self.search_service.search(search_keywords)
             
             if not search_results:
                 return {
@@ -44,13 +57,18 @@ class AIAgentService:
             
             # 步骤3: 爬取网页内容
             urls = [result['url'] for result in search_results if result.get('url')]
-            crawled_content = self.crawler_service.crawl_multiple_urls(urls)
+            on_result = self._make_source_callback(search_results, on_source_ready) if on_source_ready else None
+            check_cancelled()
+            with observe_stage('crawl'):
+                crawled_content = self.crawler_service.crawl_multiple_urls(urls, on_result=on_result)
             
             # 步骤4: 结合搜索结果和爬取内容进行分析
             enriched_results = self._enrich_search_results(search_results, crawled_content)
             
             # 步骤5: AI分析并生成回答
-            answer = self.deepseek_service.analyze_with_context(question, enriched_results)
+            check_cancelled()
+            with observe_stage('answer'):
+                answer = self.deepseek_service.analyze_with_context(question, enriched_results)
             
             return {
                 'answer': answer,
@@ -69,6 +87,33 @@ class AIAgentService:
                 'error': str(e)
             }
     
+    def _make_source_callback(self, search_results: List[Dict], on_source_ready: Callable[[Dict], None]) -> Callable[[Dict], None]:
+        """
+        构造爬取回调：将单个爬取结果与对应搜索结果合并为摘要后交给on_source_ready
+        
+        Args:
+            search_results: 搜索结果（决定来源在最终结果中的序号）
+            on_source_ready: 接收来源摘要的回调
+            
+        Returns:
+            Callable: 供CrawlerService使用的回调
+        """
+        index_by_url = {}
+        for index, result in enumerate(search_results):
+            index_by_url.setdefault(result.get('url', ''), index)
+        
+        def on_result(crawled: Dict):
+            index = index_by_url.get(crawled.get('url', ''))
+            if index is None:
+                return
+            
+            enriched = self._enrich_search_results([search_results[index]], [crawled])
+            summary = self.summarize_sources(enriched)[0]
+            summary['index'] = index
+            on_source_ready(summary)
+        
+        return on_result
+    
     def _direct_answer(self, question: str, analysis_result: Dict) -> Dict:
         """
         直接回答不需要搜索的问题
@@ -142,6 +187,36 @@ class AIAgentService:
         
         return enriched_results
     
+    def summarize_sources(self, sources: List[Dict], snippet_length: int = 200) -> List[Dict]:
+        """
+        将完整来源压缩为摘要（URL、标题、片段），用于推送给客户端
+        
+        Args:
+            sources: 包含完整爬取内容的来源列表
+            snippet_length: 片段最大长度（字符数）
+            
+        Returns:
+            List[Dict]: 来源摘要列表
+        """
+        summaries = []
+        
+        for index, source in enumerate(sources):
+            content = source.get('content', '') or ''
+            snippet = content[:snippet_length]
+            if len(content) > snippet_length:
+                snippet += '...'
+            
+            summaries.append({
+                'index': index,
+                'url': source.get('url', ''),
+                'title': source.get('title', ''),
+                'snippet': snippet,
+                'source': source.get('source', ''),
+                'content_length': source.get('content_length', len(content))
+            })
+        
+        return summaries
+    
     def get_search_suggestions(self, question: str) -> List[str]:
         """
         获取搜索建议
@@ -163,7 +238,7 @@ class AIAgentService:
                 {"role": "user", "content": f"问题: {question}"}
             ]
             
-            response = self.deepseek_service._make_request(messages)
+            response = self.deepseek_service._make_request(messages, call_type='suggestions')
             
             # 尝试解析JSON
             import json
@@ -175,5 +250,5 @@ class AIAgentService:
             return []
             
         except Exception as e:
-            print(f"生成搜索建议失败: {str(e)}")
+            logger.warning("⚠️ 生成搜索建议失败: %s", e)
             return []
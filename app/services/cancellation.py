@@ -0,0 +1,268 @@
+"""
+问题任务的协作式取消
+客户端断开连接、在同一会话中重新提问或发送cancel_task事件时，在Redis中为任务设置取消标记（所有Worker共享）。
+处理流程在阶段之间检查标记并抛出TaskCancelled；在cancellation_scope内通过run_cancellable发送的HTTP请求
+在等待期间轮询标记，取消后立即放弃等待，Worker槽位随即释放，请求在后台线程中超时或结束后结果丢弃。
+Redis不可用时取消标记只在进程内生效。
+"""
+
+import logging
+import threading
+import contextvars
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from app.monitoring.metrics import TASK_CANCELLATIONS
+
+logger = logging.getLogger(__name__)
+
+# 取消原因
+DISCONNECTED = 'disconnected'
+SUPERSEDED = 'superseded'
+REQUESTED = 'requested'
+
+# 当前处理的任务ID（对冲请求和run_cancellable的线程复制上下文后仍能检查取消）
+_current_task: ContextVar[Optional[str]] = ContextVar('cancellation_task', default=None)
+
+# 可取消的请求在线程中发送，调用方轮询取消标记（进程内共享）
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='cancellable')
+
+
+def _get_redis_client():
+    """获取Redis客户端，未初始化时返回None"""
+    try:
+        from app.ext import redis_store
+        return redis_store._redis_client
+    except Exception:
+        return None
+
+
+class TaskCancelled(BaseException):
+    """
+    任务已被取消
+
+    继承BaseException（与asyncio.CancelledError相同），流程中各处的except Exception不会把取消当作普通错误吞掉
+    """
+
+    def __init__(self, task_id: str, reason: str):
+        super().__init__(f"任务已取消: {reason}")
+        self.task_id = task_id
+        self.reason = reason
+
+
+class CancellationRegistry:
+    """会话的在途任务、任务取消标记和会话的在线客户端"""
+
+    def __init__(self, config: Dict):
+        self.enabled = config.get('enabled', True)
+        self.prefix = config.get('redis_prefix', 'cancel:')
+        self.ttl = config.get('ttl', 900)
+        self.poll_interval = config.get('poll_interval', 0.5)
+
+        # Redis不可用时使用的进程内状态
+        self._local_active = defaultdict(set)
+        self._local_cancelled = {}
+        self._local_viewers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def _redis(self):
+        return _get_redis_client()
+
+    def _active_key(self, session_id: str) -> str:
+        return f"{self.prefix}active:{session_id}"
+
+    def _task_key(self, task_id: str) -> str:
+        return f"{self.prefix}task:{task_id}"
+
+    def _viewers_key(self, session_id: str) -> str:
+        return f"{self.prefix}viewers:{session_id}"
+
+    def register(self, session_id: str, task_id: str):
+        """记录会话的在途任务，同时续期会话的在线客户端集合（提问的客户端仍在线）"""
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.sadd(self._active_key(session_id), task_id)
+                pipe.expire(self._active_key(session_id), self.ttl)
+                pipe.expire(self._viewers_key(session_id), self.ttl)
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning("⚠️ 记录在途任务失败: %s", e)
+        with self._lock:
+            self._local_active[session_id].add(task_id)
+
+    def unregister(self, session_id: str, task_id: str):
+        """任务结束，从会话的在途任务中移除"""
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                redis_client.srem(self._active_key(session_id), task_id)
+                return
+            except Exception as e:
+                logger.warning("⚠️ 移除在途任务失败: %s", e)
+        with self._lock:
+            self._local_active[session_id].discard(task_id)
+            if not self._local_active[session_id]:
+                del self._local_active[session_id]
+            self._local_cancelled.pop(task_id, None)
+
+    def active_tasks(self, session_id: str) -> List[str]:
+        """会话的在途任务ID"""
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                return list(redis_client.smembers(self._active_key(session_id)))
+            except Exception as e:
+                logger.warning("⚠️ 读取在途任务失败: %s", e)
+        with self._lock:
+            return list(self._local_active.get(session_id, ()))
+
+    def cancel(self, task_id: str, reason: str = REQUESTED):
+        """设置任务的取消标记，处理该任务的Worker在下一次检查时中止"""
+        if not self.enabled:
+            return
+        stored = False
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                redis_client.set(self._task_key(task_id), reason, ex=self.ttl)
+                stored = True
+            except Exception as e:
+                logger.warning("⚠️ 写入取消标记失败，仅在本进程生效: %s", e)
+        if not stored:
+            with self._lock:
+                self._local_cancelled[task_id] = reason
+        logger.info("🛑 任务已标记取消: %s（%s）", task_id, reason)
+        TASK_CANCELLATIONS.labels(reason=reason).inc()
+
+    def cancel_session(self, session_id: str, reason: str) -> List[str]:
+        """取消会话的所有在途任务，返回被取消的任务ID"""
+        task_ids = self.active_tasks(session_id)
+        for task_id in task_ids:
+            self.cancel(task_id, reason)
+        return task_ids
+
+    def is_cancelled(self, task_id: str) -> Optional[str]:
+        """任务的取消原因，未取消时返回None"""
+        if not self.enabled:
+            return None
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                return redis_client.get(self._task_key(task_id))
+            except Exception as e:
+                logger.warning("⚠️ 读取取消标记失败: %s", e)
+        with self._lock:
+            return self._local_cancelled.get(task_id)
+
+    def attach(self, session_id: str, client_id: str):
+        """客户端进入会话房间，记录到会话的在线客户端集合并续期"""
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.sadd(self._viewers_key(session_id), client_id)
+                pipe.expire(self._viewers_key(session_id), self.ttl)
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning("⚠️ 记录会话客户端失败: %s", e)
+        with self._lock:
+            self._local_viewers[session_id].add(client_id)
+
+    def detach(self, session_id: str, client_id: str) -> Optional[int]:
+        """
+        客户端离开会话房间，返回会话剩余的客户端数
+
+        集合已过期、客户端不在集合中或Redis出错时无法确定是否还有其他客户端，返回None（调用方不应据此取消任务）
+        """
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.srem(self._viewers_key(session_id), client_id)
+                pipe.scard(self._viewers_key(session_id))
+                removed, remaining = pipe.execute()
+                return remaining if removed else None
+            except Exception as e:
+                logger.warning("⚠️ 更新会话客户端失败: %s", e)
+                return None
+        with self._lock:
+            viewers = self._local_viewers.get(session_id)
+            if not viewers or client_id not in viewers:
+                return None
+            viewers.discard(client_id)
+            remaining = len(viewers)
+            if not remaining:
+                del self._local_viewers[session_id]
+            return remaining
+
+
+_registry: Optional[CancellationRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def _load_config() -> Dict:
+    try:
+        from flask import current_app
+        return current_app.config['TASK_CANCELLATION_CONFIG']
+    except Exception:
+        from app.config import Config
+        return Config.TASK_CANCELLATION_CONFIG
+
+
+def get_cancellation() -> CancellationRegistry:
+    """获取取消标记注册表（进程内共享）"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = CancellationRegistry(_load_config())
+    return _registry
+
+
+@contextmanager
+def cancellation_scope(task_id: str):
+    """上下文内的check_cancelled和run_cancellable检查该任务的取消标记"""
+    token = _current_task.set(task_id)
+    try:
+        yield
+    finally:
+        _current_task.reset(token)
+
+
+def check_cancelled():
+    """当前任务已被取消时抛出TaskCancelled，不在cancellation_scope内时不做检查"""
+    task_id = _current_task.get()
+    if task_id is None:
+        return
+    reason = get_cancellation().is_cancelled(task_id)
+    if reason:
+        raise TaskCancelled(task_id, reason)
+
+
+def run_cancellable(func, *args, **kwargs):
+    """
+    执行阻塞调用（通常是HTTP请求），等待期间按poll_interval检查取消标记
+
+    不在cancellation_scope内时直接调用。取消后不再等待结果，调用在后台线程中结束后结果丢弃。
+    """
+    if _current_task.get() is None:
+        return func(*args, **kwargs)
+
+    check_cancelled()
+    poll_interval = get_cancellation().poll_interval
+    future = _executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+    while True:
+        done, _ = wait([future], timeout=poll_interval)
+        if done:
+            return future.result()
+        try:
+            check_cancelled()
+        except TaskCancelled:
+            future.cancel()
+            raise
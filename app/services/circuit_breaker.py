@@ -0,0 +1,248 @@
+"""
+外部依赖熔断器与自适应超时
+每个依赖（DeepSeek、各搜索引擎）一个熔断器，状态保存在Redis中由所有Worker共享，Redis不可用时退化为进程内状态。
+- closed: 正常请求，连续失败达到阈值后熔断
+- open: 直接跳过请求，恢复时间后允许一个探测请求（half_open）
+- half_open: 探测成功则恢复，失败则重新熔断
+超时时间根据最近成功请求的p95耗时自适应调整，耗时差异大的请求类型（如DeepSeek的分类和回答）可按key分别统计。
+"""
+
+import time
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Optional
+from app.monitoring.metrics import CIRCUIT_STATE
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def _get_redis_client():
+    """获取Redis客户端，未初始化时返回None"""
+    try:
+        from app.ext import redis_store
+        return redis_store._redis_client
+    except Exception:
+        return None
+
+
+class CircuitOpenError(Exception):
+    """依赖处于熔断状态，请求被跳过"""
+
+
+class CircuitBreaker:
+    """单个外部依赖的熔断器"""
+
+    def __init__(self, name: str, config: Dict):
+        self.name = name
+        self.failure_threshold = config.get('failure_threshold', 5)
+        self.recovery_timeout = config.get('recovery_timeout', 30)
+        self.latency_window = config.get('latency_window', 100)
+        self.min_samples = config.get('min_samples', 20)
+        self.timeout_multiplier = config.get('timeout_multiplier', 2.0)
+        self.min_timeout = config.get('min_timeout', 5)
+        self.max_timeout = config.get('max_timeout', 60)
+        self.timeout_refresh = config.get('timeout_refresh', 10)
+
+        prefix = config.get('redis_prefix', 'circuit:')
+        self.state_key = f"{prefix}{name}"
+        self.latency_key = f"{prefix}{name}:latency"
+        self.probe_key = f"{prefix}{name}:probe"
+
+        # Redis不可用时使用的进程内状态
+        self._local = {'state': CLOSED, 'failures': 0, 'opened_at': 0.0}
+        self._local_latencies = defaultdict(list)
+        self._local_probe_until = 0.0
+        self._lock = threading.Lock()
+
+        # 按耗时key缓存的超时计算结果：key -> (超时, 过期时间)
+        self._timeouts = {}
+
+    def _redis(self):
+        return _get_redis_client()
+
+    def _latency_key(self, key: Optional[str]) -> str:
+        return f"{self.latency_key}:{key}" if key else self.latency_key
+
+    def _read_state(self, redis_client):
+        if redis_client is not None:
+            try:
+                data = redis_client.hgetall(self.state_key)
+                return {
+                    'state': data.get('state', CLOSED),
+                    'failures': int(data.get('failures', 0)),
+                    'opened_at': float(data.get('opened_at', 0))
+                }
+            except Exception as e:
+                logger.warning("⚠️ 读取熔断状态失败 %s: %s", self.name, e)
+        with self._lock:
+            return dict(self._local)
+
+    def _transition(self, redis_client, state, **fields):
+        """切换状态（同时写Redis和进程内状态）"""
+        mapping = dict(fields, state=state)
+        if redis_client is not None:
+            try:
+                redis_client.hset(self.state_key, mapping=mapping)
+            except Exception as e:
+                logger.warning("⚠️ 写入熔断状态失败 %s: %s", self.name, e)
+        with self._lock:
+            self._local.update(mapping)
+        CIRCUIT_STATE.labels(dependency=self.name).set(_STATE_VALUES[state])
+
+    def _acquire_probe(self, redis_client) -> bool:
+        """半开状态下只允许一个探测请求（跨Worker）"""
+        if redis_client is not None:
+            try:
+                return bool(redis_client.set(self.probe_key, 1, nx=True, ex=max(1, int(self.max_timeout))))
+            except Exception:
+                pass
+        with self._lock:
+            now = time.time()
+            if now < self._local_probe_until:
+                return False
+            self._local_probe_until = now + self.max_timeout
+            return True
+
+    def allow(self) -> bool:
+        """是否允许本次请求"""
+        redis_client = self._redis()
+        current = self._read_state(redis_client)
+        if current['state'] == CLOSED:
+            return True
+        if time.time() - current['opened_at'] < self.recovery_timeout:
+            return False
+        if not self._acquire_probe(redis_client):
+            return False
+        if current['state'] != HALF_OPEN:
+            logger.info("🔄 %s 熔断恢复探测", self.name)
+            self._transition(redis_client, HALF_OPEN)
+        return True
+
+    def record_success(self, latency: float, key: Optional[str] = None):
+        """记录成功请求及其耗时，key区分耗时分别统计的请求类型"""
+        latency_key = self._latency_key(key)
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                pipe = redis_client.pipeline()
+                pipe.lpush(latency_key, round(latency, 4))
+                pipe.ltrim(latency_key, 0, self.latency_window - 1)
+                pipe.hget(self.state_key, 'state')
+                pipe.hset(self.state_key, 'failures', 0)
+                state = pipe.execute()[2] or CLOSED
+            except Exception as e:
+                logger.warning("⚠️ 记录依赖耗时失败 %s: %s", self.name, e)
+                redis_client = None
+
+        with self._lock:
+            latencies = self._local_latencies[key]
+            latencies.insert(0, latency)
+            del latencies[self.latency_window:]
+            self._local['failures'] = 0
+            if redis_client is None:
+                state = self._local['state']
+
+        if state != CLOSED:
+            logger.info("✅ %s 已恢复", self.name)
+            self._transition(redis_client, CLOSED, failures=0, opened_at=0)
+            self._release_probe(redis_client)
+
+    def record_failure(self):
+        """记录失败请求，连续失败达到阈值或半开探测失败时熔断"""
+        redis_client = self._redis()
+        state, failures = None, None
+        if redis_client is not None:
+            try:
+                pipe = redis_client.pipeline()
+                pipe.hincrby(self.state_key, 'failures', 1)
+                pipe.hget(self.state_key, 'state')
+                failures, state = pipe.execute()
+                state = state or CLOSED
+            except Exception as e:
+                logger.warning("⚠️ 记录依赖失败次数失败 %s: %s", self.name, e)
+                redis_client = None
+
+        with self._lock:
+            self._local['failures'] += 1
+            if redis_client is None:
+                failures, state = self._local['failures'], self._local['state']
+
+        if state == HALF_OPEN or (state == CLOSED and failures >= self.failure_threshold):
+            logger.warning("🚫 %s 熔断（连续失败%s次），%s秒后重试", self.name, failures, self.recovery_timeout)
+            self._transition(redis_client, OPEN, opened_at=time.time())
+            self._release_probe(redis_client)
+
+    def _release_probe(self, redis_client):
+        if redis_client is not None:
+            try:
+                redis_client.delete(self.probe_key)
+            except Exception:
+                pass
+        with self._lock:
+            self._local_probe_until = 0.0
+
+    def _latencies(self, key: Optional[str] = None):
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                return [float(value) for value in redis_client.lrange(self._latency_key(key), 0, -1)]
+            except Exception:
+                pass
+        with self._lock:
+            return list(self._local_latencies.get(key, ()))
+
+    def timeout(self, key: Optional[str] = None) -> float:
+        """
+        自适应超时：该key最近成功请求p95耗时 × 倍数，限制在[min_timeout, max_timeout]，样本不足时为max_timeout
+        """
+        now = time.time()
+        cached = self._timeouts.get(key)
+        if cached and now < cached[1]:
+            return cached[0]
+
+        latencies = sorted(self._latencies(key))
+        if len(latencies) >= self.min_samples:
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            timeout = min(self.max_timeout, max(self.min_timeout, p95 * self.timeout_multiplier))
+        else:
+            timeout = self.max_timeout
+        self._timeouts[key] = (timeout, now + self.timeout_refresh)
+        return timeout
+
+    def state(self) -> str:
+        """当前状态"""
+        return self._read_state(self._redis())['state']
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def _load_config() -> Dict:
+    try:
+        from flask import current_app
+        return current_app.config['CIRCUIT_BREAKER_CONFIG']
+    except Exception:
+        from app.config import Config
+        return Config.CIRCUIT_BREAKER_CONFIG
+
+
+def get_circuit_breaker(name: str, config: Optional[Dict] = None) -> CircuitBreaker:
+    """获取依赖的熔断器（进程内共享），依赖配置覆盖默认配置"""
+    breaker = _breakers.get(name)
+    if breaker is not None:
+        return breaker
+
+    with _breakers_lock:
+        if name not in _breakers:
+            config = config or _load_config()
+            defaults = {key: value for key, value in config.items() if key != 'dependencies'}
+            _breakers[name] = CircuitBreaker(name, dict(defaults, **config.get('dependencies', {}).get(name, {})))
+        return _breakers[name]
@@ -1,9 +1,15 @@
 import requests
 from bs4 import BeautifulSoup
-from typing import Dict, Optional
+from typing import Callable, Dict, Optional
 from flask import current_app
+from app.monitoring.metrics import CRAWL_REQUESTS, CRAWL_DURATION
+from app.monitoring.tracing import span
+from app.services.cancellation import run_cancellable
 import time
 import random
+import logging
+
+logger = logging.getLogger(__name__)
 
 class CrawlerService:
     """网页爬虫服务类"""
@@ -20,7 +26,9 @@ class CrawlerService:
             self.config = {
                 'timeout': 10,
                 'max_content_length': 50000,
-                'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+                'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+                'request_delay': (0.5, 2.0),
+                'batch_delay': (1.0, 3.0)
             }
         
         self.headers = {
@@ -30,6 +38,12 @@ class CrawlerService:
             'Accept-Encoding': 'gzip, deflate',
             'Connection': 'keep-alive',
         }
+        
+        # 复用HTTP连接（服务实例由注册表在进程内共享）
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=10, pool_maxsize=10)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
     
     def crawl_url(self, url: str) -> Optional[Dict]:
         """
@@ -41,18 +55,23 @@ class CrawlerService:
         Returns:
             Dict: 包含标题、内容、元数据的字典，失败时返回None
         """
+        # 添加随机延迟避免被封
+        time.sleep(random.uniform(*self.config.get('request_delay', (0.5, 2.0))))
+        
+        start = time.perf_counter()
+        status = 'parse_error'
         try:
-            # 添加随机延迟避免被封
-            time.sleep(random.uniform(0.5, 2.0))
-            print(f"爬取URL: {url}")
+            logger.debug("爬取URL: %s", url)
             
-            response = requests.get(
-                url, 
-                headers=self.headers, 
-                timeout=self.config['timeout'],
-                allow_redirects=True
-            )
-            response.raise_for_status()
+            with span('crawl.fetch', url=url) as fetch_span:
+                response = self.session.get(
+                    url, 
+                    headers=self.headers, 
+                    timeout=self.config['timeout'],
+                    allow_redirects=True
+                )
+                fetch_span.set_attribute('http.status_code', response.status_code)
+                response.raise_for_status()
             
             # 解析HTML
             soup = BeautifulSoup(response.content, 'lxml')
@@ -65,12 +84,13 @@ class CrawlerService:
             
             # 检查提取的文本内容长度（而不是原始HTML长度）
             if len(content) > self.config['max_content_length']:
-                print(f"提取的文本内容过长，截断: {url}")
+                logger.debug("提取的文本内容过长，截断: %s", url)
                 content = content[:self.config['max_content_length']] + "..."
             
             # 提取元数据
             metadata = self._extract_metadata(soup)
             
+            status = 'success'
             return {
                 'url': url,
                 'title': title,
@@ -80,18 +100,23 @@ class CrawlerService:
             }
             
         except requests.exceptions.RequestException as e:
-            print(f"请求失败 {url}: {str(e)}")
+            status = 'request_error'
+            logger.warning("请求失败 %s: %s", url, e)
             return None
         except Exception as e:
-            print(f"解析失败 {url}: {str(e)}")
+            logger.warning("解析失败 %s: %s", url, e)
             return None
+        finally:
+            CRAWL_REQUESTS.labels(status=status).inc()
+            CRAWL_DURATION.observe(time.perf_counter() - start)
     
-    def crawl_multiple_urls(self, urls: list) -> list:
+    def crawl_multiple_urls(self, urls: list, on_result: Optional[Callable[[Dict], None]] = None) -> list:
         """
         批量爬取多个URL
         
         Args:
             urls: URL列表
+            on_result: 每个页面爬取成功后立即调用的回调，用于增量推送
             
         Returns:
             list: 爬取结果列表
@@ -99,12 +124,19 @@ class CrawlerService:
         results = []
         
         for url in urls:
-            result = self.crawl_url(url)
+            # 任务被取消时中止剩余页面，正在进行的请求不再等待
+            result = run_cancellable(self.crawl_url, url)
             if result:
                 results.append(result)
+                
+                if on_result:
+                    try:
+                        on_result(result)
+                    except Exception as e:
+                        logger.warning("爬取结果回调失败 %s: %s", url, e)
             
             # 避免请求过于频繁
-            time.sleep(random.uniform(1.0, 3.0))
+            time.sleep(random.uniform(*self.config.get('batch_delay', (1.0, 3.0))))
         
         return results
     
@@ -1,7 +1,72 @@
 import requests
 import json
+import time
+import random
+import logging
+import threading
+import contextvars
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from email.utils import parsedate_to_datetime
 from flask import current_app
 from typing import Dict, List, Optional
+from app.monitoring.metrics import (
+    DEEPSEEK_REQUESTS, DEEPSEEK_DURATION, DEEPSEEK_TOKENS,
+    DEEPSEEK_RETRIES, DEEPSEEK_ATTEMPTS, DEEPSEEK_HEDGES
+)
+from app.monitoring.tracing import span
+from app.services.circuit_breaker import get_circuit_breaker, CircuitOpenError
+from app.services.rate_limiter import get_rate_limiter, estimate_tokens
+from app.services.llm_pool import get_llm_pool, NoBackendAvailable
+from app.services.token_usage import get_token_usage, current_usage_context
+from app.services.cancellation import check_cancelled, run_cancellable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETRY_CONFIG = {
+    'max_attempts': 3,
+    'base_delay': 0.5,
+    'max_delay': 8,
+    'max_retry_after': 30,
+    'hedge_call_types': ['classify'],
+    'hedge_percentile': 90,
+    'hedge_min_samples': 20
+}
+
+# 未配置DEEPSEEK_MODEL_PROFILES时使用，model为None表示使用DEEPSEEK_MODEL
+# timeout为超时上限，min_timeout为超时下限，均与按调用类型统计的自适应超时组合
+DEFAULT_MODEL_PROFILES = {
+    'classify': {'model': None, 'max_tokens': 200, 'temperature': 0, 'timeout': 15, 'json_mode': True},
+    'suggestions': {'model': None, 'max_tokens': 200, 'temperature': 0.3, 'timeout': 15},
+    'answer': {'model': None, 'max_tokens': 2000, 'temperature': 0.7, 'min_timeout': 60}
+}
+
+# 对冲请求在线程中发送（进程内共享）
+_hedge_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='deepseek-hedge')
+
+
+class RetryableError(Exception):
+    """可重试的临时错误（429、5xx、连接错误）"""
+    
+    def __init__(self, message, reason, retry_after=None):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析Retry-After头（秒数或HTTP日期）"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
 
 class DeepSeekService:
     """DeepSeek API服务类"""
@@ -10,22 +75,33 @@ class DeepSeekService:
         # 尝试从Flask应用上下文获取配置，如果没有则从环境变量获取
         try:
             if current_app:
-                self.api_key = current_app.config['DEEPSEEK_API_KEY']
-                self.base_url = current_app.config['DEEPSEEK_BASE_URL']
                 self.model = current_app.config['DEEPSEEK_MODEL']
+                self.retry_config = current_app.config.get('DEEPSEEK_RETRY_CONFIG', DEFAULT_RETRY_CONFIG)
+                self.model_profiles = current_app.config.get('DEEPSEEK_MODEL_PROFILES', DEFAULT_MODEL_PROFILES)
             else:
                 raise RuntimeError("No Flask app context")
         except:
             # 如果没有Flask应用上下文，从环境变量获取
             import os
-            self.api_key = os.environ.get('DEEPSEEK_API_KEY', 'your-deepseek-api-key')
-            self.base_url = os.environ.get('DEEPSEEK_BASE_URL', 'https://api.deepseek.com/v1')
             self.model = os.environ.get('DEEPSEEK_MODEL', 'deepseek-chat')
+            self.retry_config = DEFAULT_RETRY_CONFIG
+            self.model_profiles = DEFAULT_MODEL_PROFILES
         
-        self.headers = {
-            'Authorization': f'Bearer {self.api_key}',
-            'Content-Type': 'application/json'
-        }
+        # API Key和地址由后端池管理（DEEPSEEK_BACKENDS）
+        self.pool = get_llm_pool('deepseek')
+        self.circuit_breaker = get_circuit_breaker('deepseek')
+        self.rate_limiter = get_rate_limiter('deepseek')
+        self.token_usage = get_token_usage()
+        
+        # 各调用类型最近成功请求的耗时，用于计算对冲等待时间
+        self._latencies = defaultdict(lambda: deque(maxlen=100))
+        self._latency_lock = threading.Lock()
+        
+        # 复用HTTP连接（服务实例由注册表在进程内共享）
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=20)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
     
     def analyze_question(self, question: str) -> Dict:
         """
@@ -57,7 +133,7 @@ class DeepSeekService:
             response = self._make_request([
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": question}
-            ])
+            ], call_type='classify')
             
             # 解析JSON响应
             result = json.loads(response)
@@ -105,51 +181,218 @@ class DeepSeekService:
             response = self._make_request([
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": f"问题: {question}\n\n{context}"}
-            ])
+            ], call_type='answer')
             
             return response
             
         except Exception as e:
             return f"分析过程中出现错误: {str(e)}"
     
-    def _make_request(self, messages: List[Dict]) -> str:
+    def ping(self, timeout: int = 10) -> float:
+        """
+        发送最小的补全请求（max_tokens=1）探测API可用性
+        
+        Returns:
+            float: 请求耗时（秒），失败时抛出异常
+        """
+        payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": "ping"}],
+            "max_tokens": 1
+        }
+        
+        backend = self.pool.acquire()
+        success = None
+        try:
+            start = time.perf_counter()
+            response = self.session.post(backend.chat_url, headers=backend.headers, json=dict(payload, model=backend.model or self.model), timeout=timeout)
+            response.raise_for_status()
+            success = True
+            return time.perf_counter() - start
+        finally:
+            self.pool.release(backend, success)
+    
+    def _make_request(self, messages: List[Dict], call_type: str = 'answer') -> str:
         """
-        向DeepSeek API发送请求
+        按调用类型的模型配置向DeepSeek API发送请求，临时错误（429、5xx、连接错误）按指数退避重试，
+        对配置了对冲的调用类型，在p90耗时后仍未返回时发送第二个请求并采用先返回的结果
         
         Args:
             messages: 消息列表
+            call_type: 调用类型（classify、answer、suggestions）
             
         Returns:
             str: API响应内容
         """
-        url = f"{self.base_url}/chat/completions"
-        
-        # 获取温度配置
-        try:
-            if current_app:
-                temperature = current_app.config['AI_ANALYSIS_CONFIG']['temperature']
-            else:
-                raise RuntimeError("No Flask app context")
-        except:
-            temperature = 0.7  # 默认温度
-        
+        profile = self._profile(call_type)
+        # 用户当日用量接近配额时，回答使用降级的模型配置
+        if call_type == 'answer' and current_usage_context().get('downgraded'):
+            profile = self.model_profiles.get('answer_downgraded') or profile
         payload = {
-            "model": self.model,
+            "model": profile.get('model') or self.model,
             "messages": messages,
-            "temperature": temperature,
-            "max_tokens": 2000
+            "temperature": profile.get('temperature', 0.7),
+            "max_tokens": profile.get('max_tokens', 2000)
         }
+        if profile.get('json_mode'):
+            payload["response_format"] = {"type": "json_object"}
         
+        hedge = call_type in self.retry_config.get('hedge_call_types', [])
+        max_attempts = self.retry_config.get('max_attempts', 3)
+        attempt = 0
         try:
-            response = requests.post(url, headers=self.headers, json=payload, timeout=120)
-            response.raise_for_status()
+            while True:
+                attempt += 1
+                # 任务已被取消时不再发送或重试，等待响应期间取消时放弃该请求
+                check_cancelled()
+                try:
+                    if hedge:
+                        return self._hedged_request(payload, call_type)
+                    return run_cancellable(self._send_request, payload, call_type)
+                except RetryableError as e:
+                    delay = self._retry_delay(attempt, e.retry_after)
+                    if attempt >= max_attempts or delay is None:
+                        raise Exception(f"DeepSeek API请求失败: {str(e)}")
+                    DEEPSEEK_RETRIES.labels(reason=e.reason).inc()
+                    logger.info("🔄 DeepSeek请求失败（%s），%.2f秒后第%s次重试", e, delay, attempt)
+                    time.sleep(delay)
+        finally:
+            DEEPSEEK_ATTEMPTS.observe(attempt)
+    
+    def _profile(self, call_type: str) -> Dict:
+        """调用类型对应的模型配置，未配置的调用类型使用answer的配置"""
+        return self.model_profiles.get(call_type) or self.model_profiles.get('answer', {})
+    
+    def _retry_delay(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """
+        第attempt次失败后的等待时间：指数退避上限内的随机值（full jitter），
+        服务端给出Retry-After时至少等待该时间，超过max_retry_after时不再重试（返回None）
+        """
+        base_delay = self.retry_config.get('base_delay', 0.5)
+        max_delay = self.retry_config.get('max_delay', 8)
+        delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            if retry_after > self.retry_config.get('max_retry_after', 30):
+                return None
+            delay = max(delay, retry_after)
+        return delay
+    
+    def _hedge_delay(self, call_type: str) -> Optional[float]:
+        """对冲等待时间：该调用类型最近成功请求的耗时百分位数，样本不足时返回None"""
+        with self._latency_lock:
+            latencies = sorted(self._latencies[call_type])
+        if len(latencies) < self.retry_config.get('hedge_min_samples', 20):
+            return None
+        percent = self.retry_config.get('hedge_percentile', 90)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100))]
+    
+    def _hedged_request(self, payload: Dict, call_type: str) -> str:
+        """发送请求，超过对冲等待时间仍未返回时再发送一个，采用先成功的结果"""
+        delay = self._hedge_delay(call_type)
+        if delay is None:
+            return self._send_request(payload, call_type)
+        
+        # 在线程中执行时保留当前追踪上下文
+        primary = _hedge_executor.submit(contextvars.copy_context().run, self._send_request, payload, call_type)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        
+        hedge = _hedge_executor.submit(contextvars.copy_context().run, self._send_request, payload, call_type)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    content = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                # 未完成的请求在后台结束，结果丢弃
+                DEEPSEEK_HEDGES.labels(winner='hedge' if future is hedge else 'primary').inc()
+                return content
+        raise error
+    
+    def _send_request(self, payload: Dict, call_type: str) -> str:
+        """发送一次请求，临时错误抛出RetryableError"""
+        # 熔断中直接失败，不等待超时
+        if not self.circuit_breaker.allow():
+            DEEPSEEK_REQUESTS.labels(status='circuit_open').inc()
+            raise CircuitOpenError("DeepSeek API熔断中，请稍后重试")
+        
+        # 获取限流配额（所有Worker共享），超过通道最长等待时间时抛出RateLimitExceeded
+        limiter = self.rate_limiter
+        estimated = estimate_tokens(payload['messages'], min(limiter.completion_estimate, payload['max_tokens']))
+        limiter.acquire(estimated, lane=limiter.call_type_lanes.get(call_type, 'interactive'))
+        
+        # 选择在途请求最少的后端，所有后端都被限流时等待最早恢复的后端
+        try:
+            backend = self.pool.acquire()
+        except NoBackendAvailable as e:
+            raise RetryableError(str(e), 'no_backend', e.retry_after)
+        if backend.model:
+            payload = dict(payload, model=backend.model)
+        
+        # 自适应超时按调用类型分别统计（短的分类请求不会压低回答的超时），再限制在调用类型配置的上下限内
+        timeout = self.circuit_breaker.timeout(call_type)
+        profile = self._profile(call_type)
+        if profile.get('timeout'):
+            timeout = min(timeout, profile['timeout'])
+        if profile.get('min_timeout'):
+            timeout = max(timeout, profile['min_timeout'])
+        
+        start = time.perf_counter()
+        status = 'error'
+        healthy = None
+        try:
+            with span('deepseek.chat_completion', model=payload['model'], call_type=call_type, backend=backend.name) as request_span:
+                response = self.session.post(backend.chat_url, headers=backend.headers, json=payload, timeout=timeout)
+                response.raise_for_status()
+                
+                data = response.json()
+                content = data['choices'][0]['message']['content']
+                
+                usage = data.get('usage') or {}
+                request_span.set_attribute('completion_tokens', usage.get('completion_tokens', 0))
             
-            data = response.json()
-            return data['choices'][0]['message']['content']
+            DEEPSEEK_TOKENS.labels(type='prompt').inc(usage.get('prompt_tokens', 0))
+            DEEPSEEK_TOKENS.labels(type='completion').inc(usage.get('completion_tokens', 0))
+            self.token_usage.record(call_type, payload['model'], usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0))
+            status = 'success'
+            healthy = True
+            if usage.get('total_tokens'):
+                limiter.adjust(usage['total_tokens'] - estimated)
+            elapsed = time.perf_counter() - start
+            self.circuit_breaker.record_success(elapsed, key=call_type)
+            with self._latency_lock:
+                self._latencies[call_type].append(elapsed)
+            return content
             
         except requests.exceptions.RequestException as e:
-            raise Exception(f"DeepSeek API请求失败: {str(e)}")
+            # 4xx（除429外）是请求本身的问题，不计入依赖失败，也不重试
+            response = getattr(e, 'response', None)
+            if response is not None and response.status_code != 429 and response.status_code < 500:
+                raise Exception(f"DeepSeek API请求失败: {str(e)}")
+            
+            if response is not None and response.status_code == 429:
+                # 该Key的限流窗口内移出轮换，有其他可用后端时立即重试，所有后端都被限流时才计入依赖失败
+                self.pool.rate_limited(backend, _parse_retry_after(response.headers.get('Retry-After')))
+                wait_time = self.pool.wait_time()
+                if wait_time > 0:
+                    self.circuit_breaker.record_failure()
+                raise RetryableError(str(e), '429', wait_time)
+            
+            healthy = False
+            self.circuit_breaker.record_failure()
+            if response is None:
+                raise RetryableError(str(e), 'connection')
+            raise RetryableError(str(e), str(response.status_code), _parse_retry_after(response.headers.get('Retry-After')))
         except KeyError as e:
             raise Exception(f"DeepSeek API响应格式错误: {str(e)}")
         except Exception as e:
             raise Exception(f"未知错误: {str(e)}")
+        finally:
+            self.pool.release(backend, healthy)
+            DEEPSEEK_REQUESTS.labels(status=status).inc()
+            DEEPSEEK_DURATION.observe(time.perf_counter() - start)
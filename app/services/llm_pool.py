@@ -0,0 +1,184 @@
+"""
+LLM后端池
+管理多个OpenAI兼容的后端（多个DeepSeek账号的API Key、本地推理服务等），按最少在途请求数路由：
+- 返回429的后端在限流窗口（Retry-After或默认冷却时间）内移出轮换，冷却状态保存在Redis中由所有Worker共享
+- 连续失败达到阈值的后端短暂移出轮换
+Redis不可用时冷却状态只在进程内生效。
+"""
+
+import time
+import random
+import logging
+import threading
+from typing import Dict, List, Optional
+from app.monitoring.metrics import LLM_BACKEND_OUTSTANDING, LLM_BACKEND_COOLDOWNS
+
+logger = logging.getLogger(__name__)
+
+
+def _get_redis_client():
+    """获取Redis客户端，未初始化时返回None"""
+    try:
+        from app.ext import redis_store
+        return redis_store._redis_client
+    except Exception:
+        return None
+
+
+class NoBackendAvailable(Exception):
+    """所有后端都在冷却中"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMBackend:
+    """单个后端：地址、API Key、可选的模型名覆盖"""
+
+    def __init__(self, name: str, base_url: str, api_key: str, model: Optional[str] = None):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.model = model
+        self.headers = {
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json'
+        }
+        self.outstanding = 0
+        self.failures = 0
+        self.cooldown_until = 0.0
+
+    @property
+    def chat_url(self):
+        return f"{self.base_url}/chat/completions"
+
+
+class LLMPool:
+    """按最少在途请求数选择后端"""
+
+    def __init__(self, backends: List[LLMBackend], config: Optional[Dict] = None):
+        if not backends:
+            raise ValueError("LLM后端池至少需要一个后端")
+        config = config or {}
+        self.backends = backends
+        self.redis_prefix = config.get('redis_prefix', 'llm:cooldown:')
+        self.rate_limit_cooldown = config.get('rate_limit_cooldown', 10)
+        self.failure_threshold = config.get('failure_threshold', 3)
+        self.failure_cooldown = config.get('failure_cooldown', 30)
+        self._lock = threading.Lock()
+
+    def _redis(self):
+        return _get_redis_client()
+
+    @classmethod
+    def from_config(cls, backend_configs: List[Dict], config: Optional[Dict] = None) -> 'LLMPool':
+        backends = [
+            LLMBackend(
+                backend.get('name') or f"backend{i}",
+                backend['base_url'],
+                backend['api_key'],
+                backend.get('model')
+            )
+            for i, backend in enumerate(backend_configs)
+        ]
+        return cls(backends, config)
+
+    def _shared_cooldowns(self) -> Dict[str, float]:
+        """从Redis读取其他Worker设置的冷却结束时间"""
+        redis_client = self._redis()
+        if redis_client is None:
+            return {}
+        try:
+            values = redis_client.mget([f"{self.redis_prefix}{backend.name}" for backend in self.backends])
+        except Exception as e:
+            logger.warning("⚠️ 读取后端冷却状态失败: %s", e)
+            return {}
+        return {backend.name: float(value) for backend, value in zip(self.backends, values) if value}
+
+    def _cooldown_until(self, backend: LLMBackend, shared: Dict[str, float]) -> float:
+        return max(backend.cooldown_until, shared.get(backend.name, 0.0))
+
+    def acquire(self) -> LLMBackend:
+        """选择在途请求最少的可用后端（在途数相同时随机），所有后端都在冷却时抛出NoBackendAvailable"""
+        shared = self._shared_cooldowns()
+        now = time.time()
+        with self._lock:
+            available = [backend for backend in self.backends if self._cooldown_until(backend, shared) <= now]
+            if not available:
+                retry_after = min(self._cooldown_until(backend, shared) for backend in self.backends) - now
+                raise NoBackendAvailable(f"所有LLM后端都在冷却中，{retry_after:.1f}秒后恢复", retry_after)
+
+            least = min(backend.outstanding for backend in available)
+            backend = random.choice([backend for backend in available if backend.outstanding == least])
+            backend.outstanding += 1
+        LLM_BACKEND_OUTSTANDING.labels(backend=backend.name).inc()
+        return backend
+
+    def release(self, backend: LLMBackend, success: Optional[bool]):
+        """
+        请求结束
+
+        Args:
+            success: True成功，False为服务端错误或连接错误（计入健康检查），None为其他结果（如4xx）
+        """
+        with self._lock:
+            backend.outstanding -= 1
+            if success:
+                backend.failures = 0
+            elif success is False:
+                backend.failures += 1
+                if backend.failures >= self.failure_threshold:
+                    backend.failures = 0
+                    backend.cooldown_until = time.time() + self.failure_cooldown
+                    logger.warning("🚫 LLM后端 %s 连续失败，%s秒内移出轮换", backend.name, self.failure_cooldown)
+                    LLM_BACKEND_COOLDOWNS.labels(backend=backend.name, reason='failures').inc()
+        LLM_BACKEND_OUTSTANDING.labels(backend=backend.name).dec()
+
+    def rate_limited(self, backend: LLMBackend, retry_after: Optional[float] = None):
+        """后端返回429，在限流窗口内移出轮换（所有Worker共享）"""
+        seconds = retry_after if retry_after else self.rate_limit_cooldown
+        until = time.time() + seconds
+        with self._lock:
+            backend.cooldown_until = max(backend.cooldown_until, until)
+
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                redis_client.set(f"{self.redis_prefix}{backend.name}", until, ex=max(1, int(seconds) + 1))
+            except Exception as e:
+                logger.warning("⚠️ 写入后端冷却状态失败: %s", e)
+
+        logger.warning("🚫 LLM后端 %s 被限流，%.0f秒内移出轮换", backend.name, seconds)
+        LLM_BACKEND_COOLDOWNS.labels(backend=backend.name, reason='rate_limited').inc()
+
+    def wait_time(self) -> float:
+        """距离有后端可用的秒数（0表示当前有可用后端）"""
+        shared = self._shared_cooldowns()
+        now = time.time()
+        return max(0.0, min(self._cooldown_until(backend, shared) for backend in self.backends) - now)
+
+
+_pools: Dict[str, LLMPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _load_config():
+    try:
+        from flask import current_app
+        return current_app.config['DEEPSEEK_BACKENDS'], current_app.config['LLM_POOL_CONFIG']
+    except Exception:
+        from app.config import Config
+        return Config.DEEPSEEK_BACKENDS, Config.LLM_POOL_CONFIG
+
+
+def get_llm_pool(name: str = 'deepseek') -> LLMPool:
+    """获取后端池（进程内共享，在途请求数在同一进程的所有调用间统计）"""
+    pool = _pools.get(name)
+    if pool is not None:
+        return pool
+
+    with _pools_lock:
+        if name not in _pools:
+            _pools[name] = LLMPool.from_config(*_load_config())
+        return _pools[name]
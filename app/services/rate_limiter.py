@@ -0,0 +1,195 @@
+"""
+DeepSeek API客户端限流
+所有Worker共享Redis中的令牌桶，同时按请求数（RPM）和估算的token数（TPM）限流，请求完成后按实际用量修正。
+优先级通道：后台通道（如搜索建议）只能在桶内剩余量高于预留比例时取用，交互通道（回答）可以用尽全部容量，
+桶紧张时交互请求优先获得配额。Redis不可用时退化为进程内令牌桶。
+"""
+
+import time
+import random
+import logging
+import threading
+from typing import Dict, Optional
+from app.monitoring.metrics import RATE_LIMIT_WAIT, RATE_LIMIT_REJECTED
+
+logger = logging.getLogger(__name__)
+
+# 原子地补充两个桶并尝试扣减，返回需要等待的秒数（0表示已扣减）
+_TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local req_rate, req_cap = tonumber(ARGV[2]), tonumber(ARGV[3])
+local tok_rate, tok_cap = tonumber(ARGV[4]), tonumber(ARGV[5])
+local req_cost, tok_cost = tonumber(ARGV[6]), tonumber(ARGV[7])
+local reserve, force = tonumber(ARGV[8]), tonumber(ARGV[9])
+
+local state = redis.call('HMGET', KEYS[1], 'req', 'tok', 'ts')
+local req = tonumber(state[1]) or req_cap
+local tok = tonumber(state[2]) or tok_cap
+local ts = tonumber(state[3]) or now
+local elapsed = math.max(0, now - ts)
+req = math.min(req_cap, req + elapsed * req_rate)
+tok = math.min(tok_cap, tok + elapsed * tok_rate)
+
+local wait = 0
+if force == 0 then
+    local req_need = req_cost + reserve * req_cap
+    local tok_need = math.min(tok_cost, tok_cap) + reserve * tok_cap
+    if req < req_need then wait = math.max(wait, (req_need - req) / req_rate) end
+    if tok < tok_need then wait = math.max(wait, (tok_need - tok) / tok_rate) end
+end
+if wait == 0 then
+    req = math.min(req_cap, req - req_cost)
+    tok = math.min(tok_cap, tok - tok_cost)
+end
+
+redis.call('HSET', KEYS[1], 'req', req, 'tok', tok, 'ts', math.max(now, ts))
+redis.call('EXPIRE', KEYS[1], 3600)
+return tostring(wait)
+"""
+
+
+def _get_redis_client():
+    """获取Redis客户端，未初始化时返回None"""
+    try:
+        from app.ext import redis_store
+        return redis_store._redis_client
+    except Exception:
+        return None
+
+
+class RateLimitExceeded(Exception):
+    """在截止时间内未获得配额"""
+
+
+class TokenBucketLimiter:
+    """按请求数和token数限流的分布式令牌桶"""
+
+    def __init__(self, config: Dict):
+        self.enabled = config.get('enabled', True)
+        self.key = config.get('redis_key', 'ratelimit:deepseek')
+        self.request_rate = config.get('requests_per_minute', 60) / 60.0
+        self.request_capacity = config.get('request_burst', 10)
+        self.token_rate = config.get('tokens_per_minute', 100000) / 60.0
+        self.token_capacity = config.get('token_burst', 20000)
+        self.lanes = config.get('lanes', {'interactive': {'reserve': 0, 'max_wait': 30}})
+        self.call_type_lanes = config.get('call_type_lanes', {})
+        self.completion_estimate = config.get('completion_estimate', 500)
+
+        # Redis不可用时使用的进程内状态
+        self._local = {'req': self.request_capacity, 'tok': self.token_capacity, 'ts': time.time()}
+        self._lock = threading.Lock()
+        self._script = None
+
+    def _redis(self):
+        return _get_redis_client()
+
+    def _take_local(self, now, req_cost, tok_cost, reserve, force):
+        """与_TAKE_SCRIPT相同的逻辑，作用于进程内状态"""
+        with self._lock:
+            state = self._local
+            elapsed = max(0.0, now - state['ts'])
+            req = min(self.request_capacity, state['req'] + elapsed * self.request_rate)
+            tok = min(self.token_capacity, state['tok'] + elapsed * self.token_rate)
+
+            wait = 0.0
+            if not force:
+                req_need = req_cost + reserve * self.request_capacity
+                tok_need = min(tok_cost, self.token_capacity) + reserve * self.token_capacity
+                if req < req_need:
+                    wait = max(wait, (req_need - req) / self.request_rate)
+                if tok < tok_need:
+                    wait = max(wait, (tok_need - tok) / self.token_rate)
+            if wait == 0:
+                req = min(self.request_capacity, req - req_cost)
+                tok = min(self.token_capacity, tok - tok_cost)
+
+            state.update(req=req, tok=tok, ts=max(now, state['ts']))
+            return wait
+
+    def _take(self, req_cost, tok_cost, reserve=0.0, force=False) -> float:
+        """尝试扣减配额，返回需要等待的秒数（0表示已扣减）"""
+        now = time.time()
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                if self._script is None:
+                    self._script = redis_client.register_script(_TAKE_SCRIPT)
+                return float(self._script(keys=[self.key], args=[
+                    now, self.request_rate, self.request_capacity,
+                    self.token_rate, self.token_capacity,
+                    req_cost, tok_cost, reserve, 1 if force else 0
+                ]))
+            except Exception as e:
+                logger.warning("⚠️ Redis限流不可用，使用进程内令牌桶: %s", e)
+        return self._take_local(now, req_cost, tok_cost, reserve, force)
+
+    def acquire(self, tokens: int, lane: str = 'interactive', max_wait: Optional[float] = None):
+        """
+        获取一个请求和tokens个token的配额，配额不足时等待
+
+        Args:
+            tokens: 估算的token数（提示词 + 预计回答长度）
+            lane: 优先级通道
+            max_wait: 最长等待时间（秒），默认使用通道配置
+
+        Raises:
+            RateLimitExceeded: 超过最长等待时间仍未获得配额
+        """
+        if not self.enabled:
+            return
+
+        lane_config = self.lanes.get(lane) or self.lanes.get('interactive', {})
+        reserve = lane_config.get('reserve', 0)
+        if max_wait is None:
+            max_wait = lane_config.get('max_wait', 30)
+
+        start = time.monotonic()
+        deadline = start + max_wait
+        while True:
+            wait = self._take(1, tokens, reserve)
+            if wait <= 0:
+                RATE_LIMIT_WAIT.labels(lane=lane).observe(time.monotonic() - start)
+                return
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                RATE_LIMIT_REJECTED.labels(lane=lane).inc()
+                raise RateLimitExceeded(f"DeepSeek API限流：{max_wait}秒内未获得配额（{lane}）")
+            # 随机抖动避免多个Worker同时重试
+            time.sleep(min(remaining, wait + random.uniform(0, 0.05)))
+
+    def adjust(self, tokens: int):
+        """按实际用量修正token配额（正数为补扣，负数为退还）"""
+        if self.enabled and tokens:
+            self._take(0, tokens, force=True)
+
+
+_limiters: Dict[str, TokenBucketLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _load_config() -> Dict:
+    try:
+        from flask import current_app
+        return current_app.config['DEEPSEEK_RATE_LIMIT_CONFIG']
+    except Exception:
+        from app.config import Config
+        return Config.DEEPSEEK_RATE_LIMIT_CONFIG
+
+
+def get_rate_limiter(name: str = 'deepseek', config: Optional[Dict] = None) -> TokenBucketLimiter:
+    """获取限流器（进程内共享）"""
+    limiter = _limiters.get(name)
+    if limiter is not None:
+        return limiter
+
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = TokenBucketLimiter(config or _load_config())
+        return _limiters[name]
+
+
+def estimate_tokens(messages, completion_tokens: int) -> int:
+    """粗略估算请求token数：中英文混合文本按每2个字符1个token计，加上预计回答长度"""
+    prompt_chars = sum(len(message.get('content', '')) for message in messages)
+    return prompt_chars // 2 + completion_tokens
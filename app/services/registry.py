@@ -0,0 +1,92 @@
+"""
+服务注册表
+每个工作进程只构建一次服务实例，供路由、装饰器和Celery任务共享
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict
+from flask import current_app
+
+
+class ServiceRegistry:
+    """应用级服务注册表（线程安全，fork后自动重建）"""
+
+    def __init__(self):
+        self._services: Dict[str, Any] = {}
+        self._lock = threading.RLock()  # 工厂函数内可能再次获取其他服务
+        self._pid = os.getpid()
+
+    def get(self, name: str, factory: Callable[[], Any]) -> Any:
+        """获取服务实例，不存在时使用factory创建"""
+        self._reset_after_fork()
+
+        service = self._services.get(name)
+        if service is not None:
+            return service
+
+        with self._lock:
+            service = self._services.get(name)
+            if service is None:
+                service = factory()
+                self._services[name] = service
+            return service
+
+    def reset(self):
+        """清空所有服务实例"""
+        with self._lock:
+            self._services.clear()
+
+    def _reset_after_fork(self):
+        """prefork子进程不复用父进程创建的实例（HTTP连接池等不能跨进程共享）"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._services.clear()
+                    self._pid = os.getpid()
+
+
+# 没有Flask应用上下文时使用的注册表
+_default_registry = ServiceRegistry()
+
+
+def get_registry() -> ServiceRegistry:
+    """获取当前应用的服务注册表"""
+    try:
+        return current_app.extensions['services']
+    except (RuntimeError, KeyError):
+        return _default_registry
+
+
+def get_deepseek_service():
+    """获取DeepSeek服务实例"""
+    from app.services.deepseek_service import DeepSeekService
+    return get_registry().get('deepseek', DeepSeekService)
+
+
+def get_search_service():
+    """获取搜索服务实例"""
+    from app.services.search_service import SearchService
+    return get_registry().get('search', SearchService)
+
+
+def get_crawler_service():
+    """获取爬虫服务实例"""
+    from app.services.crawler_service import CrawlerService
+    return get_registry().get('crawler', CrawlerService)
+
+
+def get_ai_agent_service():
+    """获取AI Agent服务实例（复用共享的DeepSeek/搜索/爬虫服务）"""
+    from app.services.ai_agent_service import AIAgentService
+    return get_registry().get('ai_agent', lambda: AIAgentService(
+        deepseek_service=get_deepseek_service(),
+        search_service=get_search_service(),
+        crawler_service=get_crawler_service()
+    ))
+
+
+def get_wallet_auth_service():
+    """获取钱包认证服务实例"""
+    from app.services.wallet_auth_service import WalletAuthService
+    return get_registry().get('wallet_auth', WalletAuthService)
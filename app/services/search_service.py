@@ -1,10 +1,17 @@
 import requests
-from typing import List, Dict
+from typing import Callable, List, Dict
 from flask import current_app
+from app.monitoring.metrics import SEARCH_REQUESTS, SEARCH_DURATION
+from app.monitoring.tracing import span
+from app.services.circuit_breaker import get_circuit_breaker
+from app.services.cancellation import run_cancellable
 from ddgs import DDGS
 from googlesearch import search as google_search
 import time
 import random
+import logging
+
+logger = logging.getLogger(__name__)
 
 class SearchService:
     """搜索引擎服务类"""
@@ -45,14 +52,14 @@ class SearchService:
         """
         all_results = []
         
-        # DuckDuckGo搜索
+        # DuckDuckGo搜索（任务被取消时不再等待结果，下同）
         if self.config['duckduckgo']['enabled']:
-            ddg_results = self._search_duckduckgo(keywords)
+            ddg_results = run_cancellable(self._timed_search, 'duckduckgo', self._search_duckduckgo, keywords)
             all_results.extend(ddg_results)
         
         # Google搜索
         if self.config['google']['enabled']:
-            google_results = self._search_google(keywords)
+            google_results = run_cancellable(self._timed_search, 'google', self._search_google, keywords)
             all_results.extend(google_results)
         
         # 去重和排序
@@ -61,55 +68,74 @@ class SearchService:
         
         return sorted_results[:10]  # 返回前10个结果
     
-    def _search_duckduckgo(self, keywords: str) -> List[Dict]:
-        """使用DuckDuckGo搜索"""
+    def _timed_search(self, engine: str, search: Callable[[str], List[Dict]], keywords: str) -> List[Dict]:
+        """
+        执行单个搜索引擎的搜索并记录耗时，熔断中的引擎直接跳过
+        只有异常（包括超时）计入引擎失败，空结果是正常响应，按成功记录耗时
+        """
+        breaker = get_circuit_breaker(engine)
+        if not breaker.allow():
+            SEARCH_REQUESTS.labels(engine=engine, status='circuit_open').inc()
+            return []
+        
+        start = time.perf_counter()
         try:
-            ddgs = DDGS()
-            results = ddgs.text(
-                keywords, 
-                max_results=self.config['duckduckgo']['max_results']
-            )
-            
-            formatted_results = []
-            for result in results:
-                formatted_results.append({
-                    'url': result.get('href', ''),
-                    'title': result.get('title', ''),
-                    'content': result.get('body', ''),
-                    'source': 'duckduckgo',
-                    'weight': self.config['duckduckgo']['weight']
-                })
-            
-            return formatted_results
-            
+            with span(f"search.{engine}", keywords=keywords) as search_span:
+                results = search(keywords)
+                search_span.set_attribute('results', len(results))
         except Exception as e:
-            print(f"DuckDuckGo搜索失败: {str(e)}")
+            logger.warning("⚠️ %s搜索失败: %s", engine, e)
+            SEARCH_DURATION.labels(engine=engine).observe(time.perf_counter() - start)
+            SEARCH_REQUESTS.labels(engine=engine, status='error').inc()
+            breaker.record_failure()
             return []
+        
+        elapsed = time.perf_counter() - start
+        SEARCH_DURATION.labels(engine=engine).observe(elapsed)
+        SEARCH_REQUESTS.labels(engine=engine, status='success' if results else 'empty').inc()
+        breaker.record_success(elapsed)
+        return results
+    
+    def _search_duckduckgo(self, keywords: str) -> List[Dict]:
+        """使用DuckDuckGo搜索（异常由_timed_search处理并计入熔断）"""
+        ddgs = DDGS(timeout=get_circuit_breaker('duckduckgo').timeout())
+        results = ddgs.text(
+            keywords, 
+            max_results=self.config['duckduckgo']['max_results']
+        )
+        
+        formatted_results = []
+        for result in results:
+            formatted_results.append({
+                'url': result.get('href', ''),
+                'title': result.get('title', ''),
+                'content': result.get('body', ''),
+                'source': 'duckduckgo',
+                'weight': self.config['duckduckgo']['weight']
+            })
+        
+        return formatted_results
     
     def _search_google(self, keywords: str) -> List[Dict]:
-        """使用Google搜索"""
-        try:
-            results = google_search(
-                keywords, 
-                num_results=self.config['google']['max_results'],
-                sleep_interval=1
-            )
-            
-            formatted_results = []
-            for url in results:
-                formatted_results.append({
-                    'url': url,
-                    'title': '',  # Google搜索API不直接提供标题
-                    'content': '',
-                    'source': 'google',
-                    'weight': self.config['google']['weight']
-                })
-            
-            return formatted_results
-            
-        except Exception as e:
-            print(f"Google搜索失败: {str(e)}")
-            return []
+        """使用Google搜索（异常由_timed_search处理并计入熔断）"""
+        results = google_search(
+            keywords, 
+            num_results=self.config['google']['max_results'],
+            sleep_interval=1,
+            timeout=get_circuit_breaker('google').timeout()
+        )
+        
+        formatted_results = []
+        for url in results:
+            formatted_results.append({
+                'url': url,
+                'title': '',  # Google搜索API不直接提供标题
+                'content': '',
+                'source': 'google',
+                'weight': self.config['google']['weight']
+            })
+        
+        return formatted_results
     
     def _deduplicate_results(self, results: List[Dict]) -> List[Dict]:
         """去除重复的搜索结果"""
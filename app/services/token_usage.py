@@ -0,0 +1,281 @@
+"""
+DeepSeek token用量统计与用户配额
+每次调用的用量按调用类型累加到当日的用户、会话和全局汇总（Redis哈希，所有Worker共享），
+定时任务把有变化的汇总写入MongoDB（TokenUsage）。当前处理的会话和用户通过usage_context传递。
+Redis不可用时汇总只保存在进程内。
+"""
+
+import time
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 配额检查结果
+ALLOW = 'allow'
+DOWNGRADE = 'downgrade'
+REJECT = 'reject'
+
+_FIELDS = ('prompt_tokens', 'completion_tokens', 'calls')
+
+# 当前处理的会话、用户和本次任务的累计用量（对冲请求的线程复制上下文后共享同一个dict）
+_usage_context: ContextVar[Optional[Dict]] = ContextVar('usage_context', default=None)
+
+
+def _get_redis_client():
+    """获取Redis客户端，未初始化时返回None"""
+    try:
+        from app.ext import redis_store
+        return redis_store._redis_client
+    except Exception:
+        return None
+
+
+def _today() -> str:
+    return time.strftime('%Y-%m-%d', time.gmtime())
+
+
+@contextmanager
+def usage_context(session_id: Optional[str] = None, user: Optional[str] = None, downgraded: bool = False):
+    """
+    在上下文内的DeepSeek调用用量计入该会话和用户
+
+    Args:
+        session_id: 会话ID
+        user: 钱包地址
+        downgraded: 用户接近配额，回答使用降级的模型配置
+    """
+    context = {
+        'session_id': session_id,
+        'user': user,
+        'downgraded': downgraded,
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        'calls': 0
+    }
+    token = _usage_context.set(context)
+    try:
+        yield context
+    finally:
+        _usage_context.reset(token)
+
+
+def current_usage_context() -> Dict:
+    """当前的用量上下文，不在usage_context内时返回空dict"""
+    return _usage_context.get() or {}
+
+
+class TokenUsageRecorder:
+    """按调用类型、会话、用户和全局汇总token用量"""
+
+    def __init__(self, config: Dict):
+        self.enabled = config.get('enabled', True)
+        self.prefix = config.get('redis_prefix', 'usage:')
+        self.dirty_key = f"{self.prefix}dirty"
+        self.retention_days = config.get('retention_days', 8)
+        self.daily_quota = config.get('daily_quota', 0)
+        self.downgrade_ratio = config.get('downgrade_ratio', 0.8)
+
+        # Redis不可用时使用的进程内汇总
+        self._local = defaultdict(lambda: defaultdict(int))
+        self._local_dirty = set()
+        self._lock = threading.Lock()
+
+    def _redis(self):
+        return _get_redis_client()
+
+    def _key(self, scope: str, key: str, day: str) -> str:
+        return f"{self.prefix}{scope}:{key}:{day}"
+
+    def _parse_key(self, redis_key: str):
+        scope, rest = redis_key[len(self.prefix):].split(':', 1)
+        key, day = rest.rsplit(':', 1)
+        return scope, key, day
+
+    def record(self, call_type: str, model: str, prompt_tokens: int, completion_tokens: int):
+        """记录一次调用的用量"""
+        context = current_usage_context()
+        if context:
+            with self._lock:
+                context['prompt_tokens'] += prompt_tokens
+                context['completion_tokens'] += completion_tokens
+                context['calls'] += 1
+        logger.debug(
+            "🧮 DeepSeek用量: %s %s prompt=%s completion=%s", call_type, model, prompt_tokens, completion_tokens,
+            extra={'session_id': context.get('session_id'), 'user': context.get('user')}
+        )
+        if not self.enabled:
+            return
+
+        day = _today()
+        keys = [self._key('global', 'all', day)]
+        if context.get('session_id'):
+            keys.append(self._key('session', context['session_id'], day))
+        if context.get('user'):
+            keys.append(self._key('user', context['user'], day))
+
+        increments = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'calls': 1,
+            f"{call_type}:prompt_tokens": prompt_tokens,
+            f"{call_type}:completion_tokens": completion_tokens,
+            f"{call_type}:calls": 1
+        }
+
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                for key in keys:
+                    for field, value in increments.items():
+                        pipe.hincrby(key, field, value)
+                    pipe.expire(key, self.retention_days * 86400)
+                pipe.sadd(self.dirty_key, *keys)
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning("⚠️ 记录token用量失败，使用进程内汇总: %s", e)
+
+        with self._lock:
+            for key in keys:
+                for field, value in increments.items():
+                    self._local[key][field] += value
+            self._local_dirty.update(keys)
+
+    def _read(self, keys: List[str]) -> List[Dict]:
+        """读取汇总哈希，不存在的返回空dict"""
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                for key in keys:
+                    pipe.hgetall(key)
+                return [{field: int(value) for field, value in data.items()} for data in pipe.execute()]
+            except Exception as e:
+                logger.warning("⚠️ 读取token用量失败: %s", e)
+        with self._lock:
+            return [dict(self._local.get(key, {})) for key in keys]
+
+    @staticmethod
+    def _totals(data: Dict) -> Dict:
+        """把哈希字段整理为总量和按调用类型的细分"""
+        totals = {field: data.get(field, 0) for field in _FIELDS}
+        stages = defaultdict(dict)
+        for field, value in data.items():
+            if ':' in field:
+                stage, name = field.split(':', 1)
+                stages[stage][name] = value
+        totals['stages'] = dict(stages)
+        return totals
+
+    def check_quota(self, user: str) -> str:
+        """检查用户当日用量：超过配额拒绝，超过降级比例时回答使用降级的模型配置"""
+        if not self.enabled or not self.daily_quota or not user:
+            return ALLOW
+        data = self._read([self._key('user', user, _today())])[0]
+        used = data.get('prompt_tokens', 0) + data.get('completion_tokens', 0)
+        if used >= self.daily_quota:
+            return REJECT
+        if used >= self.daily_quota * self.downgrade_ratio:
+            return DOWNGRADE
+        return ALLOW
+
+    def report(self, scope: str, key: str, days: int = 7) -> List[Dict]:
+        """最近days天（含今天）的每日用量，Redis中已过期的日期从MongoDB读取"""
+        today = datetime.strptime(_today(), '%Y-%m-%d')
+        day_list = [(today - timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(days)]
+        live = dict(zip(day_list, self._read([self._key(scope, key, day) for day in day_list])))
+
+        stored = {}
+        missing = [day for day in day_list if not live[day]]
+        if missing:
+            from app.models.user import TokenUsage
+            stored = TokenUsage.get_days(scope, key, missing)
+
+        report = []
+        for day in day_list:
+            if live[day]:
+                totals = self._totals(live[day])
+            elif day in stored:
+                totals = stored[day].to_dict()
+            else:
+                totals = self._totals({})
+            totals['day'] = day
+            totals['total_tokens'] = totals['prompt_tokens'] + totals['completion_tokens']
+            report.append(totals)
+        return report
+
+    def _pop_dirty(self, batch_size: int) -> List[str]:
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                return list(redis_client.spop(self.dirty_key, batch_size) or [])
+            except Exception as e:
+                logger.warning("⚠️ 读取待写入的token用量失败: %s", e)
+        with self._lock:
+            keys = list(self._local_dirty)[:batch_size]
+            self._local_dirty.difference_update(keys)
+            return keys
+
+    def _mark_dirty(self, keys: List[str]):
+        redis_client = self._redis()
+        if redis_client is not None:
+            try:
+                redis_client.sadd(self.dirty_key, *keys)
+                return
+            except Exception:
+                pass
+        with self._lock:
+            self._local_dirty.update(keys)
+
+    def flush(self, batch_size: int = 500) -> int:
+        """把有变化的汇总写入MongoDB，返回写入的汇总数（写入后又有变化的汇总会在下次写入）"""
+        from app.models.user import TokenUsage
+
+        flushed = 0
+        while True:
+            keys = self._pop_dirty(batch_size)
+            if not keys:
+                return flushed
+            for index, (key, data) in enumerate(zip(keys, self._read(keys))):
+                if not data:
+                    continue
+                scope, usage_key, day = self._parse_key(key)
+                try:
+                    TokenUsage.upsert(scope, usage_key, day, self._totals(data))
+                except Exception:
+                    # 未写入的汇总放回，下次重试
+                    self._mark_dirty(keys[index:])
+                    raise
+                flushed += 1
+            if len(keys) < batch_size:
+                return flushed
+
+
+_recorder: Optional[TokenUsageRecorder] = None
+_recorder_lock = threading.Lock()
+
+
+def _load_config() -> Dict:
+    try:
+        from flask import current_app
+        return current_app.config['TOKEN_USAGE_CONFIG']
+    except Exception:
+        from app.config import Config
+        return Config.TOKEN_USAGE_CONFIG
+
+
+def get_token_usage() -> TokenUsageRecorder:
+    """获取用量统计（进程内共享）"""
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = TokenUsageRecorder(_load_config())
+    return _recorder
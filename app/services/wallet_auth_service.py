@@ -1,11 +1,245 @@
 import jwt as pyjwt
 import secrets
 import hashlib
+import threading
+import time
+import logging
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from web3 import Web3
+from eth_account import Account
 from eth_account.messages import encode_defunct
+from mongoengine import signals
 from app.models.user import User, WalletNonce
 from app.config import Config
+from app.monitoring.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# 缓存版本未变化时才写入用户缓存（加载期间用户被更新或删除时放弃写入，避免缓存旧数据）
+_SET_IF_VERSION_SCRIPT = """
+local current = redis.call('GET', KEYS[2]) or '0'
+if current ~= ARGV[2] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', tonumber(ARGV[3]))
+return 1
+"""
+
+def _get_redis_client():
+    """获取Redis客户端，未初始化时返回None"""
+    try:
+        from app.ext import redis_store
+        return redis_store._redis_client
+    except Exception:
+        return None
+
+
+class UserCache:
+    """已验证用户缓存：进程内短TTL有界缓存 + Redis共享缓存"""
+    
+    def __init__(self, ttl, max_size, redis_ttl):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.redis_ttl = redis_ttl
+        self.redis_prefix = "auth:user:"
+        self.version_prefix = "auth:user_version:"
+        self._local = OrderedDict()  # {user_id: (expires_at, user_json)}
+        self._local_versions = OrderedDict()  # {user_id: version}，Redis不可用时使用
+        self._lock = threading.Lock()
+        self._script = None
+    
+    def _get_redis_client(self):
+        return _get_redis_client()
+    
+    def get(self, user_id):
+        """获取缓存的用户，未命中返回None（每次返回新的文档对象，避免跨请求共享可变状态）"""
+        now = time.time()
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry:
+                if entry[0] > now:
+                    self._local.move_to_end(user_id)
+                    CACHE_REQUESTS.labels(cache='user', result='hit_local').inc()
+                    return User.from_json(entry[1], created=False)
+                del self._local[user_id]
+        
+        redis_client = self._get_redis_client()
+        if redis_client is None:
+            CACHE_REQUESTS.labels(cache='user', result='miss').inc()
+            return None
+        
+        try:
+            user_json = redis_client.get(f"{self.redis_prefix}{user_id}")
+        except Exception as e:
+            logger.warning("⚠️ 读取用户缓存失败: %s", e)
+            CACHE_REQUESTS.labels(cache='user', result='miss').inc()
+            return None
+        
+        if not user_json:
+            CACHE_REQUESTS.labels(cache='user', result='miss').inc()
+            return None
+        
+        CACHE_REQUESTS.labels(cache='user', result='hit_redis').inc()
+        user_json = user_json.decode() if isinstance(user_json, bytes) else user_json
+        self._set_local(user_id, user_json)
+        return User.from_json(user_json, created=False)
+    
+    def version(self, user_id):
+        """用户缓存版本，每次失效递增。从MongoDB加载用户前读取，加载后传给set"""
+        user_id = str(user_id)
+        redis_client = self._get_redis_client()
+        if redis_client is not None:
+            try:
+                value = redis_client.get(f"{self.version_prefix}{user_id}")
+                return int(value) if value else 0
+            except Exception as e:
+                logger.warning("⚠️ 读取用户缓存版本失败: %s", e)
+        with self._lock:
+            return self._local_versions.get(user_id, 0)
+    
+    def set(self, user, version=None):
+        """
+        缓存用户
+        
+        Args:
+            user: 用户文档
+            version: 加载用户前读取的缓存版本，此后用户缓存已失效（版本变化）时不写入
+        """
+        user_id = str(user.id)
+        user_json = user.to_json()
+        
+        redis_client = self._get_redis_client()
+        if redis_client is not None:
+            try:
+                if version is None:
+                    redis_client.set(f"{self.redis_prefix}{user_id}", user_json, ex=self.redis_ttl)
+                else:
+                    if self._script is None:
+                        self._script = redis_client.register_script(_SET_IF_VERSION_SCRIPT)
+                    stored = self._script(
+                        keys=[f"{self.redis_prefix}{user_id}", f"{self.version_prefix}{user_id}"],
+                        args=[user_json, str(version), self.redis_ttl]
+                    )
+                    if not int(stored):
+                        logger.debug("⏭️ 用户加载期间缓存已失效，跳过写入: %s", user_id)
+                        return
+                self._set_local(user_id, user_json)
+                return
+            except Exception as e:
+                logger.warning("⚠️ 写入用户缓存失败: %s", e)
+        
+        self._set_local(user_id, user_json, version)
+    
+    def invalidate(self, user_id):
+        """使用户缓存失效并递增版本（其他进程的本地缓存在ttl内自然过期）"""
+        user_id = str(user_id)
+        with self._lock:
+            self._local.pop(user_id, None)
+            self._local_versions[user_id] = self._local_versions.get(user_id, 0) + 1
+            self._local_versions.move_to_end(user_id)
+            while len(self._local_versions) > self.max_size:
+                self._local_versions.popitem(last=False)
+        
+        redis_client = self._get_redis_client()
+        if redis_client is None:
+            return
+        
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.incr(f"{self.version_prefix}{user_id}")
+            pipe.expire(f"{self.version_prefix}{user_id}", self.redis_ttl)
+            pipe.delete(f"{self.redis_prefix}{user_id}")
+            pipe.execute()
+        except Exception as e:
+            logger.warning("⚠️ 清除用户缓存失败: %s", e)
+    
+    def clear(self):
+        """清空进程内缓存"""
+        with self._lock:
+            self._local.clear()
+    
+    def _set_local(self, user_id, user_json, version=None):
+        with self._lock:
+            if version is not None and self._local_versions.get(user_id, 0) != version:
+                return
+            self._local[user_id] = (time.time() + self.ttl, user_json)
+            self._local.move_to_end(user_id)
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+
+
+user_cache = UserCache(
+    ttl=Config.WALLET_AUTH_CONFIG['user_cache_ttl'],
+    max_size=Config.WALLET_AUTH_CONFIG['user_cache_max_size'],
+    redis_ttl=Config.WALLET_AUTH_CONFIG['user_cache_redis_ttl']
+)
+
+
+def _invalidate_user_cache(sender, document, **kwargs):
+    """用户保存或删除后清除缓存（资料更新、禁用等）"""
+    if document.id:
+        user_cache.invalidate(document.id)
+
+signals.post_save.connect(_invalidate_user_cache, sender=User)
+signals.post_delete.connect(_invalidate_user_cache, sender=User)
+
+
+class NonceStore:
+    """认证随机数存储：Redis（SET NX EX写入，取出即删除），Redis不可用时回退到带TTL索引的MongoDB集合"""
+    
+    def __init__(self, prefix):
+        self.prefix = prefix
+    
+    def _get_redis_client(self):
+        return _get_redis_client()
+    
+    def _key(self, wallet_address, nonce):
+        return f"{self.prefix}{wallet_address.lower()}:{nonce}"
+    
+    def create(self, wallet_address, nonce, expires_at, ttl):
+        """保存随机数，键已存在时返回False"""
+        redis_client = self._get_redis_client()
+        if redis_client is not None:
+            try:
+                return bool(redis_client.set(
+                    self._key(wallet_address, nonce),
+                    expires_at.isoformat(),
+                    nx=True,
+                    ex=ttl
+                ))
+            except Exception as e:
+                logger.warning("⚠️ 写入Redis随机数失败，回退到MongoDB: %s", e)
+        
+        WalletNonce.create_nonce(
+            wallet_address=wallet_address,
+            nonce=nonce,
+            expires_at=expires_at
+        )
+        return True
+    
+    def consume(self, wallet_address, nonce):
+        """原子地取出并删除随机数，返回其过期时间，无效、过期或已使用时返回None"""
+        redis_client = self._get_redis_client()
+        if redis_client is not None:
+            try:
+                # MULTI/EXEC中GET+DEL，同一随机数只有一个请求能取到
+                pipe = redis_client.pipeline()
+                pipe.get(self._key(wallet_address, nonce))
+                pipe.delete(self._key(wallet_address, nonce))
+                value, _ = pipe.execute()
+                if value:
+                    value = value.decode() if isinstance(value, bytes) else value
+                    return datetime.fromisoformat(value)
+            except Exception as e:
+                logger.warning("⚠️ 读取Redis随机数失败，回退到MongoDB: %s", e)
+        
+        # Redis未命中时检查MongoDB（Redis不可用期间生成的随机数）
+        wallet_nonce = WalletNonce.consume_nonce(wallet_address, nonce)
+        return wallet_nonce.expires_at if wallet_nonce else None
+
+
+nonce_store = NonceStore(prefix=Config.WALLET_AUTH_CONFIG['nonce_redis_prefix'])
+
 
 class WalletAuthService:
     """钱包认证服务"""
@@ -18,18 +252,13 @@ class WalletAuthService:
     
     def generate_nonce(self, wallet_address):
         """生成认证随机数"""
-        # 生成随机字符串
-        nonce = secrets.token_hex(32)
-        
         # 设置过期时间
         expires_at = datetime.utcnow() + timedelta(seconds=self.nonce_expiration)
         
-        # 保存到数据库
-        wallet_nonce = WalletNonce.create_nonce(
-            wallet_address=wallet_address,
-            nonce=nonce,
-            expires_at=expires_at
-        )
+        # 生成随机字符串并保存（SET NX，不覆盖已存在的随机数）
+        nonce = secrets.token_hex(32)
+        while not nonce_store.create(wallet_address, nonce, expires_at, self.nonce_expiration):
+            nonce = secrets.token_hex(32)
         
         return {
             'nonce': nonce,
@@ -40,28 +269,25 @@ class WalletAuthService:
     def verify_signature(self, wallet_address, signature, nonce):
         """验证钱包签名"""
         try:
-            # 获取有效的随机数
-            wallet_nonce = WalletNonce.get_valid_nonce(wallet_address, nonce)
-            if not wallet_nonce:
+            # 原子消费随机数，无论签名是否通过都不能重放
+            expires_at = nonce_store.consume(wallet_address, nonce)
+            if not expires_at:
                 return False, "无效或过期的随机数"
             
             # 构造消息
-            message = f"请签名以下消息以完成登录:\n\nNonce: {nonce}\n\n时间: {wallet_nonce.expires_at.strftime('%Y-%m-%d %H:%M:%S')}"
+            message = f"请签名以下消息以完成登录:\n\nNonce: {nonce}\n\n时间: {expires_at.strftime('%Y-%m-%d %H:%M:%S')}"
             
             # 编码消息
             message_hash = encode_defunct(text=message)
             
-            # 验证签名
+            # 验证签名（直接使用eth_account，无需构造Web3 provider）
             try:
-                recovered_address = Web3().eth.account.recover_message(message_hash, signature=signature)
+                recovered_address = Account.recover_message(message_hash, signature=signature)
                 if recovered_address.lower() != wallet_address.lower():
                     return False, "签名验证失败"
             except Exception as e:
                 return False, f"签名验证错误: {str(e)}"
             
-            # 标记随机数为已使用
-            wallet_nonce.mark_as_used()
-            
             return True, "签名验证成功"
             
         except Exception as e:
@@ -126,7 +352,15 @@ class WalletAuthService:
             if not user_id:
                 return False, "无效的token"
             
-            user = User.objects(id=user_id).first()
+            # 优先使用缓存，避免每个请求都查询MongoDB
+            user = user_cache.get(user_id)
+            if user is None:
+                # 加载前读取缓存版本，加载期间用户被更新时不会把旧数据写入缓存
+                version = user_cache.version(user_id)
+                user = User.objects(id=user_id).first()
+                if user:
+                    user_cache.set(user, version)
+            
             if not user or not user.is_active:
                 return False, "用户不存在或已被禁用"
             
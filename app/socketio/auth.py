@@ -4,8 +4,11 @@ SocketIO权限验证模块
 """
 
 import time
+import logging
 from flask import request, session
 
+logger = logging.getLogger(__name__)
+
 
 class SocketIOAuth:
     """SocketIO权限验证类"""
@@ -24,22 +27,22 @@ class SocketIOAuth:
             
             # 检查IP是否被阻止
             if client_ip in self.blocked_ips:
-                print(f"❌ 连接被拒绝：IP {client_ip} 已被阻止")
+                logger.warning("❌ 连接被拒绝：IP %s 已被阻止", client_ip)
                 return False
             
             # 检查连接数限制
             if not self._check_connection_limit(client_ip):
-                print(f"❌ 连接被拒绝：IP {client_ip} 连接数超限")
+                logger.warning("❌ 连接被拒绝：IP %s 连接数超限", client_ip)
                 return False
             
             # 记录连接
             self._record_connection(client_ip)
             
-            print(f"✅ 连接验证通过：IP {client_ip}")
+            logger.debug("✅ 连接验证通过：IP %s", client_ip)
             return True
             
         except Exception as e:
-            print(f"❌ 连接验证失败: {str(e)}")
+            logger.error("❌ 连接验证失败: %s", e)
             return False
     
     def verify_room_access(self, session_id):
@@ -55,7 +58,7 @@ class SocketIOAuth:
             return True
             
         except Exception as e:
-            print(f"❌ 房间访问验证失败: {str(e)}")
+            logger.error("❌ 房间访问验证失败: %s", e)
             return False
     
     def verify_question_access(self, session_id, question):
@@ -65,12 +68,12 @@ class SocketIOAuth:
             
             # 检查问题频率限制
             if not self._check_question_rate_limit(client_ip):
-                print(f"❌ 问题提交被拒绝：IP {client_ip} 提交频率过高")
+                logger.warning("❌ 问题提交被拒绝：IP %s 提交频率过高", client_ip)
                 return False
             
             # 检查问题内容
             if not self._validate_question_content(question):
-                print(f"❌ 问题提交被拒绝：问题内容不符合规范")
+                logger.warning("❌ 问题提交被拒绝：问题内容不符合规范")
                 return False
             
             # 记录问题提交
@@ -79,7 +82,7 @@ class SocketIOAuth:
             return True
             
         except Exception as e:
-            print(f"❌ 问题权限验证失败: {str(e)}")
+            logger.error("❌ 问题权限验证失败: %s", e)
             return False
     
     def verify_suggestion_access(self, session_id, question):
@@ -93,7 +96,7 @@ class SocketIOAuth:
             return True
             
         except Exception as e:
-            print(f"❌ 建议权限验证失败: {str(e)}")
+            logger.error("❌ 建议权限验证失败: %s", e)
             return False
     
     def verify_history_access(self, session_id):
@@ -107,7 +110,7 @@ class SocketIOAuth:
             return True
             
         except Exception as e:
-            print(f"❌ 历史记录权限验证失败: {str(e)}")
+            logger.error("❌ 历史记录权限验证失败: %s", e)
             return False
     
     def get_client_ip(self):
@@ -177,7 +180,7 @@ class SocketIOAuth:
             return True
             
         except Exception as e:
-            print(f"❌ 问题内容验证失败: {str(e)}")
+            logger.error("❌ 问题内容验证失败: %s", e)
             return False
     
     def _record_connection(self, client_ip):
@@ -194,12 +197,12 @@ class SocketIOAuth:
     def block_ip(self, client_ip, reason="违规行为"):
         """阻止IP地址"""
         self.blocked_ips.add(client_ip)
-        print(f"🚫 IP {client_ip} 已被阻止，原因: {reason}")
+        logger.warning("🚫 IP %s 已被阻止，原因: %s", client_ip, reason)
     
     def unblock_ip(self, client_ip):
         """解除IP阻止"""
         self.blocked_ips.discard(client_ip)
-        print(f"✅ IP {client_ip} 已解除阻止")
+        logger.info("✅ IP %s 已解除阻止", client_ip)
     
     def get_connection_stats(self):
         """获取连接统计信息"""
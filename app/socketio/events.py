@@ -4,9 +4,14 @@ SocketIO事件处理器
 """
 
 import uuid
+import logging
+from flask import session
 from flask_socketio import emit, join_room, leave_room
 from .hooks import hook_manager
 from app.schedules.chat_tasks import process_question_async, get_suggestions_async
+from app.services.cancellation import get_cancellation, REQUESTED
+
+logger = logging.getLogger(__name__)
 
 
 def register_socketio_events(app):
@@ -21,8 +26,10 @@ def register_socketio_events(app):
                 emit('error', {'message': '连接被拒绝：权限验证失败'})
                 return False
             
-            # 生成会话ID
+            # 生成会话ID（保存在连接的session中，断开时据此执行钩子）
             session_id = str(uuid.uuid4())
+            session['session_id'] = session_id
+            session['chat_sessions'] = []
             
             # 加入房间
             join_room(session_id)
@@ -46,11 +53,11 @@ def register_socketio_events(app):
                 'message': '连接成功'
             })
             
-            print(f"✅ 客户端已连接，会话ID: {session_id}")
+            logger.debug("✅ 客户端已连接，会话ID: %s", session_id)
             return True
             
         except Exception as e:
-            print(f"❌ 连接处理失败: {str(e)}")
+            logger.error("❌ 连接处理失败: %s", e)
             emit('error', {'message': f'连接失败: {str(e)}'})
             return False
     
@@ -66,15 +73,15 @@ def register_socketio_events(app):
                 # 执行断开连接前钩子
                 hook_manager.execute_before_disconnect(session_id)
                 
-                # 执行断开连接后钩子
-                hook_manager.execute_after_disconnect(session_id)
+                # 执行断开连接后钩子（取消客户端所在聊天会话的在途问题）
+                hook_manager.execute_after_disconnect(session_id, chat_sessions=session.get('chat_sessions', []))
                 
-                print(f"✅ 会话已清理: {session_id}")
+                logger.debug("✅ 会话已清理: %s", session_id)
             
-            print("👋 客户端已断开连接")
+            logger.debug("👋 客户端已断开连接")
             
         except Exception as e:
-            print(f"❌ 断开连接处理失败: {str(e)}")
+            logger.error("❌ 断开连接处理失败: %s", e)
     
     @app.socketio.on('join_room')
     def handle_join_room(data):
@@ -92,10 +99,10 @@ def register_socketio_events(app):
             
             join_room(session_id)
             emit('joined_room', {'session_id': session_id})
-            print(f"✅ 客户端加入房间: {session_id}")
+            logger.debug("✅ 客户端加入房间: %s", session_id)
             
         except Exception as e:
-            print(f"❌ 加入房间失败: {str(e)}")
+            logger.error("❌ 加入房间失败: %s", e)
             emit('error', {'message': f'加入房间失败: {str(e)}'})
     
     @app.socketio.on('leave_room')
@@ -109,10 +116,10 @@ def register_socketio_events(app):
             
             leave_room(session_id)
             emit('left_room', {'session_id': session_id})
-            print(f"✅ 客户端离开房间: {session_id}")
+            logger.debug("✅ 客户端离开房间: %s", session_id)
             
         except Exception as e:
-            print(f"❌ 离开房间失败: {str(e)}")
+            logger.error("❌ 离开房间失败: %s", e)
             emit('error', {'message': f'离开房间失败: {str(e)}'})
     
     @app.socketio.on('ask_question')
@@ -154,10 +161,10 @@ def register_socketio_events(app):
             # 发送任务ID
             emit('suggestion_task_id', {'task_id': task.id})
             
-            print(f"✅ 建议获取任务已启动: {task.id}")
+            logger.debug("✅ 建议获取任务已启动: %s", task.id)
             
         except Exception as e:
-            print(f"❌ 建议获取失败: {str(e)}")
+            logger.error("❌ 建议获取失败: %s", e)
             emit('error', {'message': f'获取建议失败: {str(e)}'})
     
     @app.socketio.on('get_history')
@@ -183,10 +190,10 @@ def register_socketio_events(app):
                 'history': history
             })
             
-            print(f"✅ 历史记录已发送: {session_id}")
+            logger.debug("✅ 历史记录已发送: %s", session_id)
             
         except Exception as e:
-            print(f"❌ 获取历史记录失败: {str(e)}")
+            logger.error("❌ 获取历史记录失败: %s", e)
             emit('error', {'message': f'获取历史记录失败: {str(e)}'})
     
     @app.socketio.on('clear_history')
@@ -212,10 +219,10 @@ def register_socketio_events(app):
                 'message': '历史记录已清除'
             })
             
-            print(f"✅ 历史记录已清除: {session_id}")
+            logger.debug("✅ 历史记录已清除: %s", session_id)
             
         except Exception as e:
-            print(f"❌ 清除历史记录失败: {str(e)}")
+            logger.error("❌ 清除历史记录失败: %s", e)
             emit('error', {'message': f'清除历史记录失败: {str(e)}'})
     
     @app.socketio.on('join_session')
@@ -229,11 +236,15 @@ def register_socketio_events(app):
             
             # 加入会话房间
             join_room(session_id)
+            chat_sessions = session.get('chat_sessions', [])
+            if session_id not in chat_sessions:
+                session['chat_sessions'] = chat_sessions + [session_id]
+                get_cancellation().attach(session_id, session.get('session_id'))
             emit('joined_session', {'session_id': session_id})
-            print(f"✅ 客户端加入会话房间: {session_id}")
+            logger.debug("✅ 客户端加入会话房间: %s", session_id)
             
         except Exception as e:
-            print(f"❌ 加入会话房间失败: {str(e)}")
+            logger.error("❌ 加入会话房间失败: %s", e)
             emit('error', {'message': f'加入会话房间失败: {str(e)}'})
     
     @app.socketio.on('leave_session')
@@ -245,11 +256,45 @@ def register_socketio_events(app):
                 emit('error', {'message': '会话ID不能为空'})
                 return
             
-            # 离开会话房间
+            # 离开会话房间（切换会话不取消在途问题，回答仍会保存到会话）
             leave_room(session_id)
+            chat_sessions = session.get('chat_sessions', [])
+            if session_id in chat_sessions:
+                session['chat_sessions'] = [item for item in chat_sessions if item != session_id]
+                get_cancellation().detach(session_id, session.get('session_id'))
             emit('left_session', {'session_id': session_id})
-            print(f"✅ 客户端离开会话房间: {session_id}")
+            logger.debug("✅ 客户端离开会话房间: %s", session_id)
             
         except Exception as e:
-            print(f"❌ 离开会话房间失败: {str(e)}")
+            logger.error("❌ 离开会话房间失败: %s", e)
             emit('error', {'message': f'离开会话房间失败: {str(e)}'})
+    
+    @app.socketio.on('cancel_task')
+    def handle_cancel_task(data):
+        """取消会话中在途的问题任务（指定task_id时只取消该任务）"""
+        try:
+            session_id = data.get('session_id')
+            task_id = data.get('task_id')
+            if not session_id:
+                emit('error', {'message': '会话ID不能为空'})
+                return
+            
+            # 只能取消本连接已加入（join_session）的会话中仍在处理的任务
+            if session_id not in session.get('chat_sessions', []):
+                emit('error', {'message': '无权取消该会话的任务'})
+                return
+            
+            cancellation = get_cancellation()
+            if task_id:
+                task_ids = [task_id] if task_id in cancellation.active_tasks(session_id) else []
+                for item in task_ids:
+                    cancellation.cancel(item, REQUESTED)
+            else:
+                task_ids = cancellation.cancel_session(session_id, REQUESTED)
+            
+            emit('task_cancelled', {'session_id': session_id, 'task_ids': task_ids})
+            logger.debug("✅ 已请求取消任务: %s %s", session_id, task_ids)
+            
+        except Exception as e:
+            logger.error("❌ 取消任务失败: %s", e)
+            emit('error', {'message': f'取消任务失败: {str(e)}'})
@@ -6,6 +6,9 @@ SocketIO扩展钩子系统
 from typing import Dict, List, Callable, Any, Optional
 from abc import ABC, abstractmethod
 import logging
+from app.monitoring.metrics import SOCKETIO_CONNECTIONS
+
+logger = logging.getLogger(__name__)
 
 
 class SocketIOHook(ABC):
@@ -244,6 +247,14 @@ class StorageHook(SocketIOHook):
         return True
     
     def after_disconnect(self, session_id: str, **kwargs) -> bool:
+        # 确定断开的客户端是会话的最后一个客户端时，取消该会话仍在处理的问题，释放Worker
+        # （剩余客户端数未知时返回None，不取消）
+        from app.services.cancellation import get_cancellation, DISCONNECTED
+        cancellation = get_cancellation()
+        for chat_session_id in kwargs.get('chat_sessions', []):
+            if cancellation.detach(chat_session_id, session_id) == 0:
+                cancellation.cancel_session(chat_session_id, DISCONNECTED)
+        
         # 清理会话数据
         return self._get_storage().cleanup_session(session_id)
     
@@ -269,15 +280,18 @@ class MonitoringHook(SocketIOHook):
     
     def after_connect(self, session_id: str, **kwargs) -> bool:
         self.connection_count += 1
-        print(f"📊 监控: 当前连接数 {self.connection_count}")
+        SOCKETIO_CONNECTIONS.inc()
+        logger.debug("📊 监控: 当前连接数 %s", self.connection_count)
         return True
     
     def before_disconnect(self, session_id: str, **kwargs) -> bool:
         return True
     
     def after_disconnect(self, session_id: str, **kwargs) -> bool:
-        self.connection_count = max(0, self.connection_count - 1)
-        print(f"📊 监控: 当前连接数 {self.connection_count}")
+        if self.connection_count > 0:
+            self.connection_count -= 1
+            SOCKETIO_CONNECTIONS.dec()
+        logger.debug("📊 监控: 当前连接数 %s", self.connection_count)
         return True
     
     def before_question(self, session_id: str, question: str, **kwargs) -> bool:
@@ -285,7 +299,7 @@ class MonitoringHook(SocketIOHook):
     
     def after_question(self, session_id: str, question: str, task_id: str, **kwargs) -> bool:
         self.question_count += 1
-        print(f"📊 监控: 总问题数 {self.question_count}")
+        logger.debug("📊 监控: 总问题数 %s", self.question_count)
         return True
 
 
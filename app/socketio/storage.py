@@ -5,10 +5,12 @@ SocketIO分布式存储模块
 
 import json
 import time
+import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from flask import current_app
 
+logger = logging.getLogger(__name__)
 
 class SocketIOStorage:
     """SocketIO分布式存储类"""
@@ -18,8 +20,10 @@ class SocketIOStorage:
         self.task_prefix = "socketio:task:"
         self.history_prefix = "socketio:history:"
         self.suggestion_prefix = "socketio:suggestion:"
+        self.sources_prefix = "socketio:sources:"
         self.session_ttl = 3600 * 24  # 会话数据24小时过期
         self.history_ttl = 3600 * 24 * 7  # 历史记录7天过期
+        self.sources_ttl = 3600 * 24  # 任务来源内容24小时过期
     
     def get_redis_client(self):
         """获取Redis客户端"""
@@ -38,7 +42,7 @@ class SocketIOStorage:
         try:
             redis_client = self.get_redis_client()
             if not redis_client:
-                print("❌ 无法获取Redis客户端")
+                logger.error("❌ 无法获取Redis客户端")
                 return False
             
             key = f"{self.session_prefix}{session_id}"
@@ -47,11 +51,11 @@ class SocketIOStorage:
             redis_client.hset(key, mapping=session_data)
             redis_client.expire(key, self.session_ttl)
             
-            print(f"✅ 会话数据已存储: {session_id}")
+            logger.debug("✅ 会话数据已存储: %s", session_id)
             return True
             
         except Exception as e:
-            print(f"❌ 存储会话数据失败: {str(e)}")
+            logger.error("❌ 存储会话数据失败: %s", e)
             return False
     
     def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
@@ -73,7 +77,7 @@ class SocketIOStorage:
             return None
             
         except Exception as e:
-            print(f"❌ 获取会话数据失败: {str(e)}")
+            logger.error("❌ 获取会话数据失败: %s", e)
             return None
     
     def cleanup_session(self, session_id: str):
@@ -95,11 +99,11 @@ class SocketIOStorage:
             suggestion_key = f"{self.suggestion_prefix}{session_id}"
             redis_client.delete(suggestion_key)
             
-            print(f"✅ 会话数据已清理: {session_id}")
+            logger.debug("✅ 会话数据已清理: %s", session_id)
             return True
             
         except Exception as e:
-            print(f"❌ 清理会话数据失败: {str(e)}")
+            logger.error("❌ 清理会话数据失败: %s", e)
             return False
     
     def store_question(self, session_id: str, question: str):
@@ -120,11 +124,11 @@ class SocketIOStorage:
             redis_client.lpush(key, json.dumps(question_data))
             redis_client.expire(key, self.history_ttl)
             
-            print(f"✅ 问题已存储到历史: {session_id}")
+            logger.debug("✅ 问题已存储到历史: %s", session_id)
             return True
             
         except Exception as e:
-            print(f"❌ 存储问题失败: {str(e)}")
+            logger.error("❌ 存储问题失败: %s", e)
             return False
     
     def store_answer(self, session_id: str, answer: str, task_id: str = None):
@@ -146,11 +150,11 @@ class SocketIOStorage:
             redis_client.lpush(key, json.dumps(answer_data))
             redis_client.expire(key, self.history_ttl)
             
-            print(f"✅ 答案已存储到历史: {session_id}")
+            logger.debug("✅ 答案已存储到历史: %s", session_id)
             return True
             
         except Exception as e:
-            print(f"❌ 存储答案失败: {str(e)}")
+            logger.error("❌ 存储答案失败: %s", e)
             return False
     
     def store_task(self, session_id: str, task_id: str, task_data: Dict[str, Any]):
@@ -167,11 +171,11 @@ class SocketIOStorage:
             redis_client.hset(key, task_id, json.dumps(task_data))
             redis_client.expire(key, self.session_ttl)
             
-            print(f"✅ 任务信息已存储: {task_id}")
+            logger.debug("✅ 任务信息已存储: %s", task_id)
             return True
             
         except Exception as e:
-            print(f"❌ 存储任务信息失败: {str(e)}")
+            logger.error("❌ 存储任务信息失败: %s", e)
             return False
     
     def update_task_status(self, session_id: str, task_id: str, status: str, result: Any = None):
@@ -195,13 +199,13 @@ class SocketIOStorage:
                 redis_client.hset(key, task_id, json.dumps(task_data))
                 redis_client.expire(key, self.session_ttl)
                 
-                print(f"✅ 任务状态已更新: {task_id} -> {status}")
+                logger.debug("✅ 任务状态已更新: %s -> %s", task_id, status)
                 return True
             
             return False
             
         except Exception as e:
-            print(f"❌ 更新任务状态失败: {str(e)}")
+            logger.error("❌ 更新任务状态失败: %s", e)
             return False
     
     def store_suggestion_task(self, session_id: str, task_id: str, task_data: Dict[str, Any]):
@@ -218,13 +222,52 @@ class SocketIOStorage:
             redis_client.hset(key, task_id, json.dumps(task_data))
             redis_client.expire(key, self.session_ttl)
             
-            print(f"✅ 建议任务信息已存储: {task_id}")
+            logger.debug("✅ 建议任务信息已存储: %s", task_id)
             return True
             
         except Exception as e:
-            print(f"❌ 存储建议任务信息失败: {str(e)}")
+            logger.error("❌ 存储建议任务信息失败: %s", e)
             return False
     
+    def store_task_sources(self, task_id: str, sources: List[Dict[str, Any]], session_id: str = None):
+        """存储任务的完整来源内容和所属会话（供REST接口按需获取时校验归属）"""
+        try:
+            redis_client = self.get_redis_client()
+            if not redis_client:
+                return False
+            
+            key = f"{self.sources_prefix}{task_id}"
+            record = {'session_id': session_id, 'sources': sources}
+            redis_client.set(key, json.dumps(record, ensure_ascii=False), ex=self.sources_ttl)
+            
+            logger.debug("✅ 任务来源内容已存储: %s (%s 条)", task_id, len(sources))
+            return True
+            
+        except Exception as e:
+            logger.error("❌ 存储任务来源内容失败: %s", e)
+            return False
+    
+    def get_task_sources(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务的完整来源内容，返回 {'session_id': 所属会话, 'sources': 来源列表}"""
+        try:
+            redis_client = self.get_redis_client()
+            if not redis_client:
+                return None
+            
+            key = f"{self.sources_prefix}{task_id}"
+            sources_str = redis_client.get(key)
+            
+            if sources_str:
+                record = json.loads(sources_str.decode() if isinstance(sources_str, bytes) else sources_str)
+                # 旧格式（只有来源列表）没有归属信息，视为已过期
+                return record if isinstance(record, dict) else None
+            
+            return None
+            
+        except Exception as e:
+            logger.error("❌ 获取任务来源内容失败: %s", e)
+            return None
+    
     def get_session_history(self, session_id: str, limit: int = 50) -> List[Dict[str, Any]]:
         """获取会话历史记录"""
         try:
@@ -246,7 +289,7 @@ class SocketIOStorage:
             return history
             
         except Exception as e:
-            print(f"❌ 获取历史记录失败: {str(e)}")
+            logger.error("❌ 获取历史记录失败: %s", e)
             return []
     
     def clear_session_history(self, session_id: str):
@@ -259,11 +302,11 @@ class SocketIOStorage:
             key = f"{self.history_prefix}{session_id}"
             redis_client.delete(key)
             
-            print(f"✅ 历史记录已清除: {session_id}")
+            logger.debug("✅ 历史记录已清除: %s", session_id)
             return True
             
         except Exception as e:
-            print(f"❌ 清除历史记录失败: {str(e)}")
+            logger.error("❌ 清除历史记录失败: %s", e)
             return False
     
     def get_task_status(self, session_id: str, task_id: str) -> Optional[Dict[str, Any]]:
@@ -282,7 +325,7 @@ class SocketIOStorage:
             return None
             
         except Exception as e:
-            print(f"❌ 获取任务状态失败: {str(e)}")
+            logger.error("❌ 获取任务状态失败: %s", e)
             return None
     
     def get_all_sessions(self) -> List[str]:
@@ -303,7 +346,7 @@ class SocketIOStorage:
             return sessions
             
         except Exception as e:
-            print(f"❌ 获取会话列表失败: {str(e)}")
+            logger.error("❌ 获取会话列表失败: %s", e)
             return []
     
     def get_storage_stats(self) -> Dict[str, Any]:
@@ -317,11 +360,12 @@ class SocketIOStorage:
                 'active_sessions': len(redis_client.keys(f"{self.session_prefix}*")),
                 'total_tasks': len(redis_client.keys(f"{self.task_prefix}*")),
                 'total_history': len(redis_client.keys(f"{self.history_prefix}*")),
-                'total_suggestions': len(redis_client.keys(f"{self.suggestion_prefix}*"))
+                'total_suggestions': len(redis_client.keys(f"{self.suggestion_prefix}*")),
+                'total_task_sources': len(redis_client.keys(f"{self.sources_prefix}*"))
             }
             
             return stats
             
         except Exception as e:
-            print(f"❌ 获取存储统计失败: {str(e)}")
+            logger.error("❌ 获取存储统计失败: %s", e)
             return {}
@@ -6,11 +6,17 @@ Celery Worker启动脚本
 
 import os
 import sys
+import argparse
 from dotenv import load_dotenv
 
 def main():
     """主函数"""
-    print("🔄 启动Celery Worker...")
+    parser = argparse.ArgumentParser(description='Celery Worker启动脚本')
+    parser.add_argument('--profile', default=os.getenv('WORKER_PROFILE', 'all'),
+                        help='Worker配置档（all、interactive、background、persistence，默认: all）')
+    args = parser.parse_args()
+    
+    print(f"🔄 启动Celery Worker（配置档: {args.profile}）...")
     
     # 加载环境变量
     env_file = os.path.join(os.path.dirname(__file__), '.env')
@@ -70,12 +76,15 @@ def main():
         
         # 启动Worker - 自动检测操作系统
         import platform
+        from app.celery_app import worker_arguments
         if platform.system() == 'Darwin':  # macOS
             print("🍎 检测到macOS，使用solo模式避免fork()问题")
-            celery.worker_main(['worker', '--loglevel=info', '--pool=solo'])
+            argv = worker_arguments(args.profile, pool='solo', name=os.getenv('WORKER_ID'))
         else:
             print("🐧 检测到Linux/Windows，使用默认prefork模式")
-            celery.worker_main(['worker', '--loglevel=info'])
+            argv = worker_arguments(args.profile, name=os.getenv('WORKER_ID'))
+        print(f"   监听队列: {argv[argv.index('-Q') + 1]}")
+        celery.worker_main(argv)
         
     except KeyboardInterrupt:
         print("\n👋 Worker已停止")
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+会话消息写入基准测试脚本
+对比旧写法"加载会话文档、追加嵌入消息后save()"与ChatSession.append_message原子追加的延迟，
+并检查并发写入时是否丢失消息。需要本地运行的mongod。
+
+用法:
+    python scripts/benchmark_chat_messages.py --host mongodb://127.0.0.1:27017/ai_agent_bench --messages 500 --threads 8
+"""
+
+import os
+import sys
+import time
+import uuid
+import argparse
+import statistics
+import threading
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def percentile(values, percent):
+    """计算百分位数"""
+    values = sorted(values)
+    index = min(len(values) - 1, int(len(values) * percent / 100))
+    return values[index]
+
+def report(name, latencies):
+    """打印延迟统计"""
+    print(f"📊 {name}")
+    print(f"   次数: {len(latencies)}")
+    print(f"   平均: {statistics.mean(latencies) * 1000:.2f}ms")
+    print(f"   P50: {percentile(latencies, 50) * 1000:.2f}ms")
+    print(f"   P95: {percentile(latencies, 95) * 1000:.2f}ms")
+    print(f"   P99: {percentile(latencies, 99) * 1000:.2f}ms")
+
+def bench_load_then_add(user, session_id, count):
+    """旧写法：加载整个会话文档，向嵌入消息列表追加后save()整个文档"""
+    from datetime import datetime
+    from app.models.user import ChatSession, ChatMessage
+
+    latencies = []
+    for i in range(count):
+        start = time.perf_counter()
+        session = ChatSession.objects.get(session_id=session_id, user=user)
+        now = datetime.utcnow()
+        session.messages.append(ChatMessage(
+            seq=session.message_count,
+            message_type='user',
+            content=f'load-then-add {i}',
+            created_at=now
+        ))
+        session.message_count += 1
+        session.last_message_at = now
+        session.updated_at = now
+        session.save()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def bench_append(user, session_id, count):
+    """不加载会话文档直接原子追加"""
+    from app.models.user import ChatSession
+
+    latencies = []
+    for i in range(count):
+        start = time.perf_counter()
+        ChatSession.append_message(session_id, message_type='user', content=f'append {i}', user=user)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def check_concurrency(session_id, threads, per_thread):
+    """多线程并发追加，校验消息数量"""
+    from app.models.user import ChatSession
+
+    def worker():
+        for i in range(per_thread):
+            ChatSession.append_message(session_id, message_type='ai', content=f'concurrent {i}')
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    session = ChatSession.get_by_session_id(session_id)
+    stored = len(session.get_messages())
+    expected = threads * per_thread
+    print(f"📊 并发写入 ({threads} 线程 x {per_thread} 条)")
+    print(f"   耗时: {elapsed:.2f}s, 吞吐量: {expected / elapsed:.1f} 条/秒")
+    print(f"   message_count: {session.message_count}, 实际存储: {stored}, 期望: {expected}")
+    if session.message_count == stored == expected:
+        print("   ✅ 无消息丢失")
+    else:
+        print("   ❌ 消息数量不一致")
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='会话消息写入基准测试')
+    parser.add_argument('--host', default='mongodb://127.0.0.1:27017/ai_agent_bench', help='MongoDB连接字符串（请使用独立的测试库）')
+    parser.add_argument('--messages', type=int, default=500, help='每种写法写入的消息数')
+    parser.add_argument('--threads', type=int, default=8, help='并发测试线程数')
+    args = parser.parse_args()
+
+    from mongoengine import connect
+    from app.models.user import User, ChatSession
+
+    connect(host=args.host)
+    print(f"✅ MongoDB连接成功: {args.host}")
+
+    user = User.create_user(wallet_address='0x' + uuid.uuid4().hex[:40])
+    sessions = []
+    try:
+        for name, bench in [('加载会话后添加消息', bench_load_then_add), ('原子追加 append_message', bench_append)]:
+            session = ChatSession.create_session(user=user)
+            sessions.append(session)
+            report(name, bench(user, session.session_id, args.messages))
+
+        session = ChatSession.create_session(user=user)
+        sessions.append(session)
+        check_concurrency(session.session_id, args.threads, args.messages // args.threads or 1)
+    finally:
+        for session in sessions:
+            session.delete()
+        user.delete()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+离线基准测试脚本
+使用本地替身（DeepSeek、搜索引擎、站点群，见benchmark_stubs.py）代替外部服务，
+在可配置的并发下压测，输出p50/p95/p99延迟、吞吐量和分阶段耗时（JSON），便于跨提交对比。
+
+模式:
+    agent   进程内直接调用AIAgentService（无需Redis/MongoDB）
+    worker  启动替身和使用替身服务的Celery Worker（threads池），供chat模式使用，--profile选择监听的队列
+    chat    通过/chat + SocketIO压测运行中的Web服务（需先启动worker模式和Web服务），
+            --background-load在压测开始时向后台队列突发提交搜索建议和会话保存任务（混合负载）
+
+用法:
+    python scripts/benchmark_offline.py agent --requests 200 --concurrency 20 --output agent.json
+    python scripts/benchmark_offline.py worker --concurrency 20
+    python scripts/benchmark_offline.py chat --base-url http://localhost:5000 --requests 100 --concurrency 10
+
+    # 混合负载下的回答p99：对比共享Worker（--profile all）与专用Worker（interactive + background两个worker进程）
+    python scripts/benchmark_offline.py worker --profile all --concurrency 8
+    python scripts/benchmark_offline.py worker --profile interactive --concurrency 4
+    python scripts/benchmark_offline.py worker --profile background --concurrency 4
+    python scripts/benchmark_offline.py chat --requests 100 --concurrency 10 --background-load 500
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import functools
+import statistics
+import subprocess
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_stubs import StubServers, install_stub_services, add_stub_arguments, stub_config_from_args
+
+QUESTIONS = [
+    "什么是人工智能？",
+    "今天有什么科技新闻？",
+    "Python有什么特点？",
+    "如何学习编程？",
+    "最新的大模型推理成本是多少？"
+]
+
+
+def percentile(values, percent):
+    """计算百分位数"""
+    values = sorted(values)
+    index = min(len(values) - 1, int(len(values) * percent / 100))
+    return values[index]
+
+
+def summarize(latencies):
+    """延迟统计（毫秒）"""
+    if not latencies:
+        return {'count': 0}
+    return {
+        'count': len(latencies),
+        'mean': round(statistics.mean(latencies) * 1000, 2),
+        'p50': round(percentile(latencies, 50) * 1000, 2),
+        'p95': round(percentile(latencies, 95) * 1000, 2),
+        'p99': round(percentile(latencies, 99) * 1000, 2),
+        'max': round(max(latencies) * 1000, 2)
+    }
+
+
+def git_commit():
+    """当前提交，便于跨提交对比"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+class StageRecorder:
+    """记录每个请求各阶段耗时（同一请求在同一线程内执行）"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def begin(self):
+        self._local.stages = defaultdict(float)
+
+    def end(self):
+        return dict(getattr(self._local, 'stages', {}))
+
+    def wrap(self, obj, method_name, stage):
+        """包装obj上的方法，累计其耗时到stage"""
+        method = getattr(obj, method_name)
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                stages = getattr(self._local, 'stages', None)
+                if stages is not None:
+                    stages[stage] += time.perf_counter() - start
+
+        setattr(obj, method_name, timed)
+
+
+def run_load(requests, concurrency, run_one):
+    """按并发执行run_one(i)，run_one返回(是否成功, 总延迟, 分阶段耗时)"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(run_one, range(requests)))
+    duration = time.perf_counter() - start
+
+    stages = defaultdict(list)
+    for _, _, request_stages in results:
+        for stage, elapsed in request_stages.items():
+            stages[stage].append(elapsed)
+
+    succeeded = [latency for ok, latency, _ in results if ok]
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'succeeded': len(succeeded),
+        'failed': requests - len(succeeded),
+        'duration': round(duration, 3),
+        'throughput': round(requests / duration, 2),
+        'latency': summarize(succeeded),
+        'stages': {stage: summarize(values) for stage, values in sorted(stages.items())}
+    }
+
+
+def bench_agent(args, stubs):
+    """进程内压测AIAgentService.process_question"""
+    from app.services.registry import get_registry, get_ai_agent_service
+
+    install_stub_services(get_registry(), stubs, crawl_delay=args.crawl_delay, rate_limit=args.rate_limit)
+    agent = get_ai_agent_service()
+
+    recorder = StageRecorder()
+    recorder.wrap(agent.deepseek_service, 'analyze_question', 'analyze')
+    recorder.wrap(agent.search_service, 'search', 'search')
+    recorder.wrap(agent.crawler_service, 'crawl_multiple_urls', 'crawl')
+    recorder.wrap(agent.deepseek_service, 'analyze_with_context', 'answer')
+    recorder.wrap(agent, '_direct_answer', 'direct_answer')
+
+    def run_one(i):
+        question = f"{QUESTIONS[i % len(QUESTIONS)]} (请求 {i + 1})"
+        recorder.begin()
+        start = time.perf_counter()
+        result = agent.process_question(question)
+        latency = time.perf_counter() - start
+        return 'error' not in result, latency, recorder.end()
+
+    return run_load(args.requests, args.concurrency, run_one)
+
+
+def bench_chat(args):
+    """通过/chat + SocketIO压测运行中的Web服务"""
+    import requests
+    import socketio
+
+    http = requests.Session()
+
+    def run_one(i):
+        session_id = f"bench_{uuid.uuid4().hex}"
+        question = f"{QUESTIONS[i % len(QUESTIONS)]} (请求 {i + 1})"
+        stages = {}
+        joined = threading.Event()
+        done = threading.Event()
+        outcome = {}
+
+        client = socketio.Client(reconnection=False)
+        client.on('joined_session', lambda data: joined.set())
+
+        @client.on('source_ready')
+        def on_source_ready(data):
+            if 'submitted_at' in outcome and 'first_source' not in stages:
+                stages['first_source'] = time.perf_counter() - outcome['submitted_at']
+
+        @client.on('task_update')
+        def on_task_update(data):
+            if 'submitted_at' not in outcome:
+                return
+            now = time.perf_counter()
+            stages.setdefault('queued', now - outcome['submitted_at'])
+            if data.get('state') in ('SUCCESS', 'FAILURE'):
+                outcome['state'] = data.get('state')
+                outcome['finished_at'] = now
+                done.set()
+
+        start = time.perf_counter()
+        try:
+            client.connect(args.base_url, wait_timeout=10)
+            client.emit('join_session', {'session_id': session_id})
+            joined.wait(10)
+            stages['connect'] = time.perf_counter() - start
+
+            outcome['submitted_at'] = time.perf_counter()
+            response = http.post(f"{args.base_url}/chat", json={'question': question, 'session_id': session_id}, timeout=30)
+            stages['submit'] = time.perf_counter() - outcome['submitted_at']
+            if not response.ok or not done.wait(args.timeout):
+                return False, 0, stages
+
+            latency = outcome['finished_at'] - outcome['submitted_at']
+            return outcome.get('state') == 'SUCCESS', latency, stages
+        except Exception as e:
+            print(f"❌ 请求 {i + 1} 失败: {str(e)}")
+            return False, 0, stages
+        finally:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+
+    return run_load(args.requests, args.concurrency, run_one)
+
+
+def enqueue_background_load(count):
+    """向后台队列突发提交count个任务（搜索建议和会话保存交替），模拟与回答争抢Worker的后台流量"""
+    from app import create_app
+    from app.schedules.chat_tasks import get_suggestions_async, save_ai_response_to_session
+
+    create_app()
+    for i in range(count):
+        session_id = f"bench_bg_{uuid.uuid4().hex}"
+        if i % 2 == 0:
+            get_suggestions_async.delay(QUESTIONS[i % len(QUESTIONS)], session_id)
+        else:
+            save_ai_response_to_session.delay(session_id, {'answer': '基准测试后台任务'})
+    print(f"✅ 已提交后台任务: {count}个")
+
+
+def run_worker(args, stubs):
+    """启动使用替身服务的Celery Worker（threads池，注册表中的替身实例在线程间共享）"""
+    from app import create_app
+    from app.ext import celery
+    from app.celery_app import worker_arguments
+
+    app = create_app()
+    install_stub_services(app.extensions['services'], stubs, crawl_delay=args.crawl_delay, rate_limit=args.rate_limit)
+    argv = worker_arguments(args.profile, loglevel='warning', pool='threads', name=f"bench-{args.profile}-{os.getpid()}", concurrency=args.concurrency)
+
+    print(f"🚀 替身Worker已启动（配置档: {args.profile}）")
+    print(f"   DeepSeek替身: {stubs.deepseek_url}")
+    print(f"   搜索替身: {stubs.search_url}")
+    print("   请另行启动Web服务后运行chat模式")
+    celery.worker_main(argv)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='离线基准测试')
+    parser.add_argument('mode', choices=['agent', 'worker', 'chat'])
+    parser.add_argument('--requests', type=int, default=100, help='请求总数')
+    parser.add_argument('--concurrency', type=int, default=10, help='并发数（worker模式为Worker线程数）')
+    parser.add_argument('--base-url', default='http://localhost:5000', help='chat模式的Web服务地址')
+    parser.add_argument('--timeout', type=float, default=120, help='chat模式单个任务的等待时间（秒）')
+    parser.add_argument('--crawl-delay', action='store_true', help='保留爬虫的防封随机延迟（默认关闭以测量系统本身）')
+    parser.add_argument('--rate-limit', action='store_true', help='保留DeepSeek客户端限流（默认关闭）')
+    parser.add_argument('--profile', default='all', help='worker模式的Worker配置档（CELERY_WORKER_PROFILES）')
+    parser.add_argument('--background-load', type=int, default=0, help='chat模式开始时突发提交的后台任务数')
+    parser.add_argument('--output', help='JSON结果输出文件')
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    stub_config = stub_config_from_args(args)
+
+    if args.mode == 'chat':
+        if args.background_load:
+            enqueue_background_load(args.background_load)
+        result = bench_chat(args)
+        result['background_load'] = args.background_load
+    else:
+        stubs = StubServers(stub_config).start()
+        try:
+            if args.mode == 'worker':
+                run_worker(args, stubs)
+                return
+            result = bench_agent(args, stubs)
+        finally:
+            stubs.stop()
+
+    report = {
+        'mode': args.mode,
+        'commit': git_commit(),
+        'timestamp': int(time.time()),
+        'stub_config': vars(stub_config) if args.mode == 'agent' else None,  # chat模式的替身配置由worker进程决定
+        **result
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"✅ 结果已写入: {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+SocketIO负载与推送延迟基准测试脚本
+使用python-socketio异步客户端打开大量连接并加入会话房间，测量：
+- 连接延迟与加入房间延迟
+- 每个连接占用的服务端内存（指定--server-pid时读取/proc中的RSS）
+- 通过send_socketio_message（与Celery Worker相同的Redis消息队列路径）发出的task_update到达客户端的延迟
+
+需要运行中的Web服务和本地Redis，在同一台机器上运行以保证时钟一致。
+
+用法:
+    python scripts/benchmark_socketio.py --url http://localhost:5000 --clients 2000 --messages 5 --server-pid 12345
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_offline import summarize, git_commit
+
+
+def read_rss(pid):
+    """读取进程常驻内存（字节），仅支持Linux"""
+    if not pid:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def raise_fd_limit():
+    """尽量提高文件描述符上限，每个连接占用一个描述符"""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        return hard
+    except Exception:
+        return None
+
+
+class LoadClient:
+    """单个SocketIO连接"""
+
+    def __init__(self, url):
+        import socketio
+        self.url = url
+        self.session_id = f"bench_{uuid.uuid4().hex}"
+        self.client = socketio.AsyncClient(reconnection=False)
+        self.joined = asyncio.Event()
+        self.latencies = []
+        self.connect_latency = None
+        self.join_latency = None
+
+        self.client.on('joined_session', self._on_joined)
+        self.client.on('task_update', self._on_task_update)
+
+    async def _on_joined(self, data):
+        self.joined.set()
+
+    async def _on_task_update(self, data):
+        sent_at = data.get('sent_at')
+        if sent_at:
+            self.latencies.append(time.time() - sent_at)
+
+    async def connect(self, timeout):
+        """连接并加入会话房间"""
+        start = time.perf_counter()
+        await self.client.connect(self.url, transports=['websocket'], wait_timeout=timeout)
+        self.connect_latency = time.perf_counter() - start
+
+        start = time.perf_counter()
+        await self.client.emit('join_session', {'session_id': self.session_id})
+        await asyncio.wait_for(self.joined.wait(), timeout)
+        self.join_latency = time.perf_counter() - start
+
+    async def disconnect(self):
+        try:
+            await self.client.disconnect()
+        except Exception:
+            pass
+
+
+async def open_connections(args):
+    """按并发上限建立连接，返回(成功的客户端, 失败数)"""
+    semaphore = asyncio.Semaphore(args.connect_concurrency)
+    clients = [LoadClient(args.url) for _ in range(args.clients)]
+
+    async def connect(client):
+        async with semaphore:
+            try:
+                await client.connect(args.timeout)
+                return True
+            except Exception as e:
+                print(f"❌ 连接失败: {str(e)}")
+                await client.disconnect()
+                return False
+
+    results = await asyncio.gather(*(connect(client) for client in clients))
+    connected = [client for client, ok in zip(clients, results) if ok]
+    return connected, len(clients) - len(connected)
+
+
+def send_messages(session_ids, count, interval):
+    """在应用上下文中通过send_socketio_message推送task_update（与Celery任务路径一致）"""
+    from app import create_app
+    from app.schedules.chat_tasks import send_socketio_message
+
+    app = create_app()
+    with app.app_context():
+        for seq in range(count):
+            for session_id in session_ids:
+                send_socketio_message({
+                    'task_id': 'benchmark',
+                    'state': 'PROGRESS',
+                    'status': '基准测试消息',
+                    'progress': seq,
+                    'sent_at': time.time()
+                }, session_id)
+            time.sleep(interval)
+
+
+async def run(args):
+    """执行基准测试"""
+    rss_before = read_rss(args.server_pid)
+
+    start = time.perf_counter()
+    clients, failed = await open_connections(args)
+    connect_duration = time.perf_counter() - start
+    print(f"✅ 已建立 {len(clients)} 个连接，失败 {failed} 个，耗时 {connect_duration:.2f}s")
+
+    # 等待服务端完成连接后处理再采样内存
+    await asyncio.sleep(args.settle)
+    rss_after = read_rss(args.server_pid)
+
+    expected = len(clients) * args.messages
+    if clients and args.messages:
+        print(f"🔄 推送 {args.messages} 轮消息到 {len(clients)} 个房间...")
+        await asyncio.to_thread(send_messages, [client.session_id for client in clients], args.messages, args.interval)
+
+        deadline = time.perf_counter() + args.timeout
+        while sum(len(client.latencies) for client in clients) < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.2)
+
+    latencies = [latency for client in clients for latency in client.latencies]
+    await asyncio.gather(*(client.disconnect() for client in clients))
+
+    memory = None
+    if rss_before is not None and rss_after is not None:
+        memory = {
+            'rss_before': rss_before,
+            'rss_after': rss_after,
+            'bytes_per_connection': round((rss_after - rss_before) / len(clients)) if clients else None
+        }
+
+    return {
+        'clients': args.clients,
+        'connected': len(clients),
+        'connect_failed': failed,
+        'connect_duration': round(connect_duration, 3),
+        'connect_rate': round(len(clients) / connect_duration, 2) if connect_duration else None,
+        'connect_latency': summarize([client.connect_latency for client in clients]),
+        'join_latency': summarize([client.join_latency for client in clients]),
+        'server_memory': memory,
+        'messages_expected': expected,
+        'messages_received': len(latencies),
+        'emit_to_receive_latency': summarize(latencies)
+    }
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='SocketIO负载与推送延迟基准测试')
+    parser.add_argument('--url', default='http://localhost:5000', help='Web服务地址')
+    parser.add_argument('--clients', type=int, default=1000, help='连接数')
+    parser.add_argument('--connect-concurrency', type=int, default=100, help='同时进行的连接握手数')
+    parser.add_argument('--messages', type=int, default=5, help='每个房间推送的消息轮数')
+    parser.add_argument('--interval', type=float, default=0.5, help='每轮推送之间的间隔（秒）')
+    parser.add_argument('--timeout', type=float, default=30, help='连接和等待消息的超时时间（秒）')
+    parser.add_argument('--settle', type=float, default=2, help='连接建立后采样内存前的等待时间（秒）')
+    parser.add_argument('--server-pid', type=int, help='Web服务进程ID，用于统计每连接内存')
+    parser.add_argument('--output', help='JSON结果输出文件')
+    args = parser.parse_args()
+
+    fd_limit = raise_fd_limit()
+    if fd_limit is not None and fd_limit < args.clients + 100:
+        print(f"⚠️ 文件描述符上限 {fd_limit} 可能不足以打开 {args.clients} 个连接")
+
+    result = asyncio.run(run(args))
+    report = {
+        'commit': git_commit(),
+        'timestamp': int(time.time()),
+        'url': args.url,
+        **result
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"✅ 结果已写入: {args.output}")
+
+if __name__ == '__main__':
+    main()
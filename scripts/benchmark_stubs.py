@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+离线基准测试使用的本地替身服务
+- OpenAI兼容的DeepSeek替身：可配置首字延迟和生成速度（tokens/秒）
+- DuckDuckGo/Google搜索替身：返回指向站点群的确定性结果
+- 静态站点群：多个端口提供benchmark_fixtures中录制的HTML
+
+单独运行时启动所有替身并打印地址，供手动启动的Web/Worker使用:
+    python scripts/benchmark_stubs.py --deepseek-latency 0.3 --token-rate 50
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_fixtures')
+
+
+@dataclass
+class StubConfig:
+    """替身服务配置"""
+    deepseek_latency: float = 0.3  # 首字延迟（秒）
+    token_rate: float = 50.0  # 生成速度（tokens/秒）
+    answer_tokens: int = 300  # 回答长度（tokens）
+    search_ratio: float = 0.8  # 需要联网搜索的问题比例
+    search_latency: float = 0.2  # 搜索延迟（秒）
+    search_results: int = 5  # 每个搜索引擎返回的结果数
+    site_latency: float = 0.1  # 站点响应延迟（秒）
+    sites: int = 5  # 站点群端口数
+
+
+def stable_hash(text):
+    """跨进程稳定的哈希值，保证相同问题得到相同的替身响应"""
+    return int(hashlib.md5(text.encode('utf-8')).hexdigest(), 16)
+
+
+def load_fixtures():
+    """加载录制的HTML页面"""
+    fixtures = []
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        if name.endswith('.html'):
+            with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+                fixtures.append(f.read())
+    return fixtures
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """替身请求处理基类"""
+
+    protocol_version = 'HTTP/1.1'  # 支持keep-alive，与真实服务的连接复用行为一致
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body, content_type='application/json', status=200):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body, ensure_ascii=False)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def make_deepseek_handler(config):
+    """OpenAI兼容的/chat/completions替身"""
+
+    class DeepSeekHandler(StubHandler):
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            messages = payload.get('messages', [])
+            system_prompt = messages[0]['content'] if messages else ''
+            question = messages[-1]['content'] if messages else ''
+
+            if '"need_search"' in system_prompt:
+                need_search = stable_hash(question) % 100 < config.search_ratio * 100
+                content = json.dumps({
+                    'need_search': need_search,
+                    'search_keywords': question[:50],
+                    'reason': '基准测试替身'
+                }, ensure_ascii=False)
+            elif 'JSON数组' in system_prompt:
+                content = json.dumps([f'{question[:20]} {i}' for i in range(5)], ensure_ascii=False)
+            else:
+                content = '基准测试回答' * (config.answer_tokens // 6 + 1)
+
+            completion_tokens = config.answer_tokens if content.startswith('基准测试回答') else len(content) // 2
+            prompt_tokens = sum(len(message.get('content', '')) for message in messages) // 2
+            time.sleep(config.deepseek_latency + completion_tokens / config.token_rate)
+
+            self.send_body({
+                'id': f'stub-{stable_hash(question) % 10 ** 8}',
+                'object': 'chat.completion',
+                'model': payload.get('model', 'deepseek-chat'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': content},
+                    'finish_reason': 'stop'
+                }],
+                'usage': {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_tokens,
+                    'total_tokens': prompt_tokens + completion_tokens
+                }
+            })
+
+    return DeepSeekHandler
+
+
+def make_search_handler(config, site_urls):
+    """DuckDuckGo/Google搜索替身，结果指向站点群"""
+
+    class SearchHandler(StubHandler):
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            params = parse_qs(parsed.query)
+            query = params.get('q', [''])[0]
+            count = int(params.get('max_results', [config.search_results])[0])
+            offset = stable_hash(query)
+
+            time.sleep(config.search_latency)
+
+            urls = [
+                f"{site_urls[(offset + i) % len(site_urls)]}/page/{(offset + i) % 1000}.html"
+                for i in range(count)
+            ]
+            if parsed.path == '/ddg':
+                self.send_body([
+                    {'href': url, 'title': f'{query} - 结果{i}', 'body': f'{query} 的搜索摘要 {i}'}
+                    for i, url in enumerate(urls)
+                ])
+            elif parsed.path == '/google':
+                # Google结果与DuckDuckGo部分重叠，覆盖去重逻辑
+                self.send_body(urls[count // 2:] + [url.replace('/page/', '/alt/') for url in urls[:count // 2]])
+            else:
+                self.send_body({'error': 'not found'}, status=404)
+
+    return SearchHandler
+
+
+def make_site_handler(config, fixtures):
+    """静态站点替身，按路径确定性地返回录制的HTML"""
+
+    class SiteHandler(StubHandler):
+        def do_GET(self):
+            time.sleep(config.site_latency)
+            fixture = fixtures[stable_hash(self.path) % len(fixtures)]
+            self.send_body(fixture, content_type='text/html; charset=utf-8')
+
+    return SiteHandler
+
+
+class StubServers:
+    """管理所有替身服务的生命周期"""
+
+    def __init__(self, config=None, host='127.0.0.1'):
+        self.config = config or StubConfig()
+        self.host = host
+        self._servers = []
+        self.deepseek_url = None
+        self.search_url = None
+        self.site_urls = []
+
+    def _serve(self, handler):
+        server = ThreadingHTTPServer((self.host, 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self._servers.append(server)
+        return f"http://{self.host}:{server.server_address[1]}"
+
+    def start(self):
+        """启动替身服务（端口由系统分配）"""
+        fixtures = load_fixtures()
+        self.site_urls = [self._serve(make_site_handler(self.config, fixtures)) for _ in range(self.config.sites)]
+        self.search_url = self._serve(make_search_handler(self.config, self.site_urls))
+        self.deepseek_url = self._serve(make_deepseek_handler(self.config))
+        return self
+
+    def stop(self):
+        """停止所有替身服务"""
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+
+
+def make_stub_search_service(search_url):
+    """构造请求搜索替身的SearchService（保留真实的去重与排序逻辑）"""
+    import requests
+    from app.services.search_service import SearchService
+
+    class StubSearchService(SearchService):
+        def __init__(self):
+            super().__init__()
+            self.session = requests.Session()
+
+        def _search_duckduckgo(self, keywords):
+            response = self.session.get(f"{search_url}/ddg", params={
+                'q': keywords, 'max_results': self.config['duckduckgo']['max_results']
+            }, timeout=10)
+            return [{
+                'url': result.get('href', ''),
+                'title': result.get('title', ''),
+                'content': result.get('body', ''),
+                'source': 'duckduckgo',
+                'weight': self.config['duckduckgo']['weight']
+            } for result in response.json()]
+
+        def _search_google(self, keywords):
+            response = self.session.get(f"{search_url}/google", params={
+                'q': keywords, 'max_results': self.config['google']['max_results']
+            }, timeout=10)
+            return [{
+                'url': url,
+                'title': '',
+                'content': '',
+                'source': 'google',
+                'weight': self.config['google']['weight']
+            } for url in response.json()]
+
+    return StubSearchService()
+
+
+def install_stub_services(registry, stubs, crawl_delay=False, rate_limit=False):
+    """
+    向服务注册表预先注册指向替身的服务实例
+
+    Args:
+        registry: ServiceRegistry
+        stubs: 已启动的StubServers
+        crawl_delay: 是否保留爬虫的防封随机延迟
+        rate_limit: 是否保留DeepSeek客户端限流
+    """
+    from app.services.deepseek_service import DeepSeekService
+    from app.services.crawler_service import CrawlerService
+    from app.services.rate_limiter import TokenBucketLimiter
+    from app.services.llm_pool import LLMPool, LLMBackend
+
+    def make_deepseek():
+        service = DeepSeekService()
+        service.pool = LLMPool([LLMBackend('stub', stubs.deepseek_url, 'stub-key')])
+        if not rate_limit:
+            service.rate_limiter = TokenBucketLimiter({'enabled': False})
+        return service
+
+    def make_crawler():
+        service = CrawlerService()
+        if not crawl_delay:
+            service.config = dict(service.config, request_delay=(0, 0), batch_delay=(0, 0))
+        return service
+
+    registry.get('deepseek', make_deepseek)
+    registry.get('search', lambda: make_stub_search_service(stubs.search_url))
+    registry.get('crawler', make_crawler)
+
+
+def add_stub_arguments(parser):
+    """添加替身服务相关的命令行参数"""
+    defaults = StubConfig()
+    parser.add_argument('--deepseek-latency', type=float, default=defaults.deepseek_latency, help='DeepSeek首字延迟（秒）')
+    parser.add_argument('--token-rate', type=float, default=defaults.token_rate, help='DeepSeek生成速度（tokens/秒）')
+    parser.add_argument('--answer-tokens', type=int, default=defaults.answer_tokens, help='回答长度（tokens）')
+    parser.add_argument('--search-ratio', type=float, default=defaults.search_ratio, help='需要联网搜索的问题比例')
+    parser.add_argument('--search-latency', type=float, default=defaults.search_latency, help='搜索延迟（秒）')
+    parser.add_argument('--search-results', type=int, default=defaults.search_results, help='每个搜索引擎返回的结果数')
+    parser.add_argument('--site-latency', type=float, default=defaults.site_latency, help='站点响应延迟（秒）')
+    parser.add_argument('--sites', type=int, default=defaults.sites, help='站点群端口数')
+
+
+def stub_config_from_args(args):
+    """从命令行参数构造StubConfig"""
+    return StubConfig(
+        deepseek_latency=args.deepseek_latency,
+        token_rate=args.token_rate,
+        answer_tokens=args.answer_tokens,
+        search_ratio=args.search_ratio,
+        search_latency=args.search_latency,
+        search_results=args.search_results,
+        site_latency=args.site_latency,
+        sites=args.sites
+    )
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='启动离线基准测试替身服务')
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    stubs = StubServers(stub_config_from_args(args)).start()
+    print("✅ 替身服务已启动")
+    print(f"   DEEPSEEK_BASE_URL={stubs.deepseek_url}")
+    print(f"   搜索替身: {stubs.search_url}/ddg, {stubs.search_url}/google")
+    print(f"   站点群: {', '.join(stubs.site_urls)}")
+    print("   按 Ctrl+C 停止")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stubs.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+钱包登录压力基准测试脚本
+模拟大量钱包同时登录，对比旧的签名验证路径（每次构造Web3实例 + 两次Mongo查询）
+与当前WalletAuthService.verify_signature（eth_account直接恢复 + 原子消费随机数）的吞吐量。
+需要本地运行的mongod。
+
+用法:
+    python scripts/benchmark_wallet_login.py --host mongodb://127.0.0.1:27017/ai_agent_bench --logins 500 --threads 16
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def percentile(values, percent):
+    """计算百分位数"""
+    values = sorted(values)
+    index = min(len(values) - 1, int(len(values) * percent / 100))
+    return values[index]
+
+def legacy_verify_signature(wallet_address, signature, nonce):
+    """旧版验证路径：get_valid_nonce + Web3().eth.account + mark_as_used"""
+    from web3 import Web3
+    from eth_account.messages import encode_defunct
+    from app.models.user import WalletNonce
+
+    wallet_nonce = WalletNonce.get_valid_nonce(wallet_address, nonce)
+    if not wallet_nonce:
+        return False, "无效或过期的随机数"
+
+    message = f"请签名以下消息以完成登录:\n\nNonce: {nonce}\n\n时间: {wallet_nonce.expires_at.strftime('%Y-%m-%d %H:%M:%S')}"
+    recovered_address = Web3().eth.account.recover_message(encode_defunct(text=message), signature=signature)
+    if recovered_address.lower() != wallet_address.lower():
+        return False, "签名验证失败"
+
+    wallet_nonce.mark_as_used()
+    return True, "签名验证成功"
+
+def prepare_logins(auth_service, count):
+    """为count个随机钱包生成随机数并签名"""
+    from eth_account import Account
+    from eth_account.messages import encode_defunct
+
+    logins = []
+    for _ in range(count):
+        account = Account.create()
+        nonce_data = auth_service.generate_nonce(account.address)
+        signed = Account.sign_message(encode_defunct(text=nonce_data['message']), account.key)
+        logins.append((account.address, signed.signature.hex(), nonce_data['nonce']))
+    return logins
+
+def run_storm(name, verify, logins, threads):
+    """并发执行签名验证并打印统计"""
+    def timed(login):
+        start = time.perf_counter()
+        is_valid, _ = verify(*login)
+        return time.perf_counter() - start, is_valid
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(timed, logins))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for latency, _ in results]
+    succeeded = sum(1 for _, is_valid in results if is_valid)
+    print(f"📊 {name}")
+    print(f"   成功: {succeeded}/{len(logins)}")
+    print(f"   吞吐量: {len(logins) / elapsed:.1f} 次/秒")
+    print(f"   平均: {statistics.mean(latencies) * 1000:.2f}ms")
+    print(f"   P50: {percentile(latencies, 50) * 1000:.2f}ms")
+    print(f"   P95: {percentile(latencies, 95) * 1000:.2f}ms")
+    print(f"   P99: {percentile(latencies, 99) * 1000:.2f}ms")
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='钱包登录压力基准测试')
+    parser.add_argument('--host', default='mongodb://127.0.0.1:27017/ai_agent_bench', help='MongoDB连接字符串（请使用独立的测试库）')
+    parser.add_argument('--logins', type=int, default=500, help='每种路径的登录次数')
+    parser.add_argument('--threads', type=int, default=16, help='并发线程数')
+    args = parser.parse_args()
+
+    from mongoengine import connect
+    from app.models.user import WalletNonce
+    from app.services.wallet_auth_service import WalletAuthService
+
+    connect(host=args.host)
+    print(f"✅ MongoDB连接成功: {args.host}")
+
+    auth_service = WalletAuthService()
+    print(f"🔄 准备 {args.logins * 2} 个签名...")
+    legacy_logins = prepare_logins(auth_service, args.logins)
+    current_logins = prepare_logins(auth_service, args.logins)
+
+    try:
+        run_storm('旧版路径 (Web3 + get_valid_nonce + mark_as_used)', legacy_verify_signature, legacy_logins, args.threads)
+        run_storm('当前路径 (eth_account + consume_nonce)', auth_service.verify_signature, current_logins, args.threads)
+    finally:
+        addresses = [login[0].lower() for login in legacy_logins + current_logins]
+        WalletNonce.objects(wallet_address__in=addresses).delete()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+MongoDB索引管理脚本
+按模型meta声明后台创建索引、对比实际索引，并打印热点查询的explain()执行计划。
+热点查询出现全表扫描(COLLSCAN)或内存排序(SORT)时以非零状态码退出，可用于发布前检查。
+
+用法:
+    python scripts/manage_indexes.py ensure       # 后台创建缺失的索引
+    python scripts/manage_indexes.py status       # 对比声明的索引与实际索引
+    python scripts/manage_indexes.py drop-extra   # 删除未在模型中声明的旧索引
+    python scripts/manage_indexes.py explain      # 打印热点查询执行计划
+"""
+
+import os
+import sys
+import argparse
+from datetime import datetime
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def get_models():
+    """需要管理索引的模型"""
+    from app.models.user import User, WalletNonce, ChatSession, ChatMessageBucket
+    return [User, WalletNonce, ChatSession, ChatMessageBucket]
+
+def ensure(models):
+    """按模型声明后台创建索引"""
+    for model in models:
+        model.ensure_indexes()
+        print(f"✅ {model._get_collection_name()}: 索引已创建")
+
+def status(models):
+    """对比声明的索引与实际索引"""
+    for model in models:
+        diff = model.compare_indexes()
+        print(f"📊 {model._get_collection_name()}")
+        for info in model._get_collection().index_information().values():
+            print(f"   {info['key']}{' TTL=' + str(info['expireAfterSeconds']) if 'expireAfterSeconds' in info else ''}")
+        for fields in diff['missing']:
+            print(f"   ❌ 缺失: {fields}")
+        for fields in diff['extra']:
+            print(f"   ⚠️ 多余: {fields}")
+
+def drop_extra(models):
+    """删除模型中未声明的索引，以及与声明的TTL设置不一致的同名索引（如旧版expires_at普通索引）"""
+    for model in models:
+        collection = model._get_collection()
+        extra = model.compare_indexes()['extra']
+        ttl_specs = {
+            tuple(spec['fields']): spec['expireAfterSeconds']
+            for spec in model._meta['index_specs'] if 'expireAfterSeconds' in spec
+        }
+        for name, info in collection.index_information().items():
+            if name == '_id_':
+                continue
+            key = tuple(info['key'])
+            stale_ttl = key in ttl_specs and info.get('expireAfterSeconds') != ttl_specs[key]
+            if info['key'] in extra or stale_ttl:
+                collection.drop_index(name)
+                print(f"🗑️ {model._get_collection_name()}: 已删除索引 {name}")
+
+def get_hot_queries():
+    """热点查询，尽量使用库中真实存在的值"""
+    from bson import ObjectId
+    from app.models.user import User, WalletNonce, ChatSession, ChatMessageBucket
+
+    session = ChatSession.objects.only('session_id', 'user').first()
+    session_id = session.session_id if session else 'sample-session'
+    user_id = session.user.id if session else ObjectId()
+    wallet_address = '0x' + '0' * 40
+
+    return [
+        ('User.get_by_wallet_address',
+         User.objects(wallet_address=wallet_address)),
+        ('WalletNonce.consume_nonce',
+         WalletNonce.objects(wallet_address=wallet_address, nonce='sample', used=False, expires_at__gt=datetime.utcnow())),
+        ('ChatSession.get_user_session_summaries',
+         ChatSession.objects(user=user_id, is_archived__in=[False])
+         .exclude('messages').order_by('-last_message_at', '-created_at', '-id').limit(51)),
+        ('ChatSession.get_by_session_id',
+         ChatSession.objects(session_id=session_id, user=user_id)),
+        ('ChatMessageBucket.get_messages',
+         ChatMessageBucket.objects(session_id=session_id, bucket_index__gte=0, bucket_index__lte=1).order_by('bucket_index')),
+    ]
+
+def collect_stages(plan):
+    """递归收集执行计划中的阶段名称和使用的索引"""
+    stages = [(plan.get('stage'), plan.get('indexName'))]
+    if 'inputStage' in plan:
+        stages.extend(collect_stages(plan['inputStage']))
+    for child in plan.get('inputStages', []):
+        stages.extend(collect_stages(child))
+    return stages
+
+def explain():
+    """打印热点查询执行计划，返回是否全部走索引"""
+    all_ok = True
+    for name, queryset in get_hot_queries():
+        result = queryset.explain()
+        winning_plan = result['queryPlanner']['winningPlan']
+        stages = collect_stages(winning_plan.get('queryPlan', winning_plan))
+        stats = result.get('executionStats', {})
+
+        stage_names = [stage for stage, _ in stages]
+        indexes = [index for _, index in stages if index]
+        ok = 'COLLSCAN' not in stage_names and 'SORT' not in stage_names
+        all_ok = all_ok and ok
+
+        print(f"{'✅' if ok else '❌'} {name}")
+        print(f"   阶段: {' <- '.join(stage_names)}")
+        print(f"   索引: {', '.join(indexes) or '无'}")
+        if stats:
+            print(f"   扫描键: {stats.get('totalKeysExamined')}, 扫描文档: {stats.get('totalDocsExamined')}, 返回: {stats.get('nReturned')}")
+    return all_ok
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='MongoDB索引管理')
+    parser.add_argument('command', choices=['ensure', 'status', 'drop-extra', 'explain'])
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv('.env')
+
+    from mongoengine import connect
+    from app.config import Config
+
+    connect(host=Config.MONGODB_HOST)
+    print("✅ MongoDB连接成功")
+
+    models = get_models()
+    if args.command == 'ensure':
+        ensure(models)
+    elif args.command == 'status':
+        status(models)
+    elif args.command == 'drop-extra':
+        drop_extra(models)
+    elif args.command == 'explain':
+        if not explain():
+            print("❌ 存在未走索引或内存排序的热点查询")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+迁移脚本 - 将ChatSession中嵌入的旧版消息迁移到chat_message_buckets分桶集合
+请在停止Web/Worker写入后执行一次
+"""
+
+import os
+import sys
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    """主函数"""
+    from dotenv import load_dotenv
+    load_dotenv('.env')
+
+    from mongoengine import connect
+    from app.config import Config
+    from app.models.user import ChatSession, ChatMessageBucket
+
+    connect(host=Config.MONGODB_HOST)
+    print("✅ MongoDB连接成功")
+
+    # 确保分桶索引存在
+    ChatMessageBucket.ensure_indexes()
+
+    migrated_sessions = 0
+    migrated_messages = 0
+
+    for session in ChatSession.objects(messages__0__exists=True):
+        count = ChatMessageBucket.migrate_session(session)
+        migrated_sessions += 1
+        migrated_messages += count
+        print(f"   会话 {session.session_id}: 迁移 {count} 条消息")
+
+    print(f"✅ 迁移完成: {migrated_sessions} 个会话, {migrated_messages} 条消息")
+
+if __name__ == '__main__':
+    main()
@@ -22,10 +22,13 @@ db.users.createIndex({ "username": 1 }, { unique: true, sparse: true });
 db.users.createIndex({ "email": 1 }, { unique: true, sparse: true });
 db.users.createIndex({ "created_at": 1 });
 
-db.wallet_nonces.createIndex({ "wallet_address": 1 });
-db.wallet_nonces.createIndex({ "nonce": 1 });
-db.wallet_nonces.createIndex({ "expires_at": 1 });
-db.wallet_nonces.createIndex({ "created_at": 1 });
+db.wallet_nonces.createIndex({ "wallet_address": 1, "nonce": 1, "used": 1, "expires_at": 1 });
+db.wallet_nonces.createIndex({ "expires_at": 1 }, { expireAfterSeconds: 0 });
+
+db.chat_sessions.createIndex({ "session_id": 1 }, { unique: true });
+db.chat_sessions.createIndex({ "user": 1, "is_archived": 1, "last_message_at": -1, "created_at": -1, "_id": -1 });
+
+db.chat_message_buckets.createIndex({ "session_id": 1, "bucket_index": 1 }, { unique: true });
 
 print('✅ MongoDB初始化完成');
 print('📊 数据库: ai_agent_db');
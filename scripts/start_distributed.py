@@ -11,6 +11,9 @@ import time
 import argparse
 from dotenv import load_dotenv
 
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 def check_redis():
     """检查Redis是否运行"""
     try:
@@ -62,12 +65,13 @@ def start_web_instance(instance_id, port):
         print(f"❌ Web实例 {instance_id} 启动失败: {str(e)}")
         return None
 
-def start_worker_instance(worker_id):
+def start_worker_instance(worker_id, profile='all'):
     """启动Worker实例"""
-    print(f"🔄 启动Worker实例 {worker_id}...")
+    print(f"🔄 启动Worker实例 {worker_id} (配置档: {profile})...")
     try:
         env = os.environ.copy()
         env['WORKER_ID'] = worker_id
+        env['WORKER_PROFILE'] = profile
         
         cmd = [sys.executable, 'scripts/start_worker.py']
         return subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
@@ -75,6 +79,20 @@ def start_worker_instance(worker_id):
         print(f"❌ Worker实例 {worker_id} 启动失败: {str(e)}")
         return None
 
+def parse_worker_profiles(value, workers):
+    """解析 "interactive=2,background=1" 形式的Worker配置档分配，未指定时所有Worker使用all配置档"""
+    if not value:
+        return ['all'] * workers
+    
+    from app.config import Config
+    profiles = []
+    for item in value.split(','):
+        name, _, count = item.strip().partition('=')
+        if name not in Config.CELERY_WORKER_PROFILES:
+            raise ValueError(f"未知的Worker配置档: {name}")
+        profiles.extend([name] * int(count or 1))
+    return profiles
+
 def start_flower():
     """启动Flower监控"""
     print("🔄 启动Flower监控...")
@@ -90,16 +108,25 @@ def main():
     parser = argparse.ArgumentParser(description='分布式AI Agent启动脚本')
     parser.add_argument('--instances', type=int, default=3, help='Web实例数量 (默认: 3)')
     parser.add_argument('--workers', type=int, default=3, help='Worker实例数量 (默认: 3)')
+    parser.add_argument('--worker-profiles', help='按配置档分配Worker，如 interactive=2,background=1（指定时忽略--workers）')
     parser.add_argument('--base-port', type=int, default=8002, help='基础端口号 (默认: 8002)')
     parser.add_argument('--no-flower', action='store_true', help='不启动Flower监控')
     parser.add_argument('--docker', action='store_true', help='使用Docker Compose启动')
     
     args = parser.parse_args()
     
+    try:
+        worker_profiles = parse_worker_profiles(args.worker_profiles, args.workers)
+    except ValueError as e:
+        print(f"❌ 无效的Worker配置档分配: {args.worker_profiles} ({str(e)})")
+        sys.exit(1)
+    
     print("🚀 启动分布式AI Agent服务")
     print("=" * 50)
     print(f"Web实例数: {args.instances}")
-    print(f"Worker实例数: {args.workers}")
+    print(f"Worker实例数: {len(worker_profiles)}")
+    if args.worker_profiles:
+        print(f"Worker配置档: {args.worker_profiles}")
     print(f"基础端口: {args.base_port}")
     print("=" * 50)
     
@@ -152,8 +179,8 @@ def main():
     
     # 启动Worker实例
     worker_processes = []
-    for i in range(args.workers):
-        process = start_worker_instance(f"worker{i+1}")
+    for i, profile in enumerate(worker_profiles):
+        process = start_worker_instance(f"worker{i+1}", profile)
         if process:
             worker_processes.append(process)
         time.sleep(1)
@@ -49,8 +49,9 @@ def main():
         print("   按 Ctrl+C 停止")
         print("=" * 50)
         
-        # 启动Worker
-        celery.worker_main(['worker', '--loglevel=info'])
+        # 启动Worker（按WORKER_PROFILE选择监听的队列和并发数）
+        from app.celery_app import worker_arguments
+        celery.worker_main(worker_arguments(os.getenv('WORKER_PROFILE', 'all'), name=os.getenv('WORKER_ID')))
         
     except KeyboardInterrupt:
         print("\n👋 Worker已停止")
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+追踪数据收集与分析脚本
+
+模式:
+    serve   启动OTLP/HTTP JSON收集器替身（POST /v1/traces），将收到的span追加写入JSON Lines文件
+    show    按trace ID打印调用树
+    slowest 列出根span耗时最长的N个trace
+
+用法:
+    python scripts/trace_collector.py serve --port 4318 --output logs/traces.jsonl
+    python scripts/trace_collector.py show <trace_id> --input logs/traces.jsonl
+    python scripts/trace_collector.py slowest --top 10 --input logs/traces.jsonl
+"""
+
+import os
+import sys
+import json
+import argparse
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _attribute_value(value):
+    """解析OTLP属性值"""
+    for key in ('stringValue', 'boolValue', 'doubleValue'):
+        if key in value:
+            return value[key]
+    if 'intValue' in value:
+        return int(value['intValue'])
+    return None
+
+
+def otlp_to_spans(payload):
+    """将OTLP/HTTP JSON请求体转换为与FileExporter相同格式的span列表"""
+    spans = []
+    for resource_spans in payload.get('resourceSpans', []):
+        resource = {
+            attribute['key']: _attribute_value(attribute['value'])
+            for attribute in resource_spans.get('resource', {}).get('attributes', [])
+        }
+        for scope_spans in resource_spans.get('scopeSpans', []):
+            for span in scope_spans.get('spans', []):
+                start = int(span['startTimeUnixNano']) / 1e9
+                end = int(span['endTimeUnixNano']) / 1e9
+                status = span.get('status', {})
+                spans.append({
+                    'trace_id': span['traceId'],
+                    'span_id': span['spanId'],
+                    'parent_id': span.get('parentSpanId'),
+                    'name': span['name'],
+                    'start_time': start,
+                    'end_time': end,
+                    'duration_ms': round((end - start) * 1000, 3),
+                    'attributes': {
+                        attribute['key']: _attribute_value(attribute['value'])
+                        for attribute in span.get('attributes', [])
+                    },
+                    'status': 'error' if status.get('code') == 2 else 'ok',
+                    'error': status.get('message'),
+                    'service': resource.get('service.name')
+                })
+    return spans
+
+
+def serve(args):
+    """启动收集器替身"""
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    lock = threading.Lock()
+
+    class CollectorHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *log_args):
+            pass
+
+        def do_POST(self):
+            if self.path != '/v1/traces':
+                self.send_response(404)
+                self.end_headers()
+                return
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                spans = otlp_to_spans(json.loads(self.rfile.read(length) or b'{}'))
+            except (ValueError, KeyError) as e:
+                self.send_response(400)
+                self.end_headers()
+                print(f"❌ 无效的追踪数据: {str(e)}")
+                return
+
+            with lock, open(args.output, 'a', encoding='utf-8') as f:
+                for span in spans:
+                    f.write(json.dumps(span, ensure_ascii=False) + '\n')
+
+            body = b'{}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((args.host, args.port), CollectorHandler)
+    print(f"✅ 追踪收集器已启动: http://{args.host}:{args.port}/v1/traces")
+    print(f"   写入文件: {args.output}")
+    print("   按 Ctrl+C 停止")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+def load_traces(path):
+    """读取JSON Lines文件，按trace ID分组"""
+    traces = defaultdict(list)
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                span = json.loads(line)
+                traces[span['trace_id']].append(span)
+    return traces
+
+
+def trace_duration(spans):
+    """trace总耗时（毫秒）：最早开始到最晚结束"""
+    start = min(span['start_time'] for span in spans)
+    end = max(span['end_time'] for span in spans)
+    return (end - start) * 1000
+
+
+def print_tree(spans):
+    """按父子关系打印调用树，偏移量相对于trace开始时间"""
+    span_ids = {span['span_id'] for span in spans}
+    children = defaultdict(list)
+    roots = []
+    for span in spans:
+        if span.get('parent_id') in span_ids:
+            children[span['parent_id']].append(span)
+        else:
+            # 上游服务的父span不在文件中时作为根节点
+            roots.append(span)
+
+    trace_start = min(span['start_time'] for span in spans)
+
+    def walk(span, depth):
+        offset = (span['start_time'] - trace_start) * 1000
+        marker = ' ❌' if span.get('status') == 'error' else ''
+        attributes = ' '.join(f"{key}={value}" for key, value in span.get('attributes', {}).items())
+        print(f"{'  ' * depth}{span['name']}  +{offset:.1f}ms  {span['duration_ms']:.1f}ms{marker}  {attributes}".rstrip())
+        for child in sorted(children[span['span_id']], key=lambda item: item['start_time']):
+            walk(child, depth + 1)
+
+    for root in sorted(roots, key=lambda item: item['start_time']):
+        walk(root, 0)
+
+
+def show(args):
+    """打印指定trace的调用树"""
+    spans = load_traces(args.input).get(args.trace_id)
+    if not spans:
+        print(f"❌ 未找到trace: {args.trace_id}")
+        sys.exit(1)
+    print(f"🔍 trace {args.trace_id}  共 {len(spans)} 个span，总耗时 {trace_duration(spans):.1f}ms")
+    print_tree(spans)
+
+
+def slowest(args):
+    """列出耗时最长的trace"""
+    traces = load_traces(args.input)
+    ranked = sorted(traces.items(), key=lambda item: trace_duration(item[1]), reverse=True)[:args.top]
+    for trace_id, spans in ranked:
+        names = [span['name'] for span in spans if not span.get('parent_id')]
+        print(f"{trace_duration(spans):10.1f}ms  {trace_id}  {len(spans):3d} spans  {', '.join(names)}")
+        if args.tree:
+            print_tree(spans)
+            print()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='追踪数据收集与分析')
+    subparsers = parser.add_subparsers(dest='mode', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='启动OTLP/HTTP JSON收集器替身')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=4318)
+    serve_parser.add_argument('--output', default='logs/traces.jsonl', help='span输出文件')
+
+    show_parser = subparsers.add_parser('show', help='打印trace调用树')
+    show_parser.add_argument('trace_id')
+    show_parser.add_argument('--input', default='logs/traces.jsonl', help='span文件')
+
+    slowest_parser = subparsers.add_parser('slowest', help='列出最慢的trace')
+    slowest_parser.add_argument('--top', type=int, default=10)
+    slowest_parser.add_argument('--tree', action='store_true', help='同时打印调用树')
+    slowest_parser.add_argument('--input', default='logs/traces.jsonl', help='span文件')
+
+    args = parser.parse_args()
+    {'serve': serve, 'show': show, 'slowest': slowest}[args.mode](args)
+
+if __name__ == '__main__':
+    main()
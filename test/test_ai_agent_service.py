@@ -142,6 +142,56 @@ class TestAIAgentService(unittest.TestCase):
         # 第二个结果保持原样
         self.assertEqual(enriched_results[1]['title'], '原始标题2')
         self.assertEqual(enriched_results[1]['content'], '原始内容2')
+    
+    def test_summarize_sources(self):
+        """测试来源摘要"""
+        sources = [
+            {'url': 'http://test1.com', 'title': '标题1', 'content': '长内容' * 200, 'source': 'duckduckgo', 'content_length': 600},
+            {'url': 'http://test2.com', 'title': '标题2', 'content': '短内容'}
+        ]
+        
+        summaries = self.service.summarize_sources(sources, snippet_length=50)
+        
+        self.assertEqual(len(summaries), 2)
+        self.assertEqual(summaries[0]['url'], 'http://test1.com')
+        self.assertEqual(summaries[0]['index'], 0)
+        self.assertEqual(summaries[0]['content_length'], 600)
+        self.assertEqual(len(summaries[0]['snippet']), 53)  # 50字符 + '...'
+        self.assertNotIn('content', summaries[0])
+        # 短内容不截断
+        self.assertEqual(summaries[1]['snippet'], '短内容')
+    
+    def test_process_question_streams_sources(self):
+        """测试来源爬取完成后逐条回调"""
+        self.service.deepseek_service = MagicMock()
+        self.service.deepseek_service.analyze_question.return_value = {
+            'need_search': True,
+            'search_keywords': '最新新闻',
+            'reason': '涉及实时信息'
+        }
+        self.service.deepseek_service.analyze_with_context.return_value = "回答"
+        self.service.search_service = MagicMock()
+        self.service.search_service.search.return_value = [
+            {'url': 'http://test1.com', 'title': '新闻1', 'content': '内容1'},
+            {'url': 'http://test2.com', 'title': '新闻2', 'content': '内容2'}
+        ]
+        
+        def crawl_multiple_urls(urls, on_result=None):
+            crawled = {'url': 'http://test2.com', 'title': '爬取标题2', 'content': '详细内容2'}
+            on_result(crawled)
+            return [crawled]
+        
+        self.service.crawler_service = MagicMock()
+        self.service.crawler_service.crawl_multiple_urls.side_effect = crawl_multiple_urls
+        
+        ready_sources = []
+        result = self.service.process_question("今天有什么最新新闻？", on_source_ready=ready_sources.append)
+        
+        self.assertEqual(len(ready_sources), 1)
+        self.assertEqual(ready_sources[0]['index'], 1)
+        self.assertEqual(ready_sources[0]['title'], '爬取标题2')
+        self.assertEqual(ready_sources[0]['snippet'], '详细内容2')
+        self.assertEqual(len(result['sources']), 2)
 
 if __name__ == '__main__':
     unittest.main()
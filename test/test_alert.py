@@ -0,0 +1,69 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import Config
+from app.schedules.alert import evaluate_thresholds, probe_redis
+
+class TestHealthThresholds(unittest.TestCase):
+    """系统健康检查阈值测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.thresholds = Config.HEALTH_CHECK_CONFIG['thresholds']
+        self.probes = {
+            'redis': {'status': 'healthy', 'latency_ms': 1, 'queues': {'default': 0}},
+            'mongodb': {'status': 'healthy', 'latency_ms': 2, 'slow_queries': 0},
+            'deepseek': {'status': 'healthy', 'latency_ms': 500},
+            'search': {'duckduckgo': {'status': 'healthy', 'latency_ms': 800, 'results': 5}},
+            'worker': {'pid': 1, 'rss_mb': 200, 'parent_rss_mb': 100}
+        }
+
+    def test_healthy(self):
+        """测试全部正常时不告警"""
+        self.assertEqual(evaluate_thresholds(self.probes, self.thresholds), [])
+
+    def test_latency_and_backlog(self):
+        """测试延迟和队列积压超过阈值"""
+        self.probes['redis']['latency_ms'] = self.thresholds['redis_latency_ms'] + 1
+        self.probes['redis']['queues']['default'] = self.thresholds['queue_backlog'] + 1
+
+        alerts = evaluate_thresholds(self.probes, self.thresholds)
+
+        self.assertEqual(len(alerts), 2)
+        self.assertTrue(all(alert_type == 'warning' for _, alert_type in alerts))
+
+    def test_unhealthy_dependency(self):
+        """测试依赖不可用时发送错误告警"""
+        self.probes['mongodb'] = {'status': 'unhealthy', 'error': 'timeout'}
+
+        alerts = evaluate_thresholds(self.probes, self.thresholds)
+
+        self.assertEqual(alerts, [('MongoDB不可用: timeout', 'error')])
+
+    def test_skipped_probes(self):
+        """测试跳过的探测不会告警"""
+        self.probes['deepseek'] = None
+        self.probes['search'] = None
+
+        self.assertEqual(evaluate_thresholds(self.probes, self.thresholds), [])
+
+    def test_queue_backlog_priority_lists(self):
+        """测试队列积压包含各优先级的list"""
+        lengths = {'persistence': 1, 'persistence:3': 2, 'persistence:6': 3, 'persistence:9': 4, 'interactive': 5}
+        redis_client = MagicMock()
+        redis_client.info.return_value = {}
+        redis_client.llen.side_effect = lambda key: lengths.get(key, 0)
+
+        with patch('app.ext.redis_store') as redis_store:
+            redis_store._redis_client = redis_client
+            result = probe_redis(['persistence', 'interactive'])
+
+        self.assertEqual(result['queues'], {'persistence': 10, 'interactive': 5})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,17 @@
 import unittest
+import unittest.mock
 import sys
 import os
 import json
+import mongomock
+from datetime import datetime, timedelta
+from mongoengine import connect, disconnect
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import create_app
+from app.models.user import User, ChatSession, ChatMessage, ChatMessageBucket
 
 class TestApp(unittest.TestCase):
     """Flask应用测试类"""
@@ -35,7 +40,7 @@ class TestApp(unittest.TestCase):
     
     def test_chat_endpoint_valid_question(self):
         """测试聊天接口 - 有效问题"""
-        with unittest.mock.patch('app.blueprints.chat.AIAgentService') as mock_ai_agent:
+        with unittest.mock.patch('app.blueprints.chat.get_ai_agent_service') as mock_ai_agent:
             # 模拟AI Agent返回结果
             mock_instance = mock_ai_agent.return_value
             mock_instance.process_question.return_value = {
@@ -67,7 +72,7 @@ class TestApp(unittest.TestCase):
     
     def test_suggestions_endpoint_valid_question(self):
         """测试建议接口 - 有效问题"""
-        with unittest.mock.patch('app.blueprints.chat.AIAgentService') as mock_ai_agent:
+        with unittest.mock.patch('app.blueprints.chat.get_ai_agent_service') as mock_ai_agent:
             # 模拟AI Agent返回建议
             mock_instance = mock_ai_agent.return_value
             mock_instance.get_search_suggestions.return_value = ['建议1', '建议2', '建议3']
@@ -91,7 +96,7 @@ class TestApp(unittest.TestCase):
     
     def test_api_analyze_endpoint(self):
         """测试API分析接口"""
-        with unittest.mock.patch('app.blueprints.api.DeepSeekService') as mock_deepseek:
+        with unittest.mock.patch('app.blueprints.api.get_deepseek_service') as mock_deepseek:
             # 模拟DeepSeek服务返回结果
             mock_instance = mock_deepseek.return_value
             mock_instance.analyze_question.return_value = {
@@ -111,7 +116,7 @@ class TestApp(unittest.TestCase):
     
     def test_api_search_endpoint(self):
         """测试API搜索接口"""
-        with unittest.mock.patch('app.blueprints.api.SearchService') as mock_search:
+        with unittest.mock.patch('app.blueprints.api.get_search_service') as mock_search:
             # 模拟搜索服务返回结果
             mock_instance = mock_search.return_value
             mock_instance.search.return_value = [
@@ -129,7 +134,7 @@ class TestApp(unittest.TestCase):
     
     def test_api_crawl_endpoint(self):
         """测试API爬取接口"""
-        with unittest.mock.patch('app.blueprints.api.CrawlerService') as mock_crawler:
+        with unittest.mock.patch('app.blueprints.api.get_crawler_service') as mock_crawler:
             # 模拟爬虫服务返回结果
             mock_instance = mock_crawler.return_value
             mock_instance.crawl_multiple_urls.return_value = [
@@ -147,7 +152,7 @@ class TestApp(unittest.TestCase):
     
     def test_api_process_endpoint(self):
         """测试API处理接口"""
-        with unittest.mock.patch('app.blueprints.api.AIAgentService') as mock_ai_agent:
+        with unittest.mock.patch('app.blueprints.api.get_ai_agent_service') as mock_ai_agent:
             # 模拟AI Agent返回结果
             mock_instance = mock_ai_agent.return_value
             mock_instance.process_question.return_value = {
@@ -165,6 +170,226 @@ class TestApp(unittest.TestCase):
             data = json.loads(response.data)
             self.assertTrue(data['success'])
             self.assertEqual(data['data']['answer'], '测试回答')
+    
+    def test_api_task_sources_endpoint(self):
+        """测试任务来源内容接口"""
+        with unittest.mock.patch('app.blueprints.api.SocketIOStorage') as mock_storage:
+            mock_instance = mock_storage.return_value
+            mock_instance.get_task_sources.return_value = {
+                'session_id': 'anonymous-session',
+                'sources': [
+                    {'url': 'http://test1.com', 'title': '标题1', 'content': '完整内容1'},
+                    {'url': 'http://test2.com', 'title': '标题2', 'content': '完整内容2'}
+                ]
+            }
+            
+            with unittest.mock.patch('app.blueprints.api.ChatSession') as mock_session:
+                mock_session.objects.return_value.only.return_value.first.return_value = None
+                response = self.client.get('/api/tasks/test-task-id/sources?session_id=anonymous-session&index=1')
+            
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.data)
+            self.assertTrue(data['success'])
+            self.assertEqual(data['data']['count'], 1)
+            self.assertEqual(data['data']['sources'][0]['content'], '完整内容2')
+    
+    def test_api_task_sources_not_found(self):
+        """测试任务来源内容接口 - 已过期"""
+        with unittest.mock.patch('app.blueprints.api.SocketIOStorage') as mock_storage:
+            mock_storage.return_value.get_task_sources.return_value = None
+            
+            response = self.client.get('/api/tasks/test-task-id/sources?session_id=anonymous-session')
+            
+            self.assertEqual(response.status_code, 404)
+            data = json.loads(response.data)
+            self.assertFalse(data['success'])
+    
+    def test_api_sessions_summary_anonymous(self):
+        """测试会话列表摘要模式 - 未登录用户"""
+        response = self.client.get('/api/sessions?summary=true')
+        
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertTrue(data['success'])
+        self.assertEqual(data['data']['sessions'], [])
+        self.assertIsNone(data['data']['next_cursor'])
+        self.assertFalse(data['data']['has_more'])
+    
+    def test_api_session_messages_anonymous(self):
+        """测试会话消息分页接口 - 未登录用户"""
+        response = self.client.get('/api/sessions/test-session/messages?limit=20')
+        
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertTrue(data['success'])
+        self.assertEqual(data['data']['messages'], [])
+        self.assertFalse(data['data']['has_more'])
+    
+    def test_api_session_messages_invalid_cursor(self):
+        """测试会话消息分页接口 - 无效游标"""
+        response = self.client.get('/api/sessions/test-session/messages?before=abc')
+        
+        self.assertEqual(response.status_code, 400)
+        data = json.loads(response.data)
+        self.assertFalse(data['success'])
+    
+    def test_metrics_endpoint(self):
+        """测试Prometheus指标端点"""
+        self.client.get('/')
+        
+        with unittest.mock.patch('app.monitoring.metrics.DependencyCollector._probe', return_value=-1):
+            response = self.client.get('/metrics')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'ai_agent_http_request_duration_seconds', response.data)
+        self.assertIn(b'ai_agent_dependency_rtt_seconds{dependency="redis"} -1.0', response.data)
+
+
+class TestChatModels(unittest.TestCase):
+    """会话与消息分桶模型测试类（mongomock内存数据库）"""
+    
+    def setUp(self):
+        """测试前准备"""
+        # create_app会注册真实MongoDB连接，替换为内存数据库
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        disconnect()
+        connect('ai_agent_test', host='mongodb://localhost', mongo_client_class=mongomock.MongoClient)
+        self.addCleanup(disconnect)
+        self.user = User(wallet_address='0x' + '1' * 40).save()
+    
+    def create_session(self, session_id, **fields):
+        return ChatSession(session_id=session_id, user=self.user, **fields).save()
+    
+    def create_messages(self, session_id, count):
+        """创建包含count条消息的会话，消息直接写入分桶"""
+        self.create_session(session_id, message_count=count)
+        for seq in range(count):
+            ChatMessageBucket.push_message(session_id, ChatMessage(seq=seq, message_type='user', content=str(seq)))
+    
+    def test_migrate_session_keeps_newer_messages(self):
+        """测试迁移前已追加的新消息不会被迁移覆盖计数"""
+        legacy = [ChatMessage(message_type='user', content=f'旧消息{i}') for i in range(3)]
+        session = self.create_session('legacy-session', messages=legacy, message_count=3)
+        ChatSession.append_message('legacy-session', message_type='ai', content='新消息')
+        
+        self.assertEqual(ChatMessageBucket.migrate_session(session), 3)
+        
+        migrated = ChatSession.objects.get(session_id='legacy-session')
+        self.assertEqual(migrated.message_count, 4)
+        self.assertEqual(migrated.messages, [])
+        messages = ChatMessageBucket.get_messages('legacy-session')
+        self.assertEqual([message.seq for message in messages], [0, 1, 2, 3])
+        self.assertEqual(messages[-1].content, '新消息')
+
+    
+    def test_cursor_round_trip(self):
+        """测试游标编码后解码得到相同的排序键"""
+        created_at = datetime(2024, 5, 1, 8, 0, 0)
+        with_message = self.create_session('s1', created_at=created_at, last_message_at=created_at + timedelta(minutes=5))
+        without_message = self.create_session('s2', created_at=created_at)
+        
+        for session in (with_message, without_message):
+            cursor = ChatSession._encode_cursor(session)
+            self.assertEqual(
+                ChatSession._decode_cursor(cursor),
+                (session.last_message_at, session.created_at, session.id)
+            )
+    
+    def test_cursor_filter_ties(self):
+        """测试last_message_at和created_at相同时按id区分游标前后"""
+        timestamp = datetime(2024, 5, 1, 8, 0, 0)
+        sessions = [self.create_session(f's{i}', created_at=timestamp, last_message_at=timestamp) for i in range(3)]
+        older = self.create_session('older', created_at=timestamp, last_message_at=timestamp - timedelta(minutes=1))
+        empty = self.create_session('empty', created_at=timestamp)
+        
+        cursor_key = ChatSession._decode_cursor(ChatSession._encode_cursor(sessions[1]))
+        after = ChatSession.objects(ChatSession._cursor_filter(cursor_key))
+        
+        self.assertEqual(
+            sorted(session.session_id for session in after),
+            sorted([sessions[0].session_id, older.session_id, empty.session_id])
+        )
+    
+    def test_session_summaries_pages(self):
+        """测试逐页读取会话摘要不重复也不遗漏"""
+        timestamp = datetime(2024, 5, 1, 8, 0, 0)
+        for i in range(7):
+            # 相同时间戳、不同时间戳和没有消息的会话混合
+            last_message_at = timestamp - timedelta(minutes=i // 3) if i < 6 else None
+            self.create_session(f's{i}', created_at=timestamp, last_message_at=last_message_at)
+        
+        seen, cursor = [], None
+        while True:
+            sessions, cursor = ChatSession.get_user_session_summaries(self.user, limit=3, cursor=cursor)
+            seen.extend(session.session_id for session in sessions)
+            if cursor is None:
+                break
+        
+        expected = [
+            session.session_id for session in
+            ChatSession.objects(user=self.user).order_by('-last_message_at', '-created_at', '-id')
+        ]
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(set(seen)), 7)
+        self.assertEqual(seen[-1], 's6')
+
+    
+    def test_messages_before_bucket_ranges(self):
+        """测试按序号向前分页：分桶边界、跨两个分桶、不足一页和before=0"""
+        self.create_messages('paged', 250)
+        
+        def seqs(before, limit):
+            messages, next_before = ChatMessageBucket.get_messages_before('paged', before, limit)
+            return [message.seq for message in messages], next_before
+        
+        self.assertEqual(seqs(200, 100), (list(range(100, 200)), 100))
+        self.assertEqual(seqs(100, 100), (list(range(0, 100)), None))
+        self.assertEqual(seqs(150, 100), (list(range(50, 150)), 50))
+        self.assertEqual(seqs(250, 60), (list(range(190, 250)), 190))
+        self.assertEqual(seqs(30, 50), (list(range(0, 30)), None))
+        self.assertEqual(seqs(0, 50), ([], None))
+    
+    def test_session_messages_limit_clamped(self):
+        """测试消息分页接口的limit最大为200"""
+        self.create_messages('paged', 250)
+        auth_service = unittest.mock.MagicMock()
+        auth_service.verify_jwt_token.return_value = (True, self.user)
+        
+        with unittest.mock.patch('app.decorators.auth.get_wallet_auth_service', return_value=auth_service):
+            response = self.app.test_client().get(
+                '/api/sessions/paged/messages?limit=500',
+                headers={'Authorization': 'Bearer test-token'}
+            )
+        
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)['data']
+        self.assertEqual([message['seq'] for message in data['messages']], list(range(50, 250)))
+        self.assertEqual(data['next_before'], 50)
+        self.assertTrue(data['has_more'])
+
+    
+    def test_task_sources_ownership(self):
+        """测试任务来源内容只返回给提交问题的会话及其所有者"""
+        other = User(wallet_address='0x' + '2' * 40).save()
+        self.create_session('owned-session')
+        record = {'session_id': 'owned-session', 'sources': [{'url': 'http://test.com', 'content': '完整内容'}]}
+        auth_service = unittest.mock.MagicMock()
+        client = self.app.test_client()
+        
+        def get(query, user=None):
+            auth_service.verify_jwt_token.return_value = (True, user)
+            headers = {'Authorization': 'Bearer test-token'} if user else {}
+            with unittest.mock.patch('app.decorators.auth.get_wallet_auth_service', return_value=auth_service), \
+                    unittest.mock.patch('app.blueprints.api.SocketIOStorage') as mock_storage:
+                mock_storage.return_value.get_task_sources.return_value = record
+                return client.get(f'/api/tasks/task-1/sources{query}', headers=headers).status_code
+        
+        self.assertEqual(get(''), 404)
+        self.assertEqual(get('?session_id=other-session', self.user), 404)
+        self.assertEqual(get('?session_id=owned-session'), 403)
+        self.assertEqual(get('?session_id=owned-session', other), 403)
+        self.assertEqual(get('?session_id=owned-session', self.user), 200)
 
 if __name__ == '__main__':
     unittest.main()
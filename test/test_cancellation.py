@@ -0,0 +1,173 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+import threading
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.cancellation import (
+    CancellationRegistry, TaskCancelled, cancellation_scope, check_cancelled, run_cancellable,
+    DISCONNECTED, SUPERSEDED, REQUESTED
+)
+from app.services.ai_agent_service import AIAgentService
+from app.socketio.hooks import StorageHook
+from app.config import Config
+
+class TestCancellation(unittest.TestCase):
+    """问题任务取消测试类（Redis不可用时的进程内状态）"""
+
+    def setUp(self):
+        """测试前准备"""
+        patcher = patch.object(CancellationRegistry, '_redis', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.registry = CancellationRegistry({'poll_interval': 0.01})
+        registry_patcher = patch('app.services.cancellation.get_cancellation', return_value=self.registry)
+        registry_patcher.start()
+        self.addCleanup(registry_patcher.stop)
+
+    def test_cancel_session(self):
+        """测试重新提问时取消会话的在途任务，结束的任务不再被取消"""
+        self.registry.register('s1', 't1')
+        self.registry.register('s1', 't2')
+        self.registry.unregister('s1', 't2')
+        self.registry.register('s2', 't3')
+
+        self.assertEqual(self.registry.cancel_session('s1', SUPERSEDED), ['t1'])
+        self.assertEqual(self.registry.is_cancelled('t1'), SUPERSEDED)
+        self.assertIsNone(self.registry.is_cancelled('t2'))
+        self.assertIsNone(self.registry.is_cancelled('t3'))
+
+    def test_check_cancelled(self):
+        """测试只在cancellation_scope内检查当前任务的取消标记"""
+        self.registry.cancel('t1', SUPERSEDED)
+        check_cancelled()
+
+        with cancellation_scope('t2'):
+            check_cancelled()
+        with cancellation_scope('t1'):
+            with self.assertRaises(TaskCancelled) as context:
+                check_cancelled()
+        self.assertEqual(context.exception.reason, SUPERSEDED)
+
+    def test_run_cancellable(self):
+        """测试取消后不再等待进行中的请求"""
+        released = threading.Event()
+
+        def slow_request():
+            self.registry.cancel('t1', DISCONNECTED)
+            released.wait(5)
+            return '响应'
+
+        with cancellation_scope('t1'):
+            with self.assertRaises(TaskCancelled):
+                run_cancellable(slow_request)
+        self.assertFalse(released.is_set())
+        released.set()
+
+        self.assertEqual(run_cancellable(lambda: '响应'), '响应')
+
+    def test_pipeline_stops_between_stages(self):
+        """测试分析阶段后任务被取消时不再搜索和生成回答"""
+        deepseek = MagicMock()
+
+        def analyze(question):
+            self.registry.cancel('t1', SUPERSEDED)
+            return {'need_search': True, 'search_keywords': question}
+
+        deepseek.analyze_question.side_effect = analyze
+        search = MagicMock()
+        agent = AIAgentService(deepseek_service=deepseek, search_service=search, crawler_service=MagicMock())
+
+        with cancellation_scope('t1'):
+            with self.assertRaises(TaskCancelled):
+                agent.process_question('测试问题')
+        search.search.assert_not_called()
+        deepseek.analyze_with_context.assert_not_called()
+
+    def test_disconnect_cancels_last_client(self):
+        """测试会话的最后一个客户端断开时取消在途任务"""
+        hook = StorageHook()
+        hook.storage = MagicMock()
+        self.registry.register('s1', 't1')
+        self.registry.attach('s1', 'socket1')
+        self.registry.attach('s1', 'socket2')
+        self.registry.attach('s1', 'socket2')
+
+        hook.after_disconnect('socket1', chat_sessions=['s1'])
+        self.assertIsNone(self.registry.is_cancelled('t1'))
+
+        hook.after_disconnect('socket2', chat_sessions=['s1'])
+        self.assertEqual(self.registry.is_cancelled('t1'), DISCONNECTED)
+        hook.storage.cleanup_session.assert_called_with('socket2')
+
+    def test_detach_unknown_viewers(self):
+        """测试在线客户端集合过期或客户端不在集合中时不取消在途任务"""
+        hook = StorageHook()
+        hook.storage = MagicMock()
+        self.registry.register('s1', 't1')
+        self.assertIsNone(self.registry.detach('s1', 'socket1'))
+
+        self.registry.attach('s1', 'socket1')
+        self.assertIsNone(self.registry.detach('s1', 'socket2'))
+
+        self.registry._local_viewers.clear()
+        hook.after_disconnect('socket1', chat_sessions=['s1'])
+        self.assertIsNone(self.registry.is_cancelled('t1'))
+
+    def test_viewers_redis(self):
+        """测试Redis中按客户端记录在线集合，每次进入房间都续期，集合过期时不取消"""
+        redis_client = MagicMock()
+        pipe = redis_client.pipeline.return_value
+        with patch.object(CancellationRegistry, '_redis', return_value=redis_client):
+            self.registry.attach('s1', 'socket1')
+            pipe.sadd.assert_called_with('cancel:viewers:s1', 'socket1')
+            pipe.expire.assert_called_with('cancel:viewers:s1', 900)
+
+            pipe.execute.return_value = [1, 0]
+            self.assertEqual(self.registry.detach('s1', 'socket1'), 0)
+            pipe.srem.assert_called_with('cancel:viewers:s1', 'socket1')
+
+            pipe.execute.return_value = [0, 0]
+            self.assertIsNone(self.registry.detach('s1', 'socket1'))
+
+            pipe.execute.side_effect = Exception('连接断开')
+            self.assertIsNone(self.registry.detach('s1', 'socket1'))
+
+    def test_cancel_task_requires_joined_session(self):
+        """测试cancel_task只能取消本连接已加入的会话中的任务"""
+        from app import create_app
+        from app.ext import socketio
+
+        # 测试客户端不支持消息队列（之前创建的应用会在server_options中留下队列管理器）
+        with patch.object(Config, 'SOCKETIO_MESSAGE_QUEUE', None), patch.dict(socketio.server_options):
+            socketio.server_options.pop('client_manager', None)
+            app = create_app()
+        for patcher in [patch.object(StorageHook, '_get_storage'),
+                        patch('app.socketio.events.get_cancellation', return_value=self.registry)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.registry.register('s1', 't1')
+        self.registry.register('s2', 't2')
+        client = app.socketio.test_client(app)
+        client.get_received()
+
+        client.emit('cancel_task', {'session_id': 's1'})
+        received = client.get_received()
+        self.assertEqual(received[0]['name'], 'error')
+        self.assertIsNone(self.registry.is_cancelled('t1'))
+
+        client.emit('join_session', {'session_id': 's2'})
+        client.emit('cancel_task', {'session_id': 's2'})
+        received = client.get_received()
+        self.assertEqual(received[-1]['name'], 'task_cancelled')
+        self.assertEqual(received[-1]['args'][0]['task_ids'], ['t2'])
+        self.assertEqual(self.registry.is_cancelled('t2'), REQUESTED)
+        client.disconnect()
+
+if __name__ == '__main__':
+    unittest.main()
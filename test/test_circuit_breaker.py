@@ -0,0 +1,92 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+class TestCircuitBreaker(unittest.TestCase):
+    """熔断器测试类（Redis不可用时的进程内状态）"""
+
+    def setUp(self):
+        """测试前准备"""
+        patcher = patch.object(CircuitBreaker, '_redis', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.breaker = CircuitBreaker('test', {
+            'failure_threshold': 3,
+            'recovery_timeout': 30,
+            'min_samples': 5,
+            'min_timeout': 1,
+            'max_timeout': 20,
+            'timeout_multiplier': 2.0,
+            'timeout_refresh': 0
+        })
+
+    def test_open_after_failures(self):
+        """测试连续失败达到阈值后熔断，成功会重置失败计数"""
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success(0.1)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state(), CLOSED)
+
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state(), OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_half_open_probe(self):
+        """测试恢复时间后只允许一个探测请求，探测结果决定恢复或重新熔断"""
+        with patch('app.services.circuit_breaker.time.time', return_value=1000):
+            for _ in range(3):
+                self.breaker.record_failure()
+
+        with patch('app.services.circuit_breaker.time.time', return_value=1031):
+            self.assertTrue(self.breaker.allow())
+            self.assertEqual(self.breaker.state(), HALF_OPEN)
+            self.assertFalse(self.breaker.allow())
+
+            self.breaker.record_failure()
+            self.assertEqual(self.breaker.state(), OPEN)
+            self.assertFalse(self.breaker.allow())
+
+        with patch('app.services.circuit_breaker.time.time', return_value=1062):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record_success(0.2)
+            self.assertEqual(self.breaker.state(), CLOSED)
+            self.assertTrue(self.breaker.allow())
+
+    def test_adaptive_timeout(self):
+        """测试超时根据p95耗时调整并限制在上下限内"""
+        self.assertEqual(self.breaker.timeout(), 20)
+
+        for latency in [0.5, 0.6, 0.7, 0.8, 2.0]:
+            self.breaker.record_success(latency)
+        self.assertEqual(self.breaker.timeout(), 4.0)
+
+        for _ in range(5):
+            self.breaker.record_success(0.1)
+        self.assertEqual(self.breaker.timeout(), 4.0)
+
+        for _ in range(100):
+            self.breaker.record_success(0.1)
+        self.assertEqual(self.breaker.timeout(), 1)
+
+    def test_timeout_per_key(self):
+        """测试按key分别统计耗时，短请求不会压低长请求的超时"""
+        for _ in range(50):
+            self.breaker.record_success(0.1, key='classify')
+        for latency in [3.0, 3.5, 4.0, 4.5, 5.0]:
+            self.breaker.record_success(latency, key='answer')
+
+        self.assertEqual(self.breaker.timeout('classify'), 1)
+        self.assertEqual(self.breaker.timeout('answer'), 10.0)
+        self.assertEqual(self.breaker.timeout(), 20)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -23,7 +23,7 @@ class TestCrawlerService(unittest.TestCase):
             }
             self.service = CrawlerService()
     
-    @patch('app.services.crawler_service.requests.get')
+    @patch('app.services.crawler_service.requests.Session.get')
     def test_crawl_url_success(self, mock_get):
         """测试成功爬取URL"""
         # 模拟HTTP响应
@@ -47,7 +47,7 @@ class TestCrawlerService(unittest.TestCase):
             self.assertEqual(result['title'], "Test Title")
             self.assertEqual(result['content'], "Test Content")
     
-    @patch('app.services.crawler_service.requests.get')
+    @patch('app.services.crawler_service.requests.Session.get')
     def test_crawl_url_failure(self, mock_get):
         """测试爬取URL失败"""
         # 模拟请求异常
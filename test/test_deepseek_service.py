@@ -1,12 +1,16 @@
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, ANY
 import sys
 import os
+import json
+import threading
+import requests
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.services.deepseek_service import DeepSeekService
+from app.services.llm_pool import LLMPool, LLMBackend
 
 class TestDeepSeekService(unittest.TestCase):
     """DeepSeek服务测试类"""
@@ -22,7 +26,7 @@ class TestDeepSeekService(unittest.TestCase):
             }
             self.service = DeepSeekService()
     
-    @patch('app.services.deepseek_service.requests.post')
+    @patch('app.services.deepseek_service.requests.Session.post')
     def test_analyze_question_need_search(self, mock_post):
         """测试分析问题需要搜索的情况"""
         # 模拟API响应
@@ -39,7 +43,7 @@ class TestDeepSeekService(unittest.TestCase):
         self.assertEqual(result['search_keywords'], "最新新闻")
         self.assertEqual(result['reason'], "涉及实时信息")
     
-    @patch('app.services.deepseek_service.requests.post')
+    @patch('app.services.deepseek_service.requests.Session.post')
     def test_analyze_question_no_search(self, mock_post):
         """测试分析问题不需要搜索的情况"""
         # 模拟API响应
@@ -55,7 +59,7 @@ class TestDeepSeekService(unittest.TestCase):
         self.assertFalse(result['need_search'])
         self.assertEqual(result['reason'], "历史知识问题")
     
-    @patch('app.services.deepseek_service.requests.post')
+    @patch('app.services.deepseek_service.requests.Session.post')
     def test_analyze_with_context(self, mock_post):
         """测试结合上下文分析"""
         # 模拟API响应
@@ -84,5 +88,145 @@ class TestDeepSeekService(unittest.TestCase):
             self.assertEqual(result['search_keywords'], "测试问题")
             self.assertIn("分析失败", result['reason'])
 
+
+class TestDeepSeekRetry(unittest.TestCase):
+    """DeepSeek重试与对冲请求测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.service = DeepSeekService()
+        self.service.circuit_breaker = MagicMock()
+        self.service.circuit_breaker.allow.return_value = True
+        self.service.circuit_breaker.timeout.return_value = 10
+        self.service.rate_limiter = MagicMock(completion_estimate=500, call_type_lanes={})
+        self.service.pool = self.make_pool('primary')
+        self.messages = [{"role": "user", "content": "测试"}]
+
+        # 等待推进模拟时钟，使后端冷却按等待时间结束
+        self.now = 1000.0
+        patcher = patch('app.services.deepseek_service.time.sleep', side_effect=self.advance)
+        self.mock_sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+        time_patcher = patch('app.services.llm_pool.time.time', side_effect=lambda: self.now)
+        time_patcher.start()
+        self.addCleanup(time_patcher.stop)
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def make_pool(self, *names):
+        pool = LLMPool([LLMBackend(name, f'https://{name}.test/v1', f'key-{name}') for name in names])
+        pool._redis = lambda: None
+        return pool
+
+    def make_response(self, status_code=200, content='回答', headers=None):
+        response = requests.Response()
+        response.status_code = status_code
+        response.headers.update(headers or {})
+        response._content = json.dumps({
+            'choices': [{'message': {'content': content}}],
+            'usage': {'prompt_tokens': 10, 'completion_tokens': 5}
+        }).encode()
+        return response
+
+    def test_retry_server_error(self):
+        """测试5xx错误重试后成功"""
+        with patch.object(self.service.session, 'post', side_effect=[self.make_response(503), self.make_response()]) as mock_post:
+            result = self.service._make_request(self.messages)
+
+        self.assertEqual(result, '回答')
+        self.assertEqual(mock_post.call_count, 2)
+        self.mock_sleep.assert_called_once()
+        self.service.circuit_breaker.record_failure.assert_called_once()
+
+    def test_retry_after(self):
+        """测试429时至少等待Retry-After，超过上限时不再重试"""
+        responses = [self.make_response(429, headers={'Retry-After': '2'}), self.make_response()]
+        with patch.object(self.service.session, 'post', side_effect=responses):
+            self.service._make_request(self.messages)
+        self.assertGreaterEqual(self.mock_sleep.call_args[0][0], 2)
+
+        with patch.object(self.service.session, 'post', return_value=self.make_response(429, headers={'Retry-After': '120'})) as mock_post:
+            with self.assertRaises(Exception):
+                self.service._make_request(self.messages)
+        self.assertEqual(mock_post.call_count, 1)
+
+    def test_rate_limited_key_rotation(self):
+        """测试Key被限流后立即换用其他Key重试，限流窗口内不再使用该Key"""
+        self.service.pool = self.make_pool('primary', 'secondary')
+        responses = [self.make_response(429, headers={'Retry-After': '20'}), self.make_response(), self.make_response()]
+        with patch.object(self.service.session, 'post', side_effect=responses) as mock_post:
+            self.service._make_request(self.messages)
+            self.service._make_request(self.messages)
+
+        urls = [call[0][0] for call in mock_post.call_args_list]
+        self.assertNotEqual(urls[0], urls[1])
+        self.assertEqual(urls[1], urls[2])
+        self.assertLess(self.mock_sleep.call_args[0][0], 20)
+        self.service.circuit_breaker.record_failure.assert_not_called()
+
+    def test_model_profiles(self):
+        """测试按调用类型选择模型、生成参数和超时"""
+        self.service.model_profiles = {
+            'classify': {'model': 'fast-model', 'max_tokens': 100, 'temperature': 0, 'timeout': 5, 'json_mode': True},
+            'answer': {'model': None, 'max_tokens': 2000, 'temperature': 0.7, 'timeout': None},
+            'summary': {'model': None, 'max_tokens': 2000, 'temperature': 0.7, 'min_timeout': 30}
+        }
+        with patch.object(self.service.session, 'post', side_effect=lambda *args, **kwargs: self.make_response()) as mock_post:
+            self.service._make_request(self.messages, call_type='classify')
+            self.service._make_request(self.messages, call_type='suggestions')
+            self.service._make_request(self.messages, call_type='summary')
+
+        classify, suggestions, summary = mock_post.call_args_list
+        self.assertEqual(classify[1]['json']['model'], 'fast-model')
+        self.assertEqual(classify[1]['json']['temperature'], 0)
+        self.assertEqual(classify[1]['json']['response_format'], {'type': 'json_object'})
+        self.assertEqual(classify[1]['timeout'], 5)
+        self.assertEqual(suggestions[1]['json']['model'], self.service.model)
+        self.assertEqual(suggestions[1]['json']['max_tokens'], 2000)
+        self.assertNotIn('response_format', suggestions[1]['json'])
+        self.assertEqual(suggestions[1]['timeout'], 10)
+        self.assertEqual(summary[1]['timeout'], 30)
+        self.service.circuit_breaker.timeout.assert_any_call('classify')
+        self.service.circuit_breaker.record_success.assert_any_call(ANY, key='classify')
+
+    def test_no_retry_client_error(self):
+        """测试4xx错误不重试"""
+        with patch.object(self.service.session, 'post', return_value=self.make_response(400)) as mock_post:
+            with self.assertRaises(Exception):
+                self.service._make_request(self.messages)
+
+        self.assertEqual(mock_post.call_count, 1)
+        self.service.circuit_breaker.record_failure.assert_not_called()
+
+    def test_retry_exhausted(self):
+        """测试连接错误重试次数用尽后失败"""
+        error = requests.exceptions.ConnectionError('连接被重置')
+        with patch.object(self.service.session, 'post', side_effect=error) as mock_post:
+            with self.assertRaises(Exception):
+                self.service._make_request(self.messages)
+
+        self.assertEqual(mock_post.call_count, self.service.retry_config['max_attempts'])
+
+    def test_hedged_request(self):
+        """测试超过对冲等待时间后发送第二个请求并采用先返回的结果"""
+        self.service._latencies['classify'].extend([0.01] * 20)
+        released = threading.Event()
+        calls = []
+
+        def post(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                released.wait(5)
+                return self.make_response(content='慢请求')
+            return self.make_response(content='对冲请求')
+
+        with patch.object(self.service.session, 'post', side_effect=post):
+            result = self.service._make_request(self.messages, call_type='classify')
+            released.set()
+
+        self.assertEqual(result, '对冲请求')
+        self.assertEqual(len(calls), 2)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.llm_pool import LLMPool, NoBackendAvailable
+
+class TestLLMPool(unittest.TestCase):
+    """LLM后端池测试类（Redis不可用时的进程内冷却状态）"""
+
+    def setUp(self):
+        """测试前准备"""
+        patcher = patch.object(LLMPool, '_redis', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.now = 1000.0
+        time_patcher = patch('app.services.llm_pool.time.time', side_effect=lambda: self.now)
+        time_patcher.start()
+        self.addCleanup(time_patcher.stop)
+
+        self.pool = LLMPool.from_config([
+            {'name': 'a', 'base_url': 'https://a.test/v1/', 'api_key': 'key-a'},
+            {'name': 'b', 'base_url': 'https://b.test/v1', 'api_key': 'key-b', 'model': 'local-model'}
+        ], {'rate_limit_cooldown': 10, 'failure_threshold': 2, 'failure_cooldown': 5})
+
+    def test_least_outstanding(self):
+        """测试选择在途请求最少的后端"""
+        first = self.pool.acquire()
+        second = self.pool.acquire()
+        self.assertNotEqual(first.name, second.name)
+
+        self.pool.release(first, True)
+        self.assertIs(self.pool.acquire(), first)
+        self.assertEqual(self.pool.backends[0].chat_url, 'https://a.test/v1/chat/completions')
+
+    def test_rate_limited(self):
+        """测试被限流的后端在窗口内移出轮换，全部被限流时抛出NoBackendAvailable"""
+        a, b = self.pool.backends
+        self.pool.rate_limited(a, 30)
+        for _ in range(3):
+            backend = self.pool.acquire()
+            self.assertIs(backend, b)
+            self.pool.release(backend, True)
+
+        self.pool.rate_limited(b)
+        self.assertEqual(self.pool.wait_time(), 10)
+        with self.assertRaises(NoBackendAvailable) as context:
+            self.pool.acquire()
+        self.assertEqual(context.exception.retry_after, 10)
+
+        self.now += 10
+        self.assertIs(self.pool.acquire(), b)
+
+    def test_consecutive_failures(self):
+        """测试连续失败达到阈值后短暂移出轮换，成功请求重置失败计数"""
+        a, b = self.pool.backends
+        for success in (False, True, False):
+            a.outstanding += 1
+            self.pool.release(a, success)
+        self.assertEqual(self.pool.wait_time(), 0)
+
+        a.outstanding += 1
+        self.pool.release(a, False)
+        b.outstanding = 5
+        self.assertIs(self.pool.acquire(), b)
+
+        self.now += 5
+        self.assertIs(self.pool.acquire(), a)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import sys
+import os
+import json
+import queue
+import logging
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.monitoring.logs import AsyncQueueHandler, JsonFormatter, TextFormatter, truncate
+from app.monitoring.tracing import span
+
+class TestLogging(unittest.TestCase):
+    """结构化日志测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.handler = AsyncQueueHandler(logging.NullHandler(), max_length=20, queue_size=2)
+        # 直接检查入队的日志，不启动写出线程
+        self.handler._pid = os.getpid()
+        self.handler.queue = queue.Queue(maxsize=2)
+
+    def make_record(self, msg, args=(), **extra):
+        record = logging.LogRecord('app.test', logging.INFO, __file__, 1, msg, args, None)
+        for key, value in extra.items():
+            setattr(record, key, value)
+        return record
+
+    def test_truncate(self):
+        """测试截断长字符串并保留基础类型"""
+        self.assertEqual(truncate('短消息', 20), '短消息')
+        self.assertTrue(truncate('x' * 100, 20).startswith('x' * 20 + '...'))
+        self.assertEqual(truncate(42, 1), 42)
+        self.assertEqual(truncate('x' * 100, 0), 'x' * 100)
+
+    def test_prepare(self):
+        """测试入队前合并参数、截断字段并附带trace ID"""
+        payload = {'sources': ['x' * 100]}
+        with span('request') as request_span:
+            self.handler.handle(self.make_record('推送: %s', ('会话' * 20,), payload=payload))
+
+        record = self.handler.queue.get_nowait()
+        self.assertIsNone(record.args)
+        self.assertLess(len(record.msg), 60)
+        self.assertIsInstance(record.payload, str)
+        self.assertEqual(record.trace_id, request_span.trace_id)
+
+        data = json.loads(JsonFormatter().format(record))
+        self.assertEqual(data['logger'], 'app.test')
+        self.assertEqual(data['trace_id'], request_span.trace_id)
+        self.assertIn('payload', data)
+        self.assertIn('trace_id=', TextFormatter().format(record))
+
+    def test_queue_full(self):
+        """测试队列满时丢弃而不阻塞"""
+        for i in range(5):
+            self.handler.handle(self.make_record('消息 %s', (i,)))
+
+        self.assertEqual(self.handler.queue.qsize(), 2)
+        self.assertEqual(self.handler.dropped, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.rate_limiter import TokenBucketLimiter, RateLimitExceeded, estimate_tokens
+
+class TestTokenBucketLimiter(unittest.TestCase):
+    """DeepSeek限流测试类（Redis不可用时的进程内令牌桶）"""
+
+    def setUp(self):
+        """测试前准备"""
+        patcher = patch.object(TokenBucketLimiter, '_redis', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.now = 1000.0
+        time_patcher = patch('app.services.rate_limiter.time.time', side_effect=lambda: self.now)
+        time_patcher.start()
+        self.addCleanup(time_patcher.stop)
+
+        self.limiter = TokenBucketLimiter({
+            'requests_per_minute': 60,
+            'request_burst': 2,
+            'tokens_per_minute': 6000,
+            'token_burst': 1000,
+            'lanes': {
+                'interactive': {'reserve': 0, 'max_wait': 5},
+                'background': {'reserve': 0.5, 'max_wait': 0}
+            }
+        })
+
+    def test_request_bucket(self):
+        """测试请求数用尽后需要等待补充"""
+        self.assertEqual(self.limiter._take(1, 10), 0)
+        self.assertEqual(self.limiter._take(1, 10), 0)
+        self.assertAlmostEqual(self.limiter._take(1, 10), 1.0)
+
+        self.now += 1
+        self.assertEqual(self.limiter._take(1, 10), 0)
+
+    def test_token_bucket(self):
+        """测试token数不足时等待，超过容量的请求在桶满时放行并透支"""
+        self.assertEqual(self.limiter._take(1, 800), 0)
+        self.assertAlmostEqual(self.limiter._take(1, 800), 6.0)
+
+        self.now += 10
+        self.assertEqual(self.limiter._take(1, 5000), 0)
+        self.assertGreater(self.limiter._take(1, 10), 40)
+
+    def test_adjust(self):
+        """测试按实际用量退还配额"""
+        self.limiter._take(1, 1000)
+        self.assertGreater(self.limiter._take(1, 500), 0)
+
+        self.limiter.adjust(-600)
+        self.assertEqual(self.limiter._take(1, 500), 0)
+
+    def test_background_lane_reserve(self):
+        """测试后台通道不能使用预留给交互请求的容量"""
+        self.limiter.acquire(600, lane='interactive')
+
+        with self.assertRaises(RateLimitExceeded):
+            self.limiter.acquire(100, lane='background')
+
+        self.limiter.acquire(100, lane='interactive')
+
+    def test_disabled(self):
+        """测试关闭限流时不扣减配额"""
+        limiter = TokenBucketLimiter({'enabled': False})
+        for _ in range(100):
+            limiter.acquire(10 ** 6)
+
+    def test_estimate_tokens(self):
+        """测试token数估算"""
+        messages = [{'role': 'system', 'content': 'a' * 100}, {'role': 'user', 'content': 'b' * 50}]
+        self.assertEqual(estimate_tokens(messages, 500), 575)
+
+if __name__ == '__main__':
+    unittest.main()
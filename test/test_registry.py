@@ -0,0 +1,45 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.registry import ServiceRegistry
+
+class TestServiceRegistry(unittest.TestCase):
+    """服务注册表测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.registry = ServiceRegistry()
+
+    def test_get_builds_once(self):
+        """测试同一服务只构建一次"""
+        factory = MagicMock(side_effect=lambda: object())
+
+        first = self.registry.get('service', factory)
+        second = self.registry.get('service', factory)
+
+        self.assertIs(first, second)
+        factory.assert_called_once()
+
+    def test_nested_factory(self):
+        """测试工厂函数内获取其他服务不会死锁"""
+        inner = self.registry.get('inner', object)
+        outer = self.registry.get('outer', lambda: {'inner': self.registry.get('inner', object)})
+
+        self.assertIs(outer['inner'], inner)
+
+    def test_rebuild_after_fork(self):
+        """测试fork后的子进程重新构建服务"""
+        first = self.registry.get('service', object)
+
+        with patch('app.services.registry.os.getpid', return_value=-1):
+            second = self.registry.get('service', object)
+
+        self.assertIsNot(first, second)
+
+if __name__ == '__main__':
+    unittest.main()
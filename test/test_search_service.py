@@ -115,5 +115,37 @@ class TestSearchService(unittest.TestCase):
         mock_ddg.assert_called_once_with("测试关键词")
         mock_google.assert_called_once_with("测试关键词")
 
+
+class TestSearchCircuitBreaker(unittest.TestCase):
+    """搜索引擎熔断计数测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.breaker = MagicMock()
+        self.breaker.allow.return_value = True
+        patcher = patch('app.services.search_service.get_circuit_breaker', return_value=self.breaker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.service = SearchService.__new__(SearchService)
+
+    def test_empty_results_not_failure(self):
+        """测试空结果按成功记录耗时，不计入熔断失败"""
+        results = self.service._timed_search('duckduckgo', lambda keywords: [], '冷门关键词')
+
+        self.assertEqual(results, [])
+        self.breaker.record_success.assert_called_once()
+        self.breaker.record_failure.assert_not_called()
+
+    def test_exception_is_failure(self):
+        """测试引擎异常计入熔断失败并返回空结果"""
+        def search(keywords):
+            raise TimeoutError('请求超时')
+
+        results = self.service._timed_search('google', search, '关键词')
+
+        self.assertEqual(results, [])
+        self.breaker.record_failure.assert_called_once()
+        self.breaker.record_success.assert_not_called()
+
 if __name__ == '__main__':
     unittest.main()
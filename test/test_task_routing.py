@@ -0,0 +1,54 @@
+import unittest
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from celery import Celery
+from app.celery_app import worker_arguments
+from app.config import Config
+
+class TestTaskRouting(unittest.TestCase):
+    """Celery任务路由与Worker配置档测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.celery = Celery('test_routing')
+        self.celery.config_from_object('app.celeryconfig')
+
+    def route(self, task_name):
+        options = self.celery.amqp.router.route({}, task_name)
+        return options['queue'].name, options.get('priority')
+
+    def test_chat_task_queues(self):
+        """测试回答、搜索建议和会话保存任务进入各自的队列"""
+        self.assertEqual(self.route('app.schedules.chat_tasks.process_question_async'), ('interactive', 0))
+        self.assertEqual(self.route('app.schedules.chat_tasks.get_suggestions_async'), ('suggestions', 3))
+        self.assertEqual(self.route('app.schedules.chat_tasks.save_ai_response_to_session')[0], 'persistence')
+        self.assertEqual(self.route('app.schedules.usage_task.flush_token_usage')[0], 'persistence')
+        self.assertEqual(self.route('app.schedules.alert.send_alert')[0], 'alerts')
+
+    def test_worker_profiles(self):
+        """测试Worker配置档覆盖所有队列，并生成对应的命令行参数"""
+        routed = {self.route(name)[0] for name in (
+            'app.schedules.chat_tasks.process_question_async',
+            'app.schedules.chat_tasks.get_suggestions_async',
+            'app.schedules.chat_tasks.save_ai_response_to_session',
+            'app.schedules.alert.send_alert',
+            'app.schedules.project.nftfair_task.sync_nft_data'
+        )}
+        self.assertTrue(routed <= set(Config.CELERY_WORKER_PROFILES['all']['queues']))
+
+        argv = worker_arguments('interactive', name='worker1')
+        self.assertEqual(argv[argv.index('-Q') + 1], 'interactive')
+        self.assertIn('-n', argv)
+        self.assertIn('worker1@%h', argv)
+        self.assertIn('--concurrency=8', argv)
+        self.assertNotIn('--concurrency=8', worker_arguments('interactive', pool='solo'))
+
+        with self.assertRaises(ValueError):
+            worker_arguments('unknown')
+
+if __name__ == '__main__':
+    unittest.main()
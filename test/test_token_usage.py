@@ -0,0 +1,81 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.token_usage import (
+    TokenUsageRecorder, usage_context, current_usage_context, ALLOW, DOWNGRADE, REJECT
+)
+
+class TestTokenUsage(unittest.TestCase):
+    """token用量统计测试类（Redis不可用时的进程内汇总）"""
+
+    def setUp(self):
+        """测试前准备"""
+        patcher = patch.object(TokenUsageRecorder, '_redis', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        day_patcher = patch('app.services.token_usage._today', return_value='2024-05-02')
+        day_patcher.start()
+        self.addCleanup(day_patcher.stop)
+
+        self.recorder = TokenUsageRecorder({'daily_quota': 1000, 'downgrade_ratio': 0.8})
+
+    def test_record_rollups(self):
+        """测试用量按用户、会话、全局和调用类型汇总，并累加到当前任务"""
+        with usage_context(session_id='s1', user='0xabc') as usage:
+            self.recorder.record('classify', 'fast-model', 100, 20)
+            self.recorder.record('answer', 'main-model', 300, 200)
+        self.recorder.record('suggestions', 'fast-model', 50, 10)
+
+        self.assertEqual(usage['calls'], 2)
+        self.assertEqual(usage['prompt_tokens'], 400)
+        self.assertEqual(current_usage_context(), {})
+
+        with patch('app.models.user.TokenUsage.get_days', return_value={}):
+            user_report = self.recorder.report('user', '0xabc', 2)
+            global_report = self.recorder.report('global', 'all', 1)
+
+        today = user_report[0]
+        self.assertEqual(today['day'], '2024-05-02')
+        self.assertEqual(today['total_tokens'], 620)
+        self.assertEqual(today['stages']['answer'], {'prompt_tokens': 300, 'completion_tokens': 200, 'calls': 1})
+        self.assertEqual(user_report[1]['total_tokens'], 0)
+        self.assertEqual(global_report[0]['calls'], 3)
+
+    def test_check_quota(self):
+        """测试接近配额时降级，超过配额时拒绝，未登录用户不限制"""
+        self.assertEqual(self.recorder.check_quota('0xabc'), ALLOW)
+
+        with usage_context(user='0xabc'):
+            self.recorder.record('answer', 'main-model', 500, 300)
+        self.assertEqual(self.recorder.check_quota('0xabc'), DOWNGRADE)
+
+        with usage_context(user='0xabc'):
+            self.recorder.record('answer', 'main-model', 100, 100)
+        self.assertEqual(self.recorder.check_quota('0xabc'), REJECT)
+        self.assertEqual(self.recorder.check_quota(None), ALLOW)
+
+    def test_flush(self):
+        """测试有变化的汇总写入MongoDB，写入失败的汇总在下次重试"""
+        with usage_context(session_id='s1'):
+            self.recorder.record('answer', 'main-model', 10, 5)
+
+        with patch('app.models.user.TokenUsage.upsert', side_effect=Exception('MongoDB不可用')):
+            with self.assertRaises(Exception):
+                self.recorder.flush()
+
+        with patch('app.models.user.TokenUsage.upsert') as mock_upsert:
+            self.assertEqual(self.recorder.flush(), 2)
+            self.assertEqual(self.recorder.flush(), 0)
+
+        scopes = sorted(call[0][:3] for call in mock_upsert.call_args_list)
+        self.assertEqual(scopes, [('global', 'all', '2024-05-02'), ('session', 's1', '2024-05-02')])
+        self.assertEqual(mock_upsert.call_args_list[0][0][3]['prompt_tokens'], 10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.monitoring.tracing import tracer, span, current_span, parse_traceparent, inject_headers
+
+class TestTracing(unittest.TestCase):
+    """分布式追踪测试类"""
+
+    def test_child_span(self):
+        """测试子span继承trace ID并在退出后恢复父span"""
+        with span('parent') as parent:
+            with span('child', stage='search') as child:
+                self.assertIs(current_span(), child)
+                self.assertEqual(child.trace_id, parent.trace_id)
+                self.assertEqual(child.parent_id, parent.span_id)
+                self.assertEqual(child.attributes['stage'], 'search')
+            self.assertIs(current_span(), parent)
+        self.assertIsNone(current_span())
+        self.assertIsNotNone(child.end_time)
+
+    def test_span_error(self):
+        """测试异常记录到span"""
+        with self.assertRaises(ValueError):
+            with span('failing') as failing:
+                raise ValueError('boom')
+        self.assertEqual(failing.status, 'error')
+        self.assertEqual(failing.error, 'boom')
+
+    def test_traceparent(self):
+        """测试traceparent的生成、解析与注入"""
+        with span('request') as request_span:
+            headers = inject_headers({})
+            self.assertEqual(headers['traceparent'], request_span.traceparent)
+
+            trace_id, parent_id, sampled = parse_traceparent(headers['traceparent'])
+            self.assertEqual(trace_id, request_span.trace_id)
+            self.assertEqual(parent_id, request_span.span_id)
+
+        task_span = tracer.start_span('task', traceparent=headers['traceparent'])
+        self.assertEqual(task_span.trace_id, request_span.trace_id)
+        self.assertEqual(task_span.parent_id, request_span.span_id)
+
+        self.assertIsNone(parse_traceparent('invalid'))
+        self.assertEqual(inject_headers({}), {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+from bson import ObjectId
+from app.models.user import User
+from app.services.wallet_auth_service import UserCache, NonceStore
+
+class TestUserCache(unittest.TestCase):
+    """已验证用户缓存测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.cache = UserCache(ttl=30, max_size=2, redis_ttl=300)
+        patcher = patch.object(UserCache, '_get_redis_client', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _make_user(self):
+        return User(id=ObjectId(), wallet_address='0x' + 'a' * 40)
+
+    def test_get_returns_copy(self):
+        """测试缓存命中返回独立的用户对象"""
+        user = self._make_user()
+        self.cache.set(user)
+
+        first = self.cache.get(str(user.id))
+        second = self.cache.get(str(user.id))
+
+        self.assertEqual(first.wallet_address, user.wallet_address)
+        self.assertEqual(first.id, user.id)
+        self.assertIsNot(first, second)
+
+    def test_invalidate(self):
+        """测试缓存失效"""
+        user = self._make_user()
+        self.cache.set(user)
+        self.cache.invalidate(user.id)
+
+        self.assertIsNone(self.cache.get(str(user.id)))
+
+    def test_expired_entry(self):
+        """测试过期条目不会被返回"""
+        user = self._make_user()
+        with patch('app.services.wallet_auth_service.time.time', return_value=0):
+            self.cache.set(user)
+        with patch('app.services.wallet_auth_service.time.time', return_value=31):
+            self.assertIsNone(self.cache.get(str(user.id)))
+
+    def test_max_size(self):
+        """测试超过容量时淘汰最久未使用的用户"""
+        users = [self._make_user() for _ in range(3)]
+        for user in users:
+            self.cache.set(user)
+
+        self.assertIsNone(self.cache.get(str(users[0].id)))
+        self.assertIsNotNone(self.cache.get(str(users[2].id)))
+
+    def test_invalidated_during_load(self):
+        """测试加载期间用户缓存失效时不写入旧数据"""
+        user = self._make_user()
+        version = self.cache.version(user.id)
+        self.cache.invalidate(user.id)
+        self.cache.set(user, version)
+        self.assertIsNone(self.cache.get(str(user.id)))
+
+        self.cache.set(user, self.cache.version(user.id))
+        self.assertIsNotNone(self.cache.get(str(user.id)))
+
+    def test_set_if_version_redis(self):
+        """测试Redis中按版本原子写入，版本已变化时本地缓存也不写入"""
+        redis_client = MagicMock()
+        redis_client.get.return_value = None
+        script = redis_client.register_script.return_value
+        script.return_value = 0
+        user = self._make_user()
+        user_id = str(user.id)
+
+        with patch.object(UserCache, '_get_redis_client', return_value=redis_client):
+            self.assertEqual(self.cache.version(user_id), 0)
+            self.cache.set(user, 0)
+            script.assert_called_once_with(
+                keys=[f'auth:user:{user_id}', f'auth:user_version:{user_id}'],
+                args=[user.to_json(), '0', 300]
+            )
+            self.assertIsNone(self.cache.get(user_id))
+
+            self.cache.invalidate(user_id)
+            redis_client.pipeline.return_value.incr.assert_called_with(f'auth:user_version:{user_id}')
+
+            script.return_value = 1
+            self.cache.set(user, 1)
+            self.assertIsNotNone(self.cache.get(user_id))
+
+class TestNonceStore(unittest.TestCase):
+    """认证随机数存储测试类"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.store = NonceStore(prefix='auth:nonce:')
+        self.redis_client = MagicMock()
+        patcher = patch.object(NonceStore, '_get_redis_client', return_value=self.redis_client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_create_uses_set_nx_ex(self):
+        """测试随机数以SET NX EX写入Redis"""
+        expires_at = datetime(2025, 1, 1, 12, 0, 0)
+        self.redis_client.set.return_value = True
+
+        self.assertTrue(self.store.create('0xABC', 'nonce', expires_at, 300))
+        self.redis_client.set.assert_called_once_with(
+            'auth:nonce:0xabc:nonce', expires_at.isoformat(), nx=True, ex=300
+        )
+
+    def test_consume_gets_and_deletes(self):
+        """测试消费随机数时原子取出并删除"""
+        expires_at = datetime(2025, 1, 1, 12, 0, 0)
+        pipe = self.redis_client.pipeline.return_value
+        pipe.execute.return_value = [expires_at.isoformat(), 1]
+
+        self.assertEqual(self.store.consume('0xABC', 'nonce'), expires_at)
+        pipe.get.assert_called_once_with('auth:nonce:0xabc:nonce')
+        pipe.delete.assert_called_once_with('auth:nonce:0xabc:nonce')
+
+    @patch('app.services.wallet_auth_service.WalletNonce.consume_nonce', return_value=None)
+    def test_consume_missing_nonce(self, mock_consume):
+        """测试Redis与MongoDB中都不存在的随机数"""
+        self.redis_client.pipeline.return_value.execute.return_value = [None, 0]
+
+        self.assertIsNone(self.store.consume('0xabc', 'nonce'))
+        mock_consume.assert_called_once_with('0xabc', 'nonce')
+
+    @patch('app.services.wallet_auth_service.WalletNonce.create_nonce')
+    def test_create_falls_back_to_mongo(self, mock_create):
+        """测试Redis不可用时回退到MongoDB"""
+        self.redis_client.set.side_effect = ConnectionError('down')
+
+        self.assertTrue(self.store.create('0xabc', 'nonce', datetime(2025, 1, 1), 300))
+        mock_create.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()